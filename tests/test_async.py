@@ -0,0 +1,188 @@
+import asyncio
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import vv
+import vv.pipeline as pl
+from vv.ffmpeg import FrameWriter, ffmpeg_exe
+from vv.profiling import Profiler
+from vv.progress import EncodeProgress, PrepareProgress
+
+
+def _has_ffmpeg() -> bool:
+    try:
+        ffmpeg_exe()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _images(tmp_path: Path, count: int = 3) -> list[Path]:
+    imgs = []
+    for i in range(count):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (40, 30), (i * 50, 0, 0)).save(p)
+        imgs.append(p)
+    return imgs
+
+
+class SlowWriter:
+    """FrameWriter без ffmpeg: кадр "кодируется" 5 мс."""
+    exits: list = []
+
+    def __init__(self, out, size, fps, *, cancel=None, **kwargs):
+        self.out = out
+        self.cancel = cancel
+
+    def write(self, frame):
+        if self.cancel is not None:
+            self.cancel.check()
+        time.sleep(0.005)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        SlowWriter.exits.append(exc_type)
+        if exc_type is None:
+            Path(self.out).write_bytes(b"")
+        return False
+
+
+def test_build_video_async_streams_progress_without_blocking_loop(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(pl, "FrameWriter", SlowWriter, raising=True)
+    out = tmp_path / "out.mp4"
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            render = vv.build_video_async(
+                images=_images(tmp_path), out=out, sec_per=1.0, fps=30, size=(18, 32),
+                motion="zoom", engine="ffmpeg", executor=executor,
+            )
+            events = [ev async for ev in render]
+            path = await render
+        tick_task.cancel()
+        return path, events, ticks
+
+    path, events, ticks = asyncio.run(scenario())
+
+    assert path == str(out)
+    prepared = [e for e in events if isinstance(e, PrepareProgress)]
+    encoded = [e for e in events if isinstance(e, EncodeProgress)]
+    assert [e.done for e in prepared] == [0, 1, 2, 3]
+    assert encoded and encoded[-1].done
+    assert ticks > 20  # ~0.45 с кодирования: цикл всё это время живой
+
+
+def test_build_video_async_cancel_stops_render(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(pl, "FrameWriter", SlowWriter, raising=True)
+    SlowWriter.exits = []
+
+    async def run():
+        render = pl.build_video_async(
+            images=_images(tmp_path), out=tmp_path / "out.mp4", sec_per=10.0, fps=30, size=(18, 32),
+            motion="zoom", engine="ffmpeg",
+        )
+        async for ev in render:
+            if isinstance(ev, EncodeProgress) and ev.frames >= 10:
+                break
+        # отменяем задачу, которая ждёт рендер: отмена доходит до потока
+        waiter = asyncio.create_task(asyncio.wait_for(render, timeout=30))
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return time.monotonic() - started, render
+
+    elapsed, render = asyncio.run(run())
+
+    assert render.done()
+    assert elapsed < 1.0  # не ждём конца 30-секундного ролика
+    assert SlowWriter.exits == [pl.RenderCancelled]  # writer закрыт с ошибкой — ffmpeg был бы убит (abort)
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_build_video_async_cancel_kills_ffmpeg(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    procs = []
+
+    class TrackedWriter(FrameWriter):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            procs.append(self.proc)
+
+    monkeypatch.setattr(pl, "FrameWriter", TrackedWriter, raising=True)
+
+    async def run():
+        render = pl.build_video_async(
+            images=_images(tmp_path), out=tmp_path / "out.mp4", sec_per=20.0, fps=30, size=(180, 320),
+            motion="kenburns", engine="ffmpeg",
+        )
+        async for ev in render:
+            if isinstance(ev, EncodeProgress):
+                break
+        render.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await render
+
+    asyncio.run(run())
+    assert len(procs) == 1 and procs[0].poll() is not None
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_two_async_renders_run_concurrently(tmp_path: Path):
+    # куски в процессах, звук в потоке и свой профайлер у каждого рендера — одновременно
+    wav = tmp_path / "a.wav"
+    with wave.open(str(wav), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(8000)
+        wf.writeframes(b"\0\0" * 4000)
+
+    profilers = {"a": Profiler(memory=False), "b": Profiler(memory=False)}
+    counts = {"a": 3, "b": 5}
+
+    async def run():
+        renders = [
+            pl.build_video_async(
+                images=_images(tmp_path / name, count=counts[name]), out=tmp_path / f"{name}.mp4",
+                sec_per=0.5, fps=10, size=(32, 48), motion="zoom", engine="ffmpeg", segments=2,
+                audio=wav, audio_adjust="loop", profiler=profilers[name],
+            )
+            for name in ("a", "b")
+        ]
+        return await asyncio.wait_for(asyncio.gather(*renders), timeout=120)
+
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    outs = asyncio.run(run())
+
+    assert [Path(o).name for o in outs] == ["a.mp4", "b.mp4"]
+    for name, profiler in profilers.items():
+        report = profiler.report()
+        assert report.meta["slides"] == counts[name]
+        assert sorted(report.slides) == list(range(counts[name]))  # замеры соседа не попали
+        assert {"audio", "mux"} <= set(report.stages)
+
+
+def test_build_video_async_rejects_process_pool(tmp_path: Path):
+    async def run():
+        with ProcessPoolExecutor(max_workers=1) as ex:
+            pl.build_video_async(images=_images(tmp_path), out=tmp_path / "o.mp4", sec_per=1.0, fps=30, executor=ex)
+
+    with pytest.raises(TypeError):
+        asyncio.run(run())
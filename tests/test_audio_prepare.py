@@ -7,7 +7,10 @@ import shutil
 import numpy as np
 import pytest
 
-from vv.audio import prepare_audio
+import vv.audio as audio
+from vv.audio import decode_pcm, iter_pcm, prepare_audio
+from vv.cache import PcmCache
+from vv.ffmpeg import ffmpeg_exe
 
 
 def _write_wav(path: Path, duration_s: float, sr: int = 44100, hz: float = 440.0) -> None:
@@ -50,4 +53,43 @@ def test_prepare_audio_loop(tmp_path: Path, target: float):
     a = prepare_audio(str(wav), target_duration=target, mode="loop")
     assert a is not None
     assert hasattr(a, "duration")
-    assert a.duration == pytest.approx(target, abs=0.10)
\ No newline at end of file
+    assert a.duration == pytest.approx(target, abs=0.10)
+
+def test_iter_pcm_loops_and_trims_without_copies():
+    pcm = np.arange(10, dtype=np.int16).repeat(2).reshape(-1, 2)
+
+    parts = list(iter_pcm(pcm, 25, "loop"))
+    assert [len(p) for p in parts] == [10, 10, 5]
+    assert all(np.shares_memory(p, pcm) for p in parts)
+    assert np.concatenate(parts)[:, 0].tolist() == list(range(10)) * 2 + list(range(5))
+
+    # trim не удлиняет трек
+    assert [len(p) for p in iter_pcm(pcm, 25, "trim")] == [10]
+    assert [len(p) for p in iter_pcm(pcm, 4, "trim")] == [4]
+
+
+def _has_ffmpeg() -> bool:
+    try:
+        ffmpeg_exe()
+    except RuntimeError:
+        return False
+    return True
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_decode_pcm_cached_once_and_memmapped(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    wav = tmp_path / "a.wav"
+    _write_wav(wav, duration_s=1.0)
+    cache = PcmCache(tmp_path / "pcm")
+
+    first = decode_pcm(wav, cache=cache)
+    assert first.shape == (audio.SAMPLE_RATE, audio.CHANNELS)
+    assert not isinstance(first, np.memmap)
+
+    # длинный трек (по порогу) читается с диска без повторного декода
+    monkeypatch.setattr(audio, "MEMMAP_BYTES", 0, raising=True)
+    monkeypatch.setattr(audio, "decode_audio", None, raising=True)
+    second = decode_pcm(wav, cache=cache)
+    assert isinstance(second.base, np.memmap)
+    assert np.array_equal(second, first)
+    assert (cache.hits, cache.misses) == (1, 1)
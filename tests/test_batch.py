@@ -0,0 +1,194 @@
+import json
+import time
+import wave
+from pathlib import Path
+
+import click
+import pytest
+from click.testing import CliRunner
+from PIL import Image
+
+import vv.pipeline as pl
+from vv.batch import job_params, load_manifest, main, run_batch
+from vv.cancel import RenderCancelled
+from vv.ffmpeg import ffmpeg_exe
+
+
+def _has_ffmpeg() -> bool:
+    try:
+        ffmpeg_exe()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _images(folder: Path, count: int = 2) -> Path:
+    folder.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        Image.new("RGB", (40, 30), (i * 100, 0, 0)).save(folder / f"{i}.png")
+    return folder
+
+
+def test_load_manifest_applies_defaults(tmp_path: Path):
+    manifest = tmp_path / "m.json"
+    manifest.write_text(json.dumps({
+        "defaults": {"engine": "ffmpeg", "fps": 24},
+        "jobs": [{"images": "a", "out": "a.mp4"}, {"name": "b", "images": "b", "fps": 60}],
+    }))
+    jobs = load_manifest(manifest)
+    assert [j["name"] for j in jobs] == ["job1", "b"]
+    assert jobs[0]["engine"] == jobs[1]["engine"] == "ffmpeg"
+    assert (jobs[0]["fps"], jobs[1]["fps"]) == (24, 60)
+
+
+def test_load_manifest_rejects_duplicate_names(tmp_path: Path):
+    manifest = tmp_path / "m.json"
+    manifest.write_text(json.dumps([{"name": "x", "images": "a"}, {"name": "x", "images": "b"}]))
+    with pytest.raises(click.ClickException, match="уникальны"):
+        load_manifest(manifest)
+
+
+def test_job_params_uses_cli_options():
+    params = job_params({
+        "name": "a",
+        "images": ["x", "y"],
+        "sec-per": 2,
+        "fps": 60,
+        "transitions": True,
+        "fancy_bg": False,
+        "motion": "ZOOM",
+    })
+    assert params["images"] == ("x", "y")
+    assert params["sec_per"] == 2.0
+    assert params["fps"] == "60"
+    assert params["transitions"] is True
+    assert params["engine"] == "moviepy"  # умолчание как в vv.cli
+    assert params["motion"].lower() == "zoom"
+
+
+@pytest.mark.parametrize("job, match", [
+    ({"images": "x", "fps": 25}, "fps"),
+    ({"images": "x", "colour": "red"}, "colour"),
+    ({"images": "x", "cache_dir": "/tmp"}, "cache_dir"),
+])
+def test_job_params_rejects_bad_options(job, match):
+    with pytest.raises(click.ClickException) as exc:
+        job_params(job)
+    assert match in exc.value.format_message()
+
+
+def test_failed_job_does_not_stop_others(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    rendered = []
+
+    def fake_build_video(images, out, **kwargs):
+        rendered.append(out)
+        assert kwargs["cache"] is not None and kwargs["audio_cache"] is not None  # общие кэши
+        if "bad" in out:
+            raise RuntimeError("ffmpeg упал")
+        Path(out).write_bytes(b"x" * 10)
+        return out
+
+    monkeypatch.setattr(pl, "build_video", fake_build_video, raising=True)
+    imgs = _images(tmp_path / "imgs")
+    jobs = [
+        {"name": "a", "images": str(imgs), "out": str(tmp_path / "a.mp4")},
+        {"name": "missing", "images": str(tmp_path / "nope"), "out": str(tmp_path / "m.mp4")},
+        {"name": "bad", "images": str(imgs), "out": str(tmp_path / "bad.mp4")},
+        {"name": "c", "images": str(imgs), "out": str(tmp_path / "c.mp4")},
+    ]
+    seen = []
+    results = run_batch(jobs, cache_dir=str(tmp_path / "cache"), on_result=lambda r: seen.append(r.name))
+
+    assert [r.name for r in results] == seen == ["a", "missing", "bad", "c"]
+    assert [r.ok for r in results] == [True, False, False, True]
+    assert "Путь не найден" in results[1].error
+    assert results[2].error == "RuntimeError: ffmpeg упал"
+    assert results[3].bytes == 10
+    assert len(rendered) == 3
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_batch_command_with_pool(tmp_path: Path):
+    imgs = _images(tmp_path / "imgs")
+    (tmp_path / "exists.mp4").write_bytes(b"")
+    manifest = tmp_path / "m.json"
+    manifest.write_text(json.dumps({
+        "defaults": {"images": str(imgs), "engine": "ffmpeg", "width": 32, "height": 48, "sec_per": 0.5},
+        "jobs": [
+            {"name": "a", "out": str(tmp_path / "out" / "a.mp4")},
+            {"name": "b", "out": str(tmp_path / "out" / "b.mp4"), "motion": "zoom"},
+            {"name": "exists", "out": str(tmp_path / "exists.mp4")},
+        ],
+    }))
+    summary = tmp_path / "summary.json"
+
+    result = CliRunner().invoke(
+        main,
+        [str(manifest), "--workers", "2", "--summary", str(summary), "--cache-dir", str(tmp_path / "cache")],
+    )
+    assert result.exit_code == 1  # одно задание упало — но остальные готовы
+
+    data = json.loads(summary.read_text(encoding="utf-8"))
+    assert (data["ok"], data["failed"]) == (2, 1)
+    jobs = {j["name"]: j for j in data["jobs"]}
+    assert jobs["a"]["ok"] and jobs["b"]["ok"]
+    assert jobs["a"]["bytes"] == (tmp_path / "out" / "a.mp4").stat().st_size > 0
+    assert "уже существует" in jobs["exists"]["error"]
+    assert jobs["b"]["cache"]["slides"]["misses"] + jobs["b"]["cache"]["slides"]["hits"] == 2
+
+
+def test_job_timeout_fails_only_that_job(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    def fake_build_video(images, out, *, cancel, **kwargs):
+        if "stuck" in out:
+            while not cancel.cancelled:  # "зависший" рендер: ждёт, пока его отменят
+                time.sleep(0.01)
+            raise RenderCancelled("рендер отменён")
+        Path(out).write_bytes(b"x")
+        return out
+
+    monkeypatch.setattr(pl, "build_video", fake_build_video, raising=True)
+    imgs = _images(tmp_path / "imgs")
+    jobs = [
+        {"name": "stuck", "images": str(imgs), "out": str(tmp_path / "stuck.mp4")},
+        {"name": "ok", "images": str(imgs), "out": str(tmp_path / "ok.mp4")},
+    ]
+    results = run_batch(jobs, cache_dir=str(tmp_path / "cache"), timeout=0.2)
+
+    assert [r.ok for r in results] == [False, True]
+    assert "не уложилось в 0.2 с" in results[0].error
+
+
+def _write_wav(path: Path, seconds: float, sr: int = 8000) -> Path:
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes(b"\0\0" * int(sr * seconds))
+    return path
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_batch_segments_with_audio(tmp_path: Path):
+    # кусками в процессах + звук в потоке: раньше такое задание вешало весь пакет
+    imgs = _images(tmp_path / "imgs", count=4)
+    manifest = tmp_path / "m.json"
+    manifest.write_text(json.dumps({
+        "defaults": {"images": str(imgs), "engine": "ffmpeg", "width": 32, "height": 48, "sec_per": 0.5,
+                     "audio": str(_write_wav(tmp_path / "a.wav", 0.5)), "audio_adjust": "loop"},
+        "jobs": [
+            {"name": "seg", "out": str(tmp_path / "out" / "seg.mp4"), "segments": 2},
+            {"name": "plain", "out": str(tmp_path / "out" / "plain.mp4")},
+        ],
+    }))
+    summary = tmp_path / "summary.json"
+
+    result = CliRunner().invoke(
+        main,
+        [str(manifest), "--workers", "2", "--summary", str(summary), "--cache-dir", str(tmp_path / "cache"),
+         "--job-timeout", "120"],
+    )
+    assert result.exit_code == 0, result.output
+
+    data = json.loads(summary.read_text(encoding="utf-8"))
+    assert (data["ok"], data["failed"]) == (2, 0)
+    assert (tmp_path / "out" / "seg.mp4").stat().st_size > 0
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import vv.pipeline as pl
+from vv.cache import SegmentCache, SlideCache
+
+
+def _mk_img(path: Path, color=(10, 20, 30)) -> Path:
+    Image.new("RGB", (64, 48), color).save(path)
+    return path
+
+
+PARAMS = dict(size=(18, 32), bg="black", motion="kenburns", fit_mode="fit", fancy_bg=True)
+
+
+def test_prepare_slide_roundtrip_through_cache(tmp_path: Path):
+    img = _mk_img(tmp_path / "1.png")
+    cache = SlideCache(tmp_path / "cache")
+
+    first = pl._prepare_slide(img, None, cache=cache, **PARAMS)
+    second = pl._prepare_slide(img, None, cache=cache, **PARAMS)
+
+    assert first.cached is False
+    assert second.cached is True
+    assert second.src_size == first.src_size
+    assert np.array_equal(second.content, first.content)
+    assert np.array_equal(second.background, first.background)
+    assert second.frame is None
+
+
+def test_cache_key_covers_content_and_params(tmp_path: Path):
+    img = _mk_img(tmp_path / "1.png")
+    cache = SlideCache(tmp_path / "cache")
+
+    base = cache.key(img, size=[18, 32], fit_mode="fit", offset=None)
+    assert cache.key(img, size=[18, 32], fit_mode="fit", offset=None) == base
+    assert cache.key(img, size=[18, 32], fit_mode="cover", offset=None) != base
+    assert cache.key(img, size=[18, 32], fit_mode="fit", offset=[0.5, 0.0]) != base
+
+    # то же имя, другое содержимое
+    _mk_img(img, color=(200, 0, 0))
+    os.utime(img, ns=(1, 1))
+    assert cache.key(img, size=[18, 32], fit_mode="fit", offset=None) != base
+
+
+def test_trim_evicts_least_recently_used(tmp_path: Path):
+    cache = SlideCache(tmp_path / "cache")
+    frame = np.zeros((32, 18, 3), dtype=np.uint8)
+    for i, key in enumerate(["aa1", "bb2", "cc3"]):
+        cache.put(key, pl.PreparedSlide(path="x.png", src_size=(18, 32), frame=frame))
+        os.utime(cache._path(key), ns=(i, i))
+
+    # "aa1" использовали последним — он и остаётся
+    assert cache.get("aa1", "x.png") is not None
+
+    cache.max_bytes = cache._path("aa1").stat().st_size
+    assert cache.trim() == 2
+    assert [p.stem for p in (tmp_path / "cache").glob("*/*.npz")] == ["aa1"]
+
+
+def test_pipeline_counts_hits_and_misses(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    imgs = [_mk_img(tmp_path / f"{i}.png", (i * 50, 0, 0)) for i in range(3)]
+
+    class FakeWriter:
+        def __init__(self, out, *_a, **_k):
+            self.out = out
+
+        def write(self, frame):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            Path(self.out).write_bytes(b"")
+            return False
+
+    monkeypatch.setattr(pl, "FrameWriter", FakeWriter, raising=True)
+
+    kwargs = dict(sec_per=0.5, fps=10, size=(18, 32), motion="zoom", engine="ffmpeg")
+    cache = SlideCache(tmp_path / "cache")
+    pl.build_video(imgs, tmp_path / "a.mp4", cache=cache, **kwargs)
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    cache = SlideCache(tmp_path / "cache")
+    pl.build_video(imgs, tmp_path / "b.mp4", cache=cache, workers=2, **kwargs)
+    assert (cache.hits, cache.misses) == (3, 0)
+
+
+def test_broken_entry_is_rebuilt(tmp_path: Path):
+    img = _mk_img(tmp_path / "1.png")
+    cache = SlideCache(tmp_path / "cache")
+    pl._prepare_slide(img, None, cache=cache, **PARAMS)
+
+    entry = next((tmp_path / "cache").glob("*/*.npz"))
+    entry.write_bytes(b"garbage")
+
+    assert pl._prepare_slide(img, None, cache=cache, **PARAMS).cached is False
+    assert pl._prepare_slide(img, None, cache=cache, **PARAMS).cached is True
+
+
+def test_segment_cache_put_get(tmp_path: Path):
+    cache = SegmentCache(tmp_path / "seg")
+    assert cache.get("ab1") is None
+
+    src = tmp_path / "part.mkv"
+    src.write_bytes(b"data")
+    entry = cache.put("ab1", src)
+
+    assert not src.exists()  # файл забран в кэш
+    assert cache.get("ab1") == entry
+    assert entry.read_bytes() == b"data"
@@ -0,0 +1,112 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import vv.pipeline as pl
+from vv.cancel import CancelToken, RenderCancelled
+from vv.ffmpeg import FrameWriter, _run, ffmpeg_exe
+
+
+def _has_ffmpeg() -> bool:
+    try:
+        ffmpeg_exe()
+    except RuntimeError:
+        return False
+    return True
+
+
+needs_ffmpeg = pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+
+
+def _images(tmp_path: Path, count: int = 3) -> list[Path]:
+    imgs = []
+    for i in range(count):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (40, 30), (i * 50, 0, 0)).save(p)
+        imgs.append(p)
+    return imgs
+
+
+def test_cancel_token_callbacks():
+    token = CancelToken()
+    calls = []
+    token.on_cancel(lambda: calls.append("a"))
+    unsubscribe = token.on_cancel(lambda: calls.append("b"))
+    unsubscribe()
+    token.check()  # ещё не отменён
+
+    token.cancel()
+    token.cancel()
+    assert token.cancelled and calls == ["a"]
+    with pytest.raises(RenderCancelled):
+        token.check()
+
+    token.on_cancel(lambda: calls.append("late"))  # уже отменён — сразу
+    assert calls == ["a", "late"]
+
+
+@needs_ffmpeg
+def test_cancel_kills_running_ffmpeg():
+    token = CancelToken()
+    # без отмены этот ffmpeg работал бы минуты
+    cmd = [ffmpeg_exe(), "-loglevel", "error", "-f", "lavfi", "-i", "anullsrc", "-t", "100000", "-f", "null", "-"]
+    threading.Timer(0.2, token.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(RenderCancelled):
+        _run(cmd, "тест", token)
+    assert time.monotonic() - started < 5
+
+
+@needs_ffmpeg
+def test_build_video_cancel_removes_partial_output(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    procs = []
+
+    class TrackedWriter(FrameWriter):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            procs.append(self.proc)
+
+    monkeypatch.setattr(pl, "FrameWriter", TrackedWriter, raising=True)
+    out = tmp_path / "out.mp4"
+    out.write_bytes(b"old")
+    token = CancelToken()
+
+    def encode_cb(p):
+        if p.frames >= 30:
+            token.cancel()
+
+    with pytest.raises(RenderCancelled):
+        pl.build_video(
+            images=_images(tmp_path), out=out, sec_per=20.0, fps=30, size=(90, 160),
+            motion="zoom", engine="ffmpeg", encode_cb=encode_cb, cancel=token,
+        )
+
+    assert len(procs) == 1 and procs[0].poll() is not None  # ffmpeg убит
+    assert out.read_bytes() == b"old"  # прежний ролик цел
+    assert sorted(f.name for f in tmp_path.iterdir()) == ["0.png", "1.png", "2.png", "out.mp4"]
+
+
+@needs_ffmpeg
+def test_build_video_cancel_stops_segment_workers(tmp_path: Path):
+    token = CancelToken()
+    threading.Timer(0.5, token.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(RenderCancelled):
+        # ~1.5 минуты видео: без отмены кодировалось бы заметно дольше
+        pl.build_video(
+            images=_images(tmp_path), out=tmp_path / "out.mp4", sec_per=30.0, fps=30, size=(180, 320),
+            motion="kenburns", engine="ffmpeg", segments=2, cancel=token,
+        )
+    assert time.monotonic() - started < 5
+    assert not list(tmp_path.glob("out*"))
+
+
+def test_cancelled_before_start(tmp_path: Path):
+    token = CancelToken()
+    token.cancel()
+    with pytest.raises(RenderCancelled):
+        pl.build_video(images=_images(tmp_path), out=tmp_path / "o.mp4", sec_per=1.0, fps=30, engine="ffmpeg", cancel=token)
+    assert not (tmp_path / "o.mp4").exists()
@@ -0,0 +1,143 @@
+import logging
+import shutil
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import vv.pipeline as pl
+from vv.profiling import Profiler
+
+
+def _img(path: Path, color=(200, 10, 10), size=(40, 30)) -> Path:
+    Image.new("RGB", size, color).save(path)
+    return path
+
+
+def test_shared_sources_hash_only_same_size_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    a = _img(tmp_path / "a.png")
+    b = tmp_path / "b.png"
+    shutil.copy(a, b)
+    c = _img(tmp_path / "c.png", color=(0, 0, 0), size=(80, 60))
+
+    hashed = []
+    digest = pl.file_digest
+    monkeypatch.setattr(pl, "file_digest", lambda p: hashed.append(Path(p).name) or digest(p), raising=True)
+
+    prepare = dict(size=(18, 32), bg="black", motion="none", fit_mode="cover", fancy_bg=False)
+    assert pl._shared_sources([a, c, b, a], [None] * 4, **prepare) == [0, 1, 0, 0]
+    assert "c.png" not in hashed  # размер уникален — файл не читается
+
+    # тот же файл, но другой сдвиг кадрирования — это другой слайд
+    assert pl._shared_sources([a, b], [None, (0.5, 0.0)], **prepare) == [0, 1]
+
+
+def test_build_video_prepares_duplicates_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, caplog):
+    a = _img(tmp_path / "a.png")
+    shutil.copy(a, tmp_path / "copy.png")
+    c = _img(tmp_path / "c.png", color=(0, 0, 200))
+    images = [a, tmp_path / "copy.png", c, a]
+
+    prepared: list[str] = []
+    fit = pl.fit_to_canvas
+
+    def counting_fit(path, **kwargs):
+        prepared.append(Path(path).name)
+        return fit(path, **kwargs)
+
+    slides = []
+
+    class Renderer(pl.SlideRenderer):
+        def __init__(self, slide, *args, **kwargs):
+            slides.append(slide)
+            super().__init__(slide, *args, **kwargs)
+
+    class FakeWriter:
+        def __init__(self, out, *args, **kwargs):
+            self.out = out
+
+        def write(self, frame):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            Path(self.out).write_bytes(b"")
+            return False
+
+    monkeypatch.setattr(pl, "fit_to_canvas", counting_fit, raising=True)
+    monkeypatch.setattr(pl, "SlideRenderer", Renderer, raising=True)
+    monkeypatch.setattr(pl, "FrameWriter", FakeWriter, raising=True)
+
+    profiler = Profiler(memory=False)
+    with caplog.at_level(logging.DEBUG, logger="vv.pipeline"):
+        pl.build_video(images=images, out=tmp_path / "o.mp4", sec_per=0.2, fps=10, size=(18, 32),
+                       motion="zoom", engine="ffmpeg", profiler=profiler)
+
+    assert prepared == ["a.png", "c.png"]
+    assert [s.path for s in slides] == [str(p) for p in images]
+    assert slides[1].frame is slides[0].frame and slides[3].frame is slides[0].frame  # битмап общий
+    assert profiler.report().meta["shared_slides"] == 2
+    assert "Одинаковых входов: 2 из 4" in caplog.text
+
+
+def test_segment_chunk_prepares_duplicates_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    a = _img(tmp_path / "a.png")
+    shutil.copy(a, tmp_path / "copy.png")
+    images = [a, tmp_path / "copy.png", a, _img(tmp_path / "c.png", color=(0, 0, 200))]
+
+    prepared: list[str] = []
+    fit = pl.fit_to_canvas
+
+    def counting_fit(path, **kwargs):
+        prepared.append(Path(path).name)
+        return fit(path, **kwargs)
+
+    class FakeWriter:
+        def __init__(self, out, *args, **kwargs):
+            pass
+
+        def write(self, frame):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(pl, "fit_to_canvas", counting_fit, raising=True)
+    monkeypatch.setattr(pl, "FrameWriter", FakeWriter, raising=True)
+
+    prepare = dict(size=(18, 32), bg="black", motion="zoom", fit_mode="fit", fancy_bg=False)
+    fps, sec_per = 10, 0.5
+    hits, misses, shared, _stats = pl._encode_chunk(
+        range(pl.frame_count(4, sec_per, 0.0, fps)), str(tmp_path / "chunk.mkv"),
+        paths=images, offsets=[None] * 4, moves=[("zoom", 0)] * 4, n=4, prepare=prepare,
+        motion="zoom", fit_mode="fit", sec_per=sec_per, fade=0.0, fps=fps, size=(18, 32),
+    )
+    assert prepared == ["a.png", "c.png"]
+    assert (hits, misses, shared) == (0, 2, 2)
+
+
+def _has_ffmpeg() -> bool:
+    from vv.ffmpeg import ffmpeg_exe
+
+    try:
+        ffmpeg_exe()
+    except RuntimeError:
+        return False
+    return True
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_segments_report_shared_slides(tmp_path: Path):
+    a = _img(tmp_path / "a.png")
+    images = [a, a, a, _img(tmp_path / "c.png", color=(0, 0, 200)), a, a]
+
+    profiler = Profiler(memory=False)
+    pl.build_video(images=images, out=tmp_path / "o.mp4", sec_per=0.5, fps=10, size=(18, 32),
+                   motion="zoom", engine="ffmpeg", segments=2, profiler=profiler)
+    # в каждом куске повторы "a.png" берут битмап у первого вхождения
+    assert profiler.report().meta["shared_slides"] >= 3
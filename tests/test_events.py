@@ -0,0 +1,100 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+from PIL import Image
+
+from vv.cli import main
+from vv.events import JsonlEvents
+from vv.ffmpeg import ffmpeg_exe
+from vv.progress import EncodeProgress
+
+
+def _has_ffmpeg() -> bool:
+    try:
+        ffmpeg_exe()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _events(text: str) -> list[dict]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def test_jsonl_events_stages_open_and_close_once():
+    buf = io.StringIO()
+    ev = JsonlEvents(buf, job="a")
+
+    ev.progress_cb(0, 2)
+    ev.progress_cb(1, 2)
+    ev.encode_cb(EncodeProgress(10, 20, 5.0, 2.0, 2.0))
+    ev.progress_cb(2, 2)
+    ev.progress_cb(3, 2)  # сигнал "кодирование" после последнего слайда
+    ev.encode_cb(EncodeProgress(20, 20, 5.0, 4.0, 0.0))
+    ev.close_stages()
+
+    events = _events(buf.getvalue())
+    assert all(e["job"] == "a" and "t" in e for e in events)
+    stages = [(e["stage"], e["phase"]) for e in events if e["event"] == "stage"]
+    assert stages == [("prepare", "start"), ("encode", "start"), ("prepare", "end"), ("encode", "end")]
+    assert [e["done"] for e in events if e["event"] == "prepared"] == [1, 2]
+    assert [e["frames"] for e in events if e["event"] == "encode"] == [10, 20]
+
+
+def test_jsonl_events_close_unfinished_stages():
+    buf = io.StringIO()
+    ev = JsonlEvents(buf)
+    ev.progress_cb(0, 5)
+    ev.close_stages()
+    ev.close_stages()
+    stages = [(e["stage"], e["phase"]) for e in _events(buf.getvalue()) if e["event"] == "stage"]
+    assert stages == [("prepare", "start"), ("prepare", "end")]
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_cli_progress_jsonl(tmp_path: Path):
+    for i in range(2):
+        Image.new("RGB", (40, 30), (i * 100, 0, 0)).save(tmp_path / f"{i}.png")
+    out = tmp_path / "out" / "video.mp4"
+
+    result = CliRunner().invoke(
+        main,
+        [
+            "-i", str(tmp_path), "-o", str(out),
+            "--engine", "ffmpeg", "--width", "32", "--height", "48", "--sec-per", "0.5",
+            "--progress", "jsonl", "--info",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+
+    # в stdout — только события; текст (--info, "Готово") ушёл в stderr
+    events = _events(result.stdout)
+    kinds = [e["event"] for e in events]
+    assert kinds[0] == "start" and kinds[-1] == "done"
+    assert {"stage", "prepared", "encode", "cache"} <= set(kinds)
+    done = events[-1]
+    assert done["out"] == str(out)
+    assert done["bytes"] == out.stat().st_size > 0
+    assert "encode" in done["stages"]
+    assert "Готово" in result.stderr
+
+
+def test_cli_progress_jsonl_reports_error(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    import vv.pipeline as pl
+
+    Image.new("RGB", (40, 30)).save(tmp_path / "0.png")
+
+    def boom(**kwargs):
+        raise RuntimeError("ffmpeg упал")
+
+    monkeypatch.setattr(pl, "build_video", boom, raising=True)
+    result = CliRunner().invoke(
+        main,
+        ["-i", str(tmp_path), "-o", str(tmp_path / "o.mp4"), "--progress", "jsonl"],
+    )
+    assert result.exit_code != 0
+    last = _events(result.stdout)[-1]
+    assert last == {"event": "error", "t": last["t"], "type": "RuntimeError", "message": "ffmpeg упал"}
@@ -1,5 +1,86 @@
-from vv.image import fit_to_canvas
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
+
+import vv.image as vi
+from vv.image import DRAFT_MARGIN, blurred_background, fit_to_canvas, load_image
+
 
 def test_fit_to_canvas_aspect():
     out = fit_to_canvas("examples/images/test_frame_1.png", size=(1080, 1920), bg="black")
-    assert out.size == (1080, 1920)
\ No newline at end of file
+    assert out.size == (1080, 1920)
+
+def _noisy_jpeg(path, size, orientation=None):
+    rng = np.random.default_rng(0)
+    # гладкий градиент + мелкая текстура: и draft, и ресайз есть на чём проверить
+    w, h = size
+    yy, xx = np.mgrid[0:h, 0:w]
+    base = np.stack([xx * 255 // w, yy * 255 // h, (xx + yy) * 127 // (w + h)], axis=-1)
+    noise = rng.integers(-20, 20, (h // 16 + 1, w // 16 + 1, 3)).repeat(16, 0).repeat(16, 1)[:h, :w]
+    im = Image.fromarray(np.clip(base + noise, 0, 255).astype("uint8"))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    im.save(path, quality=92, exif=exif)
+
+
+def test_load_image_drafts_large_jpeg(tmp_path):
+    src = tmp_path / "big.jpg"
+    _noisy_jpeg(src, (2400, 3200))
+
+    im, src_size = load_image(src, (270, 480))
+    assert src_size == (2400, 3200)
+    # декодировано меньше исходника, но с запасом над целевым размером
+    assert im.width < 2400
+    assert im.width >= 270 * DRAFT_MARGIN
+
+    full, _ = load_image(src)
+    assert full.size == (2400, 3200)
+
+
+def test_load_image_swaps_size_for_exif_rotation(tmp_path):
+    src = tmp_path / "rot.jpg"
+    _noisy_jpeg(src, (3200, 2400), orientation=6)
+
+    im, src_size = load_image(src, (270, 480))
+    assert src_size == (2400, 3200)
+    assert im.width < im.height
+
+
+def test_fit_to_canvas_draft_within_tolerance(tmp_path, monkeypatch):
+    src = tmp_path / "big.jpg"
+    _noisy_jpeg(src, (2400, 3200))
+
+    for mode, fancy in (("fit", True), ("cover", False)):
+        fast = np.asarray(fit_to_canvas(src, size=(270, 480), mode=mode, fancy_bg=fancy), dtype=np.float64)
+        with monkeypatch.context() as m:
+            m.setattr(vi, "DRAFT_MARGIN", float("inf"))  # без уменьшения при декоде
+            ref = np.asarray(fit_to_canvas(src, size=(270, 480), mode=mode, fancy_bg=fancy), dtype=np.float64)
+
+        assert fast.shape == ref.shape
+        psnr = 10 * np.log10(255 ** 2 / np.mean((fast - ref) ** 2))
+        assert psnr > 40, (mode, psnr)
+
+
+def _psnr(a, b):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return 10 * np.log10(255 ** 2 / np.mean((a - b) ** 2))
+
+
+def test_blurred_background_matches_full_resolution_blur(tmp_path):
+    src = tmp_path / "src.jpg"
+    _noisy_jpeg(src, (900, 1400))
+    im = Image.open(src).convert("RGB")
+    size = (360, 640)
+
+    # fit + fancy_bg: растянуть, размыть (30), затемнить вдвое
+    ref = ImageEnhance.Brightness(im.resize(size, Image.LANCZOS).filter(ImageFilter.GaussianBlur(30))).enhance(0.5)
+    fast = blurred_background(im, size, radius=30, brightness=0.5)
+    assert fast.size == size
+    assert _psnr(fast, ref) > 45
+
+    # kenburns + fit: обрезать под кадр, размыть (35)
+    ref = ImageOps.fit(im, size, Image.LANCZOS).filter(ImageFilter.GaussianBlur(35))
+    fast = blurred_background(im, size, radius=35, crop=True)
+    assert fast.size == size
+    assert _psnr(fast, ref) > 45
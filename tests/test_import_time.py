@@ -0,0 +1,77 @@
+"""
+Время старта точек входа (python -X importtime).
+
+Тесты следят, чтобы "import vv", CLI и GUI не тянули тяжёлые модули до рендера.
+Запуск как скрипта печатает замеры:  python tests/test_import_time.py
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+ENTRY_POINTS = ["vv", "vv.cli", "vv.gui"]
+
+# грузятся только когда начинается рендер или превью
+HEAVY = ("moviepy", "numpy", "PIL")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(module: str) -> dict[str, int]:
+    """Модуль -> суммарное время импорта (мкс) для "import module" в чистом процессе."""
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    assert res.returncode == 0, res.stderr
+    return {m.group(4): int(m.group(2)) for m in map(_LINE.match, res.stderr.splitlines()) if m}
+
+
+def _needs(module: str) -> None:
+    if module == "vv.gui":
+        pytest.importorskip("tkinter")
+        if importlib.util.find_spec("sv_ttk") is None:
+            pytest.skip("нет sv_ttk")
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point_skips_heavy_modules(module: str):
+    _needs(module)
+    loaded = import_profile(module)
+    assert module in loaded
+    assert [m for m in loaded if m.split(".")[0] in HEAVY] == []
+
+
+def test_build_video_still_importable_from_package():
+    res = subprocess.run(
+        [sys.executable, "-c", "import vv, sys; f = vv.build_video; print('moviepy' in sys.modules)"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    assert res.returncode == 0, res.stderr
+    # moviepy нужен только engine="moviepy" — и при импорте build_video не грузится
+    assert res.stdout.strip() == "False"
+
+
+if __name__ == "__main__":
+    for module in ENTRY_POINTS + ["vv.pipeline"]:
+        try:
+            loaded = import_profile(module)
+        except AssertionError as e:
+            print(f"{module}: не импортируется ({str(e).strip().splitlines()[-1]})")
+            continue
+        top = sorted(((m, us) for m, us in loaded.items() if m != module), key=lambda kv: kv[1], reverse=True)[:5]
+        print(f"{module}: {loaded[module] / 1000:.1f} ms")
+        for name, us in top:
+            print(f"    {name:<30} {us / 1000:8.1f} ms")
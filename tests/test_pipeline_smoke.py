@@ -6,6 +6,7 @@ import pytest
 from PIL import Image
 
 import vv.pipeline as pl
+import vv.plan as planner
 
 
 class FakeEffect:
@@ -95,8 +96,6 @@ def test_pipeline_smoke_no_encoding(tmp_path: Path, monkeypatch: pytest.MonkeyPa
 
     monkeypatch.setattr(pl, "concatenate_videoclips", fake_concat, raising=True)
 
-    # audio не трогаем в этом тесте
-    monkeypatch.setattr(pl, "prepare_audio", lambda *a, **k: None, raising=True)
 
     result = pl.build_video(
         images=[img1, img2],
@@ -143,7 +142,7 @@ def test_pipeline_transitions_apply_crossfade(tmp_path: Path, monkeypatch: pytes
     monkeypatch.setattr(pl, "ImageClip", lambda _arr: FakeClip(), raising=True)
 
     # фиксируем fade и эффект
-    monkeypatch.setattr(pl, "fade_for", lambda _sec_per: 0.4, raising=True)
+    monkeypatch.setattr(planner, "fade_for", lambda _sec_per: 0.4, raising=True)
     monkeypatch.setattr(pl, "CrossFadeIn", lambda fade: FakeEffect("crossfadein", fade), raising=True)
 
     seen: dict = {}
@@ -156,7 +155,6 @@ def test_pipeline_transitions_apply_crossfade(tmp_path: Path, monkeypatch: pytes
         return FakeVideo(total)
 
     monkeypatch.setattr(pl, "concatenate_videoclips", fake_concat, raising=True)
-    monkeypatch.setattr(pl, "prepare_audio", lambda *a, **k: None, raising=True)
 
     pl.build_video(
         images=[img1, img2],
@@ -177,4 +175,48 @@ def test_pipeline_transitions_apply_crossfade(tmp_path: Path, monkeypatch: pytes
     eff = clips[1].effects[0]
     assert getattr(eff, "name", None) == "crossfadein"
     assert getattr(eff, "arg", None) == 0.4
-    assert seen["padding"] == -0.4
\ No newline at end of file
+    assert seen["padding"] == -0.4
+
+def test_pipeline_workers_keep_order(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    imgs = []
+    for i in range(5):
+        p = tmp_path / f"{i}.png"
+        # цвет картинки = её номер, чтобы проверить порядок после пула процессов
+        # (подмена fit_to_canvas в процессы пула не попадает: они стартуют через spawn)
+        Image.new("RGB", (64, 36), (40 * i, 40 * i, 40 * i)).save(p)
+        imgs.append(p)
+
+    out = tmp_path / "out.mp4"
+
+    seen: list[int] = []
+
+    def fake_image_clip(arr):
+        seen.append(int(arr[0, 0, 0]))
+        return FakeClip()
+
+    monkeypatch.setattr(pl, "ImageClip", fake_image_clip, raising=True)
+    monkeypatch.setattr(pl, "concatenate_videoclips", lambda clips, **_k: FakeVideo(1.0), raising=True)
+
+    progress: list[tuple[int, int]] = []
+
+    pl.build_video(
+        images=imgs,
+        out=out,
+        sec_per=0.2,
+        fps=24,
+        size=(36, 64),
+        progress_cb=lambda cur, total: progress.append((cur, total)),
+        fit_mode="cover",
+        workers=2,
+    )
+
+    assert seen == [0, 40, 80, 120, 160]
+    assert progress[:6] == [(0, 5), (1, 5), (2, 5), (3, 5), (4, 5), (5, 5)]
+
+
+def test_bad_workers_raises(tmp_path: Path):
+    img = tmp_path / "1.png"
+    _mk_img(img)
+
+    with pytest.raises(ValueError, match="workers"):
+        pl.build_video(images=[img], out=tmp_path / "out.mp4", sec_per=1.0, fps=30, workers=0)
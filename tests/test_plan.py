@@ -0,0 +1,198 @@
+import json
+import random
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import vv.pipeline as pl
+from vv.duration import fade_for
+from vv.plan import RenderPlan, assign_moves, make_plan
+
+
+def test_assign_moves_depends_only_on_seed():
+    random.seed(123)
+    state = random.getstate()
+    a = assign_moves(50, seed=7)
+    assert random.getstate() == state  # глобальный random не трогается
+    assert assign_moves(50, seed=7) == a
+    assert assign_moves(50, seed=8) != a
+    assert {m for m, _ in a} <= {"zoom", "pan"} and {d for _, d in a} <= {0, 1}
+    # серии по 2-4 слайда: первые слайды префикса не зависят от длины ролика
+    assert assign_moves(10, seed=7) == a[:10]
+
+
+def test_make_plan_timeline_and_roundtrip(tmp_path: Path):
+    paths = [tmp_path / f"{i}.jpg" for i in range(4)]  # файлов нет: план их не читает
+    fade = fade_for(2.0)
+    plan = make_plan(paths, sec_per=2.0, fps=30, transitions=True, motion="kenburns",
+                     offsets=[None, (0.5, -0.25), None, None], seed=3)
+
+    assert plan.fade == pytest.approx(fade) and plan.step == pytest.approx(2.0 - fade)
+    assert [s.start for s in plan.slides] == pytest.approx([k * plan.step for k in range(4)])
+    assert all(s.end - s.start == pytest.approx(2.0) for s in plan.slides)
+    assert plan.duration == pytest.approx(plan.slides[-1].end)
+    assert plan.offsets[1] == (0.5, -0.25)
+
+    data = json.loads(json.dumps(plan.to_dict()))
+    assert RenderPlan.from_dict(data) == plan
+    plan.write(tmp_path / "plan.json")
+    assert RenderPlan.read(tmp_path / "plan.json") == plan
+
+    with pytest.raises(ValueError, match="версия"):
+        RenderPlan.from_dict({**data, "version": 99})
+
+
+def test_make_plan_resolves_total_duration(tmp_path: Path):
+    paths = [tmp_path / f"{i}.jpg" for i in range(5)]
+    plan = make_plan(paths, sec_per=99.0, fps=30, transitions=True, total_duration=20.0)
+    assert plan.duration == pytest.approx(20.0)
+    assert plan.fade == pytest.approx(fade_for(plan.sec_per))
+
+    plan = make_plan(paths, sec_per=99.0, fps=30, total_duration=20.0)
+    assert (plan.sec_per, plan.fade) == (4.0, 0.0)
+    assert make_plan(paths[:1], sec_per=3.0, fps=30, transitions=True).fade == 0.0
+
+
+def test_build_video_renders_the_seeded_plan(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    imgs = []
+    for i in range(6):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (40, 30), (i * 40, 0, 0)).save(p)
+        imgs.append(p)
+
+    seen: list[list[tuple[str, int]]] = []
+
+    class Renderer(pl.SlideRenderer):
+        def __init__(self, slide, move_type, direction_flag, **kwargs):
+            seen[-1].append((move_type, direction_flag))
+            super().__init__(slide, move_type, direction_flag, **kwargs)
+
+    class FakeWriter:
+        def __init__(self, out, *args, **kwargs):
+            self.out = out
+
+        def write(self, frame):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            Path(self.out).write_bytes(b"")
+            return False
+
+    monkeypatch.setattr(pl, "FrameWriter", FakeWriter, raising=True)
+    monkeypatch.setattr(pl, "SlideRenderer", Renderer, raising=True)
+
+    def render(seed: int):
+        seen.append([])
+        random.seed(seed + 100)  # глобальный random не должен влиять на ролик
+        pl.build_video(images=imgs, out=tmp_path / "o.mp4", sec_per=0.2, fps=10, size=(18, 32),
+                       motion="kenburns", engine="ffmpeg", seed=seed)
+        return seen[-1]
+
+    assert render(1) == render(1) == assign_moves(6, seed=1)
+    assert render(2) == assign_moves(6, seed=2)
+
+
+def test_build_video_renders_a_saved_plan(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    imgs = []
+    for i in range(4):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (40, 30), (i * 40, 0, 0)).save(p)
+        imgs.append(p)
+
+    rendered = []
+
+    class Renderer(pl.SlideRenderer):
+        def __init__(self, slide, move_type, direction_flag, **kwargs):
+            rendered.append((move_type, direction_flag, kwargs["start"], kwargs["sec_per"]))
+            super().__init__(slide, move_type, direction_flag, **kwargs)
+
+    class FakeWriter:
+        def __init__(self, out, *args, **kwargs):
+            self.out = out
+
+        def write(self, frame):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            Path(self.out).write_bytes(b"")
+            return False
+
+    monkeypatch.setattr(pl, "FrameWriter", FakeWriter, raising=True)
+    monkeypatch.setattr(pl, "SlideRenderer", Renderer, raising=True)
+
+    # план сохраняется и рендерится потом — без seed и sec_per
+    make_plan(imgs, sec_per=0.3, fps=10, transitions=True, motion="kenburns", seed=5).write(tmp_path / "plan.json")
+    plan = RenderPlan.read(tmp_path / "plan.json")
+    pl.build_video(images=imgs, out=tmp_path / "o.mp4", sec_per=0, fps=10, size=(18, 32), transitions=True,
+                   motion="kenburns", engine="ffmpeg", plan=plan)
+    assert rendered == [(s.move, s.direction, pytest.approx(s.start), plan.sec_per) for s in plan.slides]
+
+    common = dict(out=tmp_path / "o.mp4", sec_per=0.3, size=(18, 32), engine="ffmpeg", plan=plan)
+    with pytest.raises(ValueError, match="других картинок"):
+        pl.build_video(images=imgs[::-1], fps=10, transitions=True, motion="kenburns", **common)
+    with pytest.raises(ValueError, match="fps"):
+        pl.build_video(images=imgs, fps=30, transitions=True, motion="kenburns", **common)
+    with pytest.raises(ValueError, match="motion"):
+        pl.build_video(images=imgs, fps=10, transitions=True, motion="zoom", **common)
+    with pytest.raises(ValueError, match="transitions"):
+        pl.build_video(images=imgs, fps=10, motion="kenburns", **common)
+
+
+def test_cli_plan_file_resumes_the_same_render(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    from click.testing import CliRunner
+
+    from vv.cli import main
+
+    folder = tmp_path / "imgs"
+    folder.mkdir()
+    for i in range(5):
+        Image.new("RGB", (40, 30), (i * 40, 0, 0)).save(folder / f"{i}.png")
+
+    seen: list[list[tuple[str, int]]] = []
+
+    class Renderer(pl.SlideRenderer):
+        def __init__(self, slide, move_type, direction_flag, **kwargs):
+            seen[-1].append((move_type, direction_flag))
+            super().__init__(slide, move_type, direction_flag, **kwargs)
+
+    class FakeWriter:
+        def __init__(self, out, *args, **kwargs):
+            self.out = out
+
+        def write(self, frame):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            Path(self.out).write_bytes(b"x")
+            return False
+
+    monkeypatch.setattr(pl, "FrameWriter", FakeWriter, raising=True)
+    monkeypatch.setattr(pl, "SlideRenderer", Renderer, raising=True)
+
+    plan_file = tmp_path / "job" / "plan.json"
+    args = ["-i", str(folder), "--plan", str(plan_file), "--engine", "ffmpeg", "--motion", "kenburns",
+            "--width", "18", "--height", "32", "--sec-per", "0.3", "--fps", "24"]
+    for out, seed in (("a.mp4", "4"), ("b.mp4", "9")):
+        seen.append([])
+        result = CliRunner().invoke(main, [*args, "-o", str(tmp_path / out), "--seed", seed])
+        assert result.exit_code == 0, result.output
+
+    # второй запуск взял сохранённый план (seed 4), а не построил новый
+    assert seen[0] == seen[1] == assign_moves(5, seed=4)
+    assert RenderPlan.read(plan_file).seed == 4
+
+    # план от других картинок — понятная ошибка, а не трейсбек из рендера
+    (folder / "5.png").write_bytes((folder / "0.png").read_bytes())
+    result = CliRunner().invoke(main, [*args, "-o", str(tmp_path / "c.mp4")])
+    assert result.exit_code == 1 and isinstance(result.exception, SystemExit)
+    assert "не подходит" in result.output and "других картинок" in result.output
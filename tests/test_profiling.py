@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import vv.pipeline as pl
+from vv import profiling
+from vv.profiling import LAST_SLIDE, Profiler, stage
+
+
+def test_stage_is_noop_without_profiler():
+    assert profiling.current() is None
+    with stage("decode", 0):
+        pass
+
+
+def test_nested_stages_are_exclusive():
+    with Profiler(memory=False) as p:
+        with stage("encode"):
+            time.sleep(0.02)
+            with stage("prepare", 1):
+                time.sleep(0.05)
+            time.sleep(0.02)
+        with stage("encode", LAST_SLIDE):
+            pass
+
+    report = p.report()
+    assert report.stages["prepare"].seconds == pytest.approx(0.05, abs=0.03)
+    assert report.stages["encode"].seconds == pytest.approx(0.04, abs=0.03)
+    assert report.stages["encode"].calls == 2
+    assert set(report.slides[1]) == {"prepare", "encode"}  # LAST_SLIDE -> слайд 1
+    assert report.wall_seconds >= report.stages["prepare"].seconds + report.stages["encode"].seconds
+    assert profiling.current() is None
+
+
+def test_merge_attributes_stats_to_slide():
+    with Profiler(memory=False) as inner, stage("decode"):
+        pass
+    outer = Profiler(memory=False)
+    outer.merge(inner.stats(), slide=3)
+    outer.merge(inner.stats(), slide=3)
+    assert outer.stages["decode"].calls == 2
+    assert outer.slides[3]["decode"].calls == 2
+
+
+def test_memory_peak_is_tracked():
+    with Profiler() as p, stage("blur"):
+        buf = bytearray(8 * 1024 * 1024)
+        del buf
+    assert p.report().stages["blur"].peak_bytes >= 8 * 1024 * 1024
+
+
+def test_profilers_in_threads_are_separate():
+    barrier = threading.Barrier(2)
+    profilers = {}
+
+    def render(name: str) -> None:
+        with Profiler(memory=False) as p:
+            barrier.wait()  # оба профайлера включены одновременно
+            with stage(name):
+                time.sleep(0.02)
+            barrier.wait()
+        profilers[name] = p
+
+    threads = [threading.Thread(target=render, args=(name,)) for name in ("decode", "blur")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert set(profilers["decode"].stages) == {"decode"}
+    assert set(profilers["blur"].stages) == {"blur"}
+    assert profiling.current() is None
+
+
+def test_out_of_order_exit_leaves_no_dead_profiler():
+    outer, inner = Profiler(memory=False), Profiler(memory=False)
+    outer.__enter__()
+    inner.__enter__()
+    outer.__exit__(None, None, None)
+    assert profiling.current() is inner
+    inner.__exit__(None, None, None)
+    assert profiling.current() is None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_build_video_profile(tmp_path: Path, monkeypatch, workers: int):
+    imgs = []
+    for i in range(3):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (40, 30), (i * 50, 0, 0)).save(p)
+        imgs.append(p)
+
+    class FakeWriter:
+        def __init__(self, out, size, fps, **kwargs):
+            self.out = out
+
+        def write(self, frame):
+            with stage("encode", LAST_SLIDE):
+                pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            Path(self.out).write_bytes(b"")
+            return False
+
+    monkeypatch.setattr(pl, "FrameWriter", FakeWriter, raising=True)
+
+    profiler = Profiler()
+    pl.build_video(
+        images=imgs,
+        out=tmp_path / "out.mp4",
+        sec_per=0.5,
+        fps=10,
+        size=(18, 32),
+        fancy_bg=True,
+        transitions=True,
+        motion="zoom",
+        engine="ffmpeg",
+        workers=workers,
+        profiler=profiler,
+    )
+    report = profiler.report()
+
+    assert {"prepare", "decode", "resize", "blur", "compose", "encode"} <= set(report.stages)
+    assert sorted(report.slides) == [0, 1, 2]
+    for stages in report.slides.values():
+        assert {"decode", "compose", "encode"} <= set(stages)
+    assert report.meta["slides"] == 3
+    assert report.meta["workers"] == workers
+
+    path = tmp_path / "profile.json"
+    report.write(path)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert [s["slide"] for s in data["slides"]] == [0, 1, 2]
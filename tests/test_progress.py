@@ -0,0 +1,141 @@
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import vv.pipeline as pl
+from vv.duration import fade_for
+from vv.ffmpeg import ffmpeg_exe
+from vv.progress import FrameProgress, format_eta
+from vv.render import frame_count, write_stills
+
+from test_render import _renderers
+
+
+def _has_ffmpeg() -> bool:
+    try:
+        ffmpeg_exe()
+    except RuntimeError:
+        return False
+    return True
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def test_frame_progress_rate_and_eta():
+    clock = Clock()
+    events = []
+    progress = FrameProgress(100, events.append, interval=0.5, clock=clock)
+
+    for _ in range(20):
+        clock.t += 0.125
+        progress.advance()
+
+    # не чаще раза в interval: первый кадр и дальше каждые 4 кадра
+    assert [p.frames for p in events] == [1, 5, 9, 13, 17]
+    last = events[-1]
+    assert last.fps == pytest.approx(8.0)
+    assert last.eta == pytest.approx(83 / 8.0)
+    assert last.elapsed == pytest.approx(2.125)
+
+
+def test_frame_progress_skip_counts_frames_but_not_rate():
+    clock = Clock()
+    events = []
+    progress = FrameProgress(100, events.append, interval=0.0, clock=clock)
+
+    progress.skip(90)
+    assert events[-1].frames == 90
+    assert events[-1].eta is None  # скорость ещё неизвестна
+
+    clock.t = 1.0
+    progress.advance(5)
+    assert events[-1].fps == pytest.approx(5.0)
+    assert events[-1].eta == pytest.approx(1.0)
+
+    clock.t = 2.0
+    progress.advance(5)
+    assert events[-1].done and events[-1].eta == 0.0
+
+
+def test_frame_progress_finish_reports_total_once():
+    events = []
+    progress = FrameProgress(10, events.append)
+    progress.advance(10)
+    progress.finish()
+    assert [p.frames for p in events] == [10]
+
+    progress = FrameProgress(10, events.append)
+    progress.advance(9)
+    progress.finish()
+    assert events[-1].frames == 10 and events[-1].fraction == 1.0
+
+
+def test_format_eta():
+    assert format_eta(None) == "?"
+    assert format_eta(65.4) == "1:05"
+    assert format_eta(3725) == "1:02:05"
+
+
+def test_build_video_reports_encoded_frames(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    imgs = []
+    for i in range(3):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (40, 30), (i * 50, 0, 0)).save(p)
+        imgs.append(p)
+
+    class FakeWriter:
+        def __init__(self, out, size, fps, **kwargs):
+            self.out = out
+
+        def write(self, frame):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            Path(self.out).write_bytes(b"")
+            return False
+
+    monkeypatch.setattr(pl, "FrameWriter", FakeWriter, raising=True)
+
+    events = []
+    legacy = []
+    pl.build_video(
+        images=imgs,
+        out=tmp_path / "out.mp4",
+        sec_per=1.0,
+        fps=10,
+        size=(18, 32),
+        motion="zoom",
+        transitions=True,
+        engine="ffmpeg",
+        progress_cb=lambda current, total: legacy.append((current, total)),
+        encode_cb=events.append,
+    )
+
+    total = frame_count(3, 1.0, fade_for(1.0), 10)
+    frames = [p.frames for p in events]
+    assert frames == sorted(frames)
+    assert events[-1].frames == events[-1].total == total
+    assert events[-1].done
+    # старый протокол из двух чисел не изменился
+    assert legacy[0] == (0, 3) and legacy[-1] == (4, 3)
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_write_stills_counts_timeline_frames(tmp_path: Path):
+    events = []
+    progress = FrameProgress(frame_count(3, 1.0, 0.0, 10), events.append, interval=0.0)
+    write_stills(_renderers([0, 100, 200]), tmp_path / "out.mp4", sec_per=1.0, fade=0.0, fps=10, size=(8, 4), progress=progress)
+
+    # каждый слайд — один закодированный кадр, но засчитывается всей длительностью
+    assert events[-1].frames == 30
+    assert events[-1].done
@@ -0,0 +1,487 @@
+from __future__ import annotations
+
+import re
+import subprocess
+import wave
+import weakref
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import vv.pipeline as pl
+from vv.audio import prepare_audio_track
+from vv.cache import SegmentCache
+from vv.duration import fade_for
+from vv.ffmpeg import audio_codec, ffmpeg_exe
+from vv.motion import Move, MotionCurve, ease
+from vv.render import (
+    Crossfade,
+    SlideRenderer,
+    frame_count,
+    iter_frames,
+    slides_for,
+    split_timeline,
+    timeline_runs,
+    write_stills,
+)
+
+
+def _has_ffmpeg() -> bool:
+    try:
+        ffmpeg_exe()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _probe_duration(path: Path) -> float:
+    res = subprocess.run([ffmpeg_exe(), "-i", str(path)], capture_output=True, text=True)
+    m = re.search(r"Duration: (\d+):(\d+):([\d.]+)", res.stderr)
+    assert m, res.stderr
+    h, mnt, sec = m.groups()
+    return int(h) * 3600 + int(mnt) * 60 + float(sec)
+
+
+def _static(value: int, size=(8, 4)) -> pl.PreparedSlide:
+    w, h = size
+    frame = np.full((h, w, 3), value, dtype=np.uint8)
+    return pl.PreparedSlide(path=f"{value}.png", src_size=size, frame=frame)
+
+
+def _renderers(values, *, motion="none", sec_per=1.0, size=(8, 4)):
+    return [
+        SlideRenderer(_static(v, size), "zoom", 0, motion=motion, fit_mode="cover", sec_per=sec_per, size=size)
+        for v in values
+    ]
+
+
+def test_frame_count_matches_duration():
+    assert frame_count(3, 1.0, 0.0, 10) == 30
+    assert frame_count(3, 1.0, 0.3, 10) == 24  # 3 - 2*0.3 = 2.4s
+
+
+def test_iter_frames_no_transitions_in_order():
+    frames = [int(f[0, 0, 0]) for f in iter_frames(_renderers([0, 100, 200]), sec_per=1.0, fade=0.0, fps=4, size=(8, 4))]
+    assert frames == [0] * 4 + [100] * 4 + [200] * 4
+
+
+def test_iter_frames_crossfade_blends_overlap_only():
+    frames = [int(f[0, 0, 0]) for f in iter_frames(_renderers([0, 200]), sec_per=1.0, fade=0.5, fps=4, size=(8, 4))]
+    # шаг 0.5с: кадры 0,1 — первый слайд; 2,3 — переход (a = 0, 0.5); дальше второй
+    assert len(frames) == 6
+    assert frames[:2] == [0, 0]
+    assert frames[2] == 0
+    assert frames[3] == 100
+    assert frames[4:] == [200, 200]
+
+
+def test_iter_frames_streams_slides_with_bounded_window():
+    alive: set[int] = set()
+    peak = 0
+
+    def lazy(values):
+        nonlocal peak
+        for v in values:
+            slide = _static(v)
+            weakref.finalize(slide, alive.discard, v)
+            alive.add(v)
+            peak = max(peak, len(alive))
+            r = SlideRenderer(slide, "zoom", 0, motion="none", fit_mode="cover", sec_per=1.0, size=(8, 4))
+            del slide
+            yield r
+
+    values = list(range(0, 200, 10))
+    frames = [int(f[0, 0, 0]) for f in iter_frames(lazy(values), n=len(values), sec_per=1.0, fade=0.5, fps=4, size=(8, 4))]
+
+    assert len(frames) == frame_count(len(values), 1.0, 0.5, 4)
+    assert frames[-1] == values[-1]
+    # в памяти только текущий и предыдущий слайд (+ только что подготовленный)
+    assert peak <= 3
+
+
+def test_iter_frames_lazy_needs_n():
+    with pytest.raises(ValueError, match="n"):
+        next(iter_frames(iter(_renderers([0])), sec_per=1.0, fade=0.0, fps=4, size=(8, 4)))
+
+
+def test_crossfade_fixed_point_matches_float_blend():
+    rng = np.random.default_rng(0)
+    prev = rng.integers(0, 256, (8, 6, 3), dtype=np.uint8)
+    cur = rng.integers(0, 256, (8, 6, 3), dtype=np.uint8)
+    fader = Crossfade((6, 8))
+    out = np.empty_like(prev)
+
+    for a in (0.0, 0.1, 0.37, 0.5, 0.93, 1.0):
+        expected = prev * (1.0 - a) + cur * a
+        got = fader.blend(prev, cur, a, out)
+        assert got is out
+        assert np.abs(got.astype(np.float64) - expected).max() <= 1.0
+
+    assert np.array_equal(fader.blend(prev, cur, 0.0, out), prev)
+    assert np.array_equal(fader.blend(prev, cur, 1.0, out), cur)
+
+
+def test_zoom_keeps_canvas_size():
+    r = _renderers([50], motion="zoom", size=(16, 8))[0]
+    out = np.empty((8, 16, 3), dtype=np.uint8)
+    for t in (0.0, 0.5, 1.0):
+        assert r.render(t, out).shape == (8, 16, 3)
+
+
+def test_pipeline_ffmpeg_engine_writes_frames(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    imgs = []
+    for i in range(2):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (64, 48), (i * 100, 0, 0)).save(p)
+        imgs.append(p)
+
+    written: list[int] = []
+    opened: dict = {}
+
+    class FakeWriter:
+        def __init__(self, out, size, fps, **kwargs):
+            opened.update(out=str(out), size=size, fps=fps, **kwargs)
+
+        def write(self, frame):
+            assert frame.shape == (32, 18, 3)
+            written.append(int(frame[16, 9, 0]))
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            Path(opened["out"]).write_bytes(b"")
+            return False
+
+    monkeypatch.setattr(pl, "FrameWriter", FakeWriter, raising=True)
+
+    out = tmp_path / "out.mp4"
+    result = pl.build_video(
+        images=imgs,
+        out=out,
+        sec_per=0.5,
+        fps=10,
+        size=(18, 32),
+        fit_mode="cover",
+        motion="zoom",
+        engine="ffmpeg",
+    )
+
+    assert result == str(out)
+    # без аудио видеопоток пишется прямо рядом с out и только целиком переименовывается в него
+    assert opened["out"] == str(tmp_path / "out.part.mp4")
+    assert out.exists() and not Path(opened["out"]).exists()
+    assert opened["duration"] == pytest.approx(1.0)
+    assert "audio" not in opened
+    assert written == [0] * 5 + [100] * 5
+
+
+def test_bad_engine_raises(tmp_path: Path):
+    img = tmp_path / "1.png"
+    Image.new("RGB", (10, 10)).save(img)
+    with pytest.raises(ValueError, match="engine"):
+        pl.build_video(images=[img], out=tmp_path / "o.mp4", sec_per=1.0, fps=30, engine="gpu")
+
+
+def test_timeline_runs_split_slides_and_transitions():
+    runs = timeline_runs(3, sec_per=1.0, fade=0.25, fps=8)
+    # шаг 0.75с = 6 кадров, переход 0.25с = 2 кадра; всего 2.5с = 20 кадров
+    assert [(r.k, r.start, r.count, r.blend) for r in runs] == [
+        (0, 0, 6, False),
+        (1, 6, 2, True),
+        (1, 8, 4, False),
+        (2, 12, 2, True),
+        (2, 14, 6, False),
+    ]
+    assert sum(r.count for r in runs) == frame_count(3, 1.0, 0.25, 8)
+
+
+def test_pipeline_static_ffmpeg_engine_uses_stills(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    img = tmp_path / "1.png"
+    Image.new("RGB", (64, 48)).save(img)
+
+    seen: dict = {}
+
+    def fake_write_stills(renderers, out_path, **kwargs):
+        seen["slides"] = list(renderers)
+        seen.update(kwargs)
+        Path(out_path).write_bytes(b"")
+
+    monkeypatch.setattr(pl, "write_stills", fake_write_stills, raising=True)
+    monkeypatch.setattr(pl, "FrameWriter", None, raising=True)  # покадровая запись не нужна
+
+    pl.build_video(images=[img, img], out=tmp_path / "out.mp4", sec_per=2.0, fps=30, size=(18, 32), engine="ffmpeg")
+
+    assert seen["n"] == 2
+    assert len(seen["slides"]) == 2
+    assert seen["fade"] == 0.0
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="No ffmpeg in environment")
+def test_write_stills_encodes_exact_duration(tmp_path: Path):
+    out = tmp_path / "still.mp4"
+    write_stills(
+        _renderers([0, 120, 240], size=(16, 16)),
+        out,
+        sec_per=1.0,
+        fade=0.3,
+        fps=10,
+        size=(16, 16),
+    )
+    assert out.exists()
+    assert _probe_duration(out) == pytest.approx(2.4, abs=0.05)
+
+
+def test_motion_curve_precomputed_on_timeline_grid():
+    mv = Move(x0=0.0, x1=10.0, s0=1.0, s1=1.05)
+    # слайд стартует не на границе кадра: 3 * 0.9 = 2.7с при fps=4
+    curve = MotionCurve(mv, duration=1.0, fps=4, start=2.7)
+    for i in range(11, 15):
+        t = i / 4 - 2.7
+        assert curve.index(t) is not None
+        x, _y, s = curve.at(t)
+        assert x == pytest.approx(mv.at(ease(t, 1.0))[0])
+        assert s == pytest.approx(mv.at(ease(t, 1.0))[2])
+    # вне сетки — считаем на лету
+    assert curve.index(0.123) is None
+    assert curve.at(0.5)[0] == pytest.approx(5.0)
+
+
+@pytest.mark.parametrize("fit_mode", ["cover", "fit"])
+def test_kenburns_renderer_samples_window(tmp_path: Path, fit_mode: str):
+    src = tmp_path / "wide.png"
+    Image.new("RGB", (400, 200), (200, 50, 50)).save(src)
+    size = (36, 64)
+    slide = pl._prepare_slide(src, size=size, bg="black", motion="kenburns", fit_mode=fit_mode, fancy_bg=True)
+
+    r = SlideRenderer(slide, "pan", 0, motion="kenburns", fit_mode=fit_mode, sec_per=1.0, size=size, fps=10)
+    out = np.zeros((64, 36, 3), dtype=np.uint8)
+    for i in range(11):
+        frame = r.render(i / 10, out)
+        assert frame.shape == (64, 36, 3)
+        # центр кадра — всегда сама картинка
+        assert tuple(frame[32, 18]) == pytest.approx((200, 50, 50), abs=2)
+
+    # окно не выходит за пределы исходника
+    l, t, rr, b = r.source_box(0.0)
+    assert 0 <= l < rr <= r._src.width
+    assert 0 <= t < b <= r._src.height
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_pipeline_ffmpeg_engine_streams_with_pool(tmp_path: Path):
+    # процессы пула наследуют stdin ffmpeg: пул должен закрыться до конца записи, иначе зависание
+    imgs = []
+    for i in range(4):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (64, 48), (i * 60, 0, 0)).save(p)
+        imgs.append(p)
+
+    progress: list[tuple[int, int]] = []
+    out = tmp_path / "out.mp4"
+    pl.build_video(
+        images=imgs,
+        out=out,
+        sec_per=0.5,
+        fps=10,
+        size=(32, 48),
+        transitions=True,
+        motion="zoom",
+        engine="ffmpeg",
+        workers=2,
+        progress_cb=lambda c, t: progress.append((c, t)),
+    )
+
+    assert _probe_duration(out) == pytest.approx(frame_count(4, 0.5, fade_for(0.5), 10) / 10, abs=0.05)
+    assert progress[0] == (0, 4)
+    assert progress[-1] == (5, 4)
+
+
+def test_split_timeline_cuts_outside_transitions():
+    n, sec_per, fade, fps = 6, 1.0, 0.25, 8
+    chunks = split_timeline(n, sec_per=sec_per, fade=fade, fps=fps, parts=3)
+
+    assert len(chunks) == 3
+    assert chunks[0].start == 0
+    assert chunks[-1].stop == frame_count(n, sec_per, fade, fps)
+    assert all(a.stop == b.start for a, b in zip(chunks, chunks[1:]))
+
+    blend_frames = {i for r in timeline_runs(n, sec_per=sec_per, fade=fade, fps=fps) if r.blend for i in range(r.start, r.start + r.count)}
+    for c in chunks[1:]:
+        assert c.start not in blend_frames
+
+    # слишком много кусков — получаем не больше, чем есть границ слайдов
+    assert len(split_timeline(2, sec_per=1.0, fade=0.0, fps=4, parts=10)) == 2
+
+
+def test_iter_frames_chunk_matches_full_timeline():
+    values = [0, 60, 120, 180]
+    kwargs = dict(sec_per=1.0, fade=0.5, fps=4, size=(8, 4))
+    full = [int(f[0, 0, 0]) for f in iter_frames(_renderers(values), **kwargs)]
+
+    for frames in split_timeline(len(values), parts=3, **{k: kwargs[k] for k in ("sec_per", "fade", "fps")}):
+        slides = slides_for(frames, len(values), sec_per=1.0, fade=0.5, fps=4)
+        part = iter_frames(_renderers(values[slides.start:slides.stop]), n=len(values), frames=frames, **kwargs)
+        assert [int(f[0, 0, 0]) for f in part] == full[frames.start:frames.stop]
+
+
+def test_segments_require_ffmpeg_engine(tmp_path: Path):
+    img = tmp_path / "1.png"
+    Image.new("RGB", (10, 10)).save(img)
+    with pytest.raises(ValueError, match="segments"):
+        pl.build_video(images=[img], out=tmp_path / "o.mp4", sec_per=1.0, fps=30, segments=2)
+    with pytest.raises(ValueError, match="segments"):
+        pl.build_video(images=[img], out=tmp_path / "o.mp4", sec_per=1.0, fps=30, engine="ffmpeg", segments=0)
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_pipeline_segments_concat_exact_duration(tmp_path: Path):
+    imgs = []
+    for i in range(5):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (64, 48), (i * 50, 0, 0)).save(p)
+        imgs.append(p)
+
+    progress: list[tuple[int, int]] = []
+    out = tmp_path / "out.mp4"
+    pl.build_video(
+        images=imgs,
+        out=out,
+        sec_per=0.5,
+        fps=10,
+        size=(32, 48),
+        transitions=True,
+        motion="zoom",
+        engine="ffmpeg",
+        segments=3,
+        progress_cb=lambda c, t: progress.append((c, t)),
+    )
+
+    assert _probe_duration(out) == pytest.approx(frame_count(5, 0.5, fade_for(0.5), 10) / 10, abs=0.05)
+    assert progress[-2] == (5, 5)
+    assert progress[-1] == (6, 5)
+
+
+def test_segment_cache_requires_ffmpeg_engine(tmp_path: Path):
+    img = tmp_path / "1.png"
+    Image.new("RGB", (10, 10)).save(img)
+    with pytest.raises(ValueError, match="segment_cache"):
+        pl.build_video(images=[img], out=tmp_path / "o.mp4", sec_per=1.0, fps=30,
+                       segment_cache=SegmentCache(tmp_path / "seg"))
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_incremental_render_reencodes_only_changed_runs(tmp_path: Path):
+    imgs = []
+    for i in range(4):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (64, 48), (i * 50, 0, 0)).save(p)
+        imgs.append(p)
+
+    kwargs = dict(images=imgs, sec_per=0.5, fps=10, size=(32, 48), transitions=True,
+                  motion="zoom", engine="ffmpeg", fit_mode="cover")
+    expected = frame_count(4, 0.5, fade_for(0.5), 10) / 10
+    n_runs = len(timeline_runs(4, sec_per=0.5, fade=fade_for(0.5), fps=10))
+
+    # движения берутся из плана с одним и тем же seed — рендеры совпадают
+    cache = SegmentCache(tmp_path / "seg")
+    pl.build_video(out=tmp_path / "a.mp4", segment_cache=cache, **kwargs)
+    assert (cache.hits, cache.misses) == (0, n_runs)
+
+    cache = SegmentCache(tmp_path / "seg")
+    out = tmp_path / "b.mp4"
+    pl.build_video(out=out, segment_cache=cache, **kwargs)
+    assert (cache.hits, cache.misses) == (n_runs, 0)
+    assert _probe_duration(out) == pytest.approx(expected, abs=0.05)
+
+    # сдвиг одного слайда: перекодируется сам слайд и переходы по обе стороны
+    cache = SegmentCache(tmp_path / "seg")
+    out = tmp_path / "c.mp4"
+    pl.build_video(out=out, segment_cache=cache, crop_offsets={str(imgs[1]): (0.5, 0.0)}, **kwargs)
+    assert cache.misses == 3
+    assert _probe_duration(out) == pytest.approx(expected, abs=0.05)
+
+
+def _write_wav(path: Path, duration_s: float, sr: int = 22050) -> Path:
+    t = np.arange(int(sr * duration_s), dtype=np.float32) / sr
+    pcm = (0.2 * np.sin(2 * np.pi * 440.0 * t) * 32767).astype(np.int16)
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes(pcm.tobytes())
+    return path
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_segments_with_audio_finish(tmp_path: Path):
+    # звук готовится в потоке, пока стартуют процессы кусков: форк здесь зависал
+    imgs = []
+    for i in range(4):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (64, 48), (i * 60, 0, 0)).save(p)
+        imgs.append(p)
+
+    out = tmp_path / "out.mp4"
+    pl.build_video(images=imgs, out=out, sec_per=0.5, fps=10, size=(32, 48), transitions=True,
+                   motion="zoom", engine="ffmpeg", segments=2, workers=2,
+                   audio=_write_wav(tmp_path / "a.wav", 0.5), audio_adjust="loop")
+
+    assert _probe_duration(out) == pytest.approx(frame_count(4, 0.5, fade_for(0.5), 10) / 10, abs=0.05)
+    assert "Audio:" in subprocess.run([ffmpeg_exe(), "-i", str(out)], capture_output=True, text=True).stderr
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_prepare_audio_track_copies_aac(tmp_path: Path):
+    wav = _write_wav(tmp_path / "a.wav", 1.0)
+
+    aac = tmp_path / "a.mka"
+    assert prepare_audio_track(wav, aac, duration=2.5, mode="loop") is False
+    assert audio_codec(aac) == "aac"
+    assert _probe_duration(aac) == pytest.approx(2.5, abs=0.1)
+
+    # уже AAC — копируется как есть
+    assert prepare_audio_track(aac, tmp_path / "b.mka", duration=1.0) is True
+    assert _probe_duration(tmp_path / "b.mka") == pytest.approx(1.0, abs=0.1)
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+def test_incremental_audio_change_only_remuxes(tmp_path: Path):
+    imgs = []
+    for i in range(3):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (64, 48), (i * 50, 0, 0)).save(p)
+        imgs.append(p)
+    short = _write_wav(tmp_path / "short.wav", 0.5)
+
+    kwargs = dict(images=imgs, sec_per=0.5, fps=10, size=(32, 48), motion="none",
+                  engine="ffmpeg", audio=short)
+    pl.build_video(out=tmp_path / "a.mp4", segment_cache=SegmentCache(tmp_path / "seg"), **kwargs)
+
+    cache = SegmentCache(tmp_path / "seg")
+    out = tmp_path / "b.mp4"
+    pl.build_video(out=out, segment_cache=cache, audio_adjust="loop", **kwargs)
+
+    assert cache.misses == 0  # видео целиком из кэша
+    assert audio_codec(out) == "aac"
+    assert _probe_duration(out) == pytest.approx(1.5, abs=0.1)
+
+
+@pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+@pytest.mark.parametrize("max_bytes", [0, 20_000])
+def test_incremental_tiny_cache_limit_keeps_render(tmp_path: Path, max_bytes: int):
+    imgs = []
+    for i in range(3):
+        p = tmp_path / f"{i}.png"
+        Image.new("RGB", (64, 48), (i * 50, 0, 0)).save(p)
+        imgs.append(p)
+    wav = _write_wav(tmp_path / "a.wav", 0.5)
+
+    # склейка и дорожка больше лимита: кэш обрезается только после сведения
+    out = tmp_path / "out.mp4"
+    pl.build_video(images=imgs, out=out, sec_per=0.5, fps=10, size=(32, 48), motion="zoom", engine="ffmpeg",
+                   audio=wav, audio_adjust="loop", segment_cache=SegmentCache(tmp_path / "seg", max_bytes=max_bytes))
+    assert audio_codec(out) == "aac"
+    assert _probe_duration(out) == pytest.approx(1.5, abs=0.1)
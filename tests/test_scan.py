@@ -0,0 +1,118 @@
+import io
+import struct
+from pathlib import Path
+
+import click
+import pytest
+from PIL import Image
+
+import vv.pipeline as pl
+from vv.cli import collect_images
+from vv.scan import ImageIndex, ImageScanError, list_images, natural_key, probe_image, scan_images
+
+
+def _img(path: Path, size=(40, 30), fmt=None, **save) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size, (200, 10, 10)).save(path, fmt, **save)
+    return path
+
+
+def test_list_images_natural_and_recursive(tmp_path: Path):
+    for name in ["img10.jpg", "img2.jpg", "Img1.png", "notes.txt", ".hidden.jpg", "sub/a.jpg", "sub/deep/b.webp"]:
+        p = tmp_path / name
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_bytes(b"")
+
+    names = [p.relative_to(tmp_path).as_posix() for p in list_images(tmp_path)]
+    assert names == ["Img1.png", "img10.jpg", "img2.jpg"]  # как раньше: по имени
+
+    names = [p.relative_to(tmp_path).as_posix() for p in list_images(tmp_path, natural=True, recursive=True)]
+    assert names == ["Img1.png", "img2.jpg", "img10.jpg", "sub/a.jpg", "sub/deep/b.webp"]
+
+    assert sorted(["x10", "x9", "X1"], key=natural_key) == ["X1", "x9", "x10"]
+    with pytest.raises(FileNotFoundError, match="Путь не найден"):
+        list_images([tmp_path / "nope"])
+
+
+def test_probe_reads_header_and_orientation(tmp_path: Path):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # повёрнута на 90°
+    rotated = _img(tmp_path / "r.jpg", size=(40, 30), exif=exif)
+    png = _img(tmp_path / "p.png", size=(20, 50))
+
+    info = probe_image(rotated)
+    assert (info.size, info.orientation, info.format, info.mode) == ((30, 40), 6, "JPEG", "RGB")
+    assert info.portrait and info.bytes == rotated.stat().st_size
+
+    index = scan_images([rotated, png])
+    assert isinstance(index, ImageIndex) and list(index) == [rotated, png]
+    assert index.info(str(png)).size == (20, 50)
+    assert scan_images(index) is index  # готовый индекс не сканируется заново
+
+
+def test_bad_files_rejected_up_front(tmp_path: Path):
+    good = _img(tmp_path / "good.jpg")
+    (tmp_path / "text.jpg").write_text("<html>не картинка</html>")
+    (tmp_path / "empty.png").write_bytes(b"")
+    data = _img(tmp_path / "full.jpg", size=(200, 200)).read_bytes()
+    (tmp_path / "cut.jpg").write_bytes(data[: len(data) // 2])
+    data = _img(tmp_path / "full.png", size=(200, 200)).read_bytes()
+    (tmp_path / "cut.png").write_bytes(data[: len(data) - 20])
+
+    with pytest.raises(ImageScanError) as exc:
+        scan_images(tmp_path, natural=True)
+    assert sorted(p.name for p, _reason in exc.value.bad) == ["cut.jpg", "cut.png", "empty.png", "text.jpg"]
+    assert "cut.jpg" in str(exc.value)
+
+    with pytest.raises(click.ClickException, match="text.jpg"):
+        collect_images([str(good), str(tmp_path / "text.jpg")])
+    assert list(collect_images([str(good), str(good)])) == [good]
+
+
+def _with_exif_thumbnail(jpeg: bytes) -> bytes:
+    """JPEG с EXIF-миниатюрой, как у фото с телефона: IFD1 указывает на целый JPEG внутри APP1."""
+    buf = io.BytesIO()
+    Image.new("RGB", (16, 12), (0, 200, 0)).save(buf, "JPEG")
+    thumb = buf.getvalue()
+    # TIFF: заголовок, пустой IFD0 со ссылкой на IFD1, IFD1 из двух тегов, затем миниатюра
+    ifd1 = 8 + 2 + 4
+    data_at = ifd1 + 2 + 2 * 12 + 4
+    tiff = (
+        b"II*\0" + struct.pack("<I", 8)
+        + struct.pack("<HI", 0, ifd1)
+        + struct.pack("<H", 2)
+        + struct.pack("<HHII", 0x0201, 4, 1, data_at)
+        + struct.pack("<HHII", 0x0202, 4, 1, len(thumb))
+        + struct.pack("<I", 0)
+        + thumb
+    )
+    app1 = b"Exif\0\0" + tiff
+    return jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1 + jpeg[2:]
+
+
+def test_truncated_jpeg_with_exif_thumbnail_rejected(tmp_path: Path):
+    noise = Image.effect_noise((200, 200), 64).convert("RGB")
+    buf = io.BytesIO()
+    noise.save(buf, "JPEG")
+    data = _with_exif_thumbnail(buf.getvalue())
+
+    whole = tmp_path / "whole.jpg"
+    whole.write_bytes(data)
+    assert probe_image(whole).size == (200, 200)  # миниатюра не мешает целому файлу
+    assert data.find(b"\xff\xd9") < len(data) // 2  # EOI миниатюры — в первой половине
+
+    cut = tmp_path / "cut.jpg"
+    cut.write_bytes(data[: len(data) // 2])
+    with pytest.raises(ValueError, match="обрезан"):
+        probe_image(cut)
+
+
+def test_build_video_fails_before_rendering(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    started = []
+    monkeypatch.setattr(pl, "FrameWriter", lambda *a, **k: started.append(a), raising=True)
+    (tmp_path / "broken.png").write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 10)
+
+    with pytest.raises(ImageScanError, match="broken.png"):
+        pl.build_video(images=[_img(tmp_path / "a.png"), tmp_path / "broken.png"], out=tmp_path / "o.mp4",
+                       sec_per=1.0, fps=10, engine="ffmpeg")
+    assert not started and not list(tmp_path.glob("o*"))
@@ -0,0 +1,104 @@
+import asyncio
+import json
+from pathlib import Path
+
+import click
+import pytest
+from PIL import Image
+
+from vv.ffmpeg import ffmpeg_exe
+from vv.service import RenderService, request
+
+
+def _has_ffmpeg() -> bool:
+    try:
+        ffmpeg_exe()
+    except RuntimeError:
+        return False
+    return True
+
+
+pytestmark = pytest.mark.skipif(not _has_ffmpeg(), reason="нет ffmpeg")
+
+
+def _job(tmp_path: Path, name: str, **opts) -> dict:
+    imgs = tmp_path / "imgs"
+    if not imgs.exists():
+        imgs.mkdir()
+        for i in range(2):
+            Image.new("RGB", (40, 30), (i * 100, 0, 0)).save(imgs / f"{i}.png")
+    return {
+        "images": str(imgs),
+        "out": str(tmp_path / "out" / f"{name}.mp4"),
+        "engine": "ffmpeg",
+        "width": 32,
+        "height": 48,
+        "sec_per": 0.5,
+        **opts,
+    }
+
+
+def test_service_runs_jobs_by_priority(tmp_path: Path):
+    async def scenario():
+        async with RenderService(workers=1, cache_dir=str(tmp_path / "cache")) as svc:
+            # в одном шаге цикла: очередь успевает упорядочить задания до запуска первого
+            low = svc.submit(_job(tmp_path, "low"), priority=0)
+            high = svc.submit(_job(tmp_path, "high", motion="zoom"), priority=5)
+            dropped = svc.submit(_job(tmp_path, "dropped"), priority=0)
+            assert svc.status()["queued"] == [high.id, low.id, dropped.id]
+            assert svc.cancel(dropped.id)
+
+            with pytest.raises(click.ClickException):
+                svc.submit({"images": "x", "fps": 25})
+
+            finished = []
+
+            async def collect(t):
+                events = [e async for e in t.events()]
+                finished.append(t.id)
+                return events
+
+            low_events, high_events, dropped_events = await asyncio.gather(
+                collect(low), collect(high), collect(dropped)
+            )
+            return finished, low_events, high_events, dropped_events
+
+    finished, low_events, high_events, dropped_events = asyncio.run(scenario())
+
+    assert finished == ["3", "2", "1"]  # отменённое — сразу, потом по приоритету
+    assert [e["event"] for e in dropped_events] == ["result"]
+    assert dropped_events[0]["error"] == "отменено"
+    for events in (low_events, high_events):
+        kinds = [e["event"] for e in events]
+        assert kinds[0] == "start" and kinds[-2:] == ["done", "result"]
+        assert "encode" in kinds
+        assert events[-1]["ok"] and events[-1]["bytes"] > 0
+    assert (tmp_path / "out" / "low.mp4").exists()
+    # второе задание в том же прогретом процессе берёт слайды из общего кэша
+    assert low_events[-1]["cache"]["slides"]["hits"] == 2
+
+
+def test_service_socket_protocol(tmp_path: Path):
+    sock = str(tmp_path / "vv.sock")
+
+    async def scenario():
+        async with RenderService(workers=1) as svc:
+            server = await svc.serve(path=sock)
+            async with server:
+                events = [e async for e in request({"op": "submit", "job": _job(tmp_path, "a")}, path=sock)]
+                status = [e async for e in request({"op": "status"}, path=sock)]
+                bad = [e async for e in request({"op": "submit", "job": {"images": "x", "motion": "spin"}}, path=sock)]
+                garbage = [e async for e in request({"nope": 1}, path=sock)]
+        return events, status, bad, garbage
+
+    events, status, bad, garbage = asyncio.run(scenario())
+
+    assert events[0]["event"] == "queued"
+    job_id = events[0]["id"]
+    assert all(e.get("job") == job_id for e in events[1:])
+    result = events[-1]
+    assert result["event"] == "result" and result["ok"], result
+    assert json.loads(json.dumps(events))  # всё — обычный JSON
+    assert status == [{"event": "status", "workers": 1, "queued": [], "running": []}]
+    assert bad[0]["event"] == "error" and "motion" in bad[0]["message"]
+    assert garbage[0]["event"] == "error"
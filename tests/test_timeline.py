@@ -0,0 +1,208 @@
+"""
+Таймлайн слайдов (vv.timeline): поиск слайда по времени не зависит от числа слайдов.
+
+Запуск как скрипта (из корня репозитория) печатает замеры — время кадра на роликах
+от 10 до 10 000 слайдов:
+  python -m tests.test_timeline
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import time
+
+import numpy as np
+import pytest
+
+from vv.duration import fade_for
+from vv.render import Run, frame_count, iter_frames, slides_for, timeline_runs
+from vv.timeline import Timeline, index_composite
+
+SIZES = (10, 100, 1000, 10_000)
+
+
+def _brute_locate(t: float, starts: np.ndarray, fade: float) -> tuple[int, float, bool]:
+    k = max(j for j in range(len(starts)) if starts[j] <= t) if t >= starts[0] else 0
+    local = t - starts[k]
+    return k, local, (fade > 0 and k > 0 and local < fade)
+
+
+@pytest.mark.parametrize("n, sec_per, transitions, fps", [
+    (1, 1.0, False, 10),
+    (7, 0.5, True, 10),
+    (13, 1.3, True, 24),
+    (40, 3.0, True, 30),
+    (25, 0.7, False, 25),
+])
+def test_locate_matches_brute_force(n, sec_per, transitions, fps):
+    fade = fade_for(sec_per) if transitions and n > 1 else 0.0
+    timeline = Timeline.uniform(n, sec_per=sec_per, fade=fade)
+    total = frame_count(n, sec_per, fade, fps)
+
+    k, local, blend = timeline.locate_frames(range(total), fps)
+    for i in range(total):
+        expected = _brute_locate(i / fps, timeline.starts, fade)
+        assert timeline.locate(i / fps) == expected
+        assert (k[i], local[i], blend[i]) == expected
+
+        playing = [j for j in range(n) if timeline.starts[j] <= i / fps < timeline.ends[j]]
+        assert list(timeline.active(i / fps)) == playing
+
+
+def test_timeline_runs_cover_every_frame_once():
+    n, sec_per, fps = 9, 0.8, 12
+    fade = fade_for(sec_per)
+    runs = timeline_runs(n, sec_per=sec_per, fade=fade, fps=fps)
+    timeline = Timeline.uniform(n, sec_per=sec_per, fade=fade)
+
+    assert runs[0].start == 0
+    assert sum(r.count for r in runs) == frame_count(n, sec_per, fade, fps)
+    for a, b in zip(runs, runs[1:]):
+        assert a.start + a.count == b.start and (a.k, a.blend) != (b.k, b.blend)
+    for run in runs:
+        for i in range(run.start, run.start + run.count):
+            k, _local, blend = timeline.locate(i / fps)
+            assert (k, blend) == (run.k, run.blend)
+    assert [r for r in runs if r.blend] == [r for r in runs if r.k > 0 and r.blend]
+    assert isinstance(runs[0], Run)
+
+
+def test_from_durations_uses_cumulative_starts():
+    timeline = Timeline.from_durations([1.0, 2.0, 0.5, 1.5], fade=0.25)
+    assert timeline.starts.tolist() == [0.0, 0.75, 2.5, 2.75]
+    assert timeline.ends.tolist() == [1.0, 2.75, 3.0, 4.25]
+    assert list(timeline.active(2.6)) == [1, 2]
+    assert timeline.locate(2.6) == (2, pytest.approx(0.1), True)
+    with pytest.raises(ValueError):
+        Timeline([0.0, 1.0], [2.0, 1.5])
+
+
+@pytest.mark.skipif(importlib.util.find_spec("moviepy") is None, reason="нет moviepy")
+def test_index_composite_keeps_frames():
+    clips = _moviepy_clips(12, sec_per=0.5, fade=0.2)
+    from moviepy import concatenate_videoclips
+
+    plain = concatenate_videoclips(clips, method="compose", padding=-0.2).with_fps(10)
+    indexed = concatenate_videoclips(clips, method="compose", padding=-0.2).with_fps(10)
+    index_composite(indexed)
+
+    def playing(video, t):
+        ids = [id(c) for c in video.clips]  # Clip.__eq__ сравнивает кадры, поэтому по id
+        return [ids.index(id(c)) for c in video.playing_clips(t)]
+
+    for t in np.arange(0, plain.duration, 0.05):
+        assert playing(indexed, t) == playing(plain, t)
+        assert np.array_equal(indexed.get_frame(t), plain.get_frame(t))
+
+
+def _moviepy_clips(n: int, *, sec_per: float, fade: float) -> list:
+    from moviepy import ColorClip
+    from moviepy.video.fx import CrossFadeIn
+
+    clips = [ColorClip((8, 4), color=(k % 256, 0, 0)).with_duration(sec_per) for k in range(n)]
+    return [clips[0]] + [c.with_effects([CrossFadeIn(fade)]) for c in clips[1:]]
+
+
+def _static_renderers(slides: range, size: tuple[int, int]) -> list:
+    """Неподвижные слайды: цвет кадра слайда k — k % 256."""
+    from vv.pipeline import PreparedSlide
+    from vv.render import SlideRenderer
+
+    W, H = size
+    return [
+        SlideRenderer(
+            PreparedSlide(path=str(k), src_size=size, frame=np.full((H, W, 3), k % 256, dtype=np.uint8)),
+            "zoom", 0, motion="none", fit_mode="cover", sec_per=1.0, size=size,
+        )
+        for k in slides
+    ]
+
+
+def frame_seconds(n: int, *, frames: int = 300, sec_per: float = 1.0, fps: int = 30) -> float:
+    """engine="ffmpeg": среднее время кадра iter_frames в конце ролика из n слайдов."""
+    fade = fade_for(sec_per)
+    total = frame_count(n, sec_per, fade, fps)
+    window = range(total - frames, total)
+    renderers = _static_renderers(slides_for(window, n, sec_per=sec_per, fade=fade, fps=fps), (8, 4))
+    started = time.perf_counter()
+    for _frame in iter_frames(renderers, n=n, sec_per=sec_per, fade=fade, fps=fps, size=(8, 4), frames=window):
+        pass
+    return (time.perf_counter() - started) / frames
+
+
+def moviepy_frame_seconds(n: int, *, indexed: bool, frames: int = 50, sec_per: float = 1.0) -> float:
+    """engine="moviepy": среднее время get_frame в конце ролика из n клипов."""
+    from moviepy import concatenate_videoclips
+
+    fade = fade_for(sec_per)
+    video = concatenate_videoclips(_moviepy_clips(n, sec_per=sec_per, fade=fade), method="compose", padding=-fade)
+    if indexed:
+        index_composite(video)
+    times = np.linspace(video.duration - 3 * sec_per, video.duration - 1e-3, frames)
+    started = time.perf_counter()
+    for t in times:
+        video.get_frame(t)
+    return (time.perf_counter() - started) / frames
+
+
+def test_frames_at_end_of_long_timeline():
+    # конец ролика из 10 000 слайдов рисуется по окну из пары слайдов, а не по всему таймлайну
+    n, sec_per, fps = 10_000, 1.0, 30
+    fade = fade_for(sec_per)
+    timeline = Timeline.uniform(n, sec_per=sec_per, fade=fade)
+    total = frame_count(n, sec_per, fade, fps)
+    window = range(total - 90, total)
+    slides = slides_for(window, n, sec_per=sec_per, fade=fade, fps=fps)
+    assert len(slides) <= 6 and slides.stop == n
+
+    frames = iter_frames(_static_renderers(slides, (8, 4)), n=n, sec_per=sec_per, fade=fade, fps=fps,
+                         size=(8, 4), frames=window)
+    for i, frame in zip(window, frames):
+        k, _local, blend = timeline.locate(i / fps)
+        value = int(frame[0, 0, 0])
+        if blend:  # переход: между цветами уходящего и входящего слайдов
+            lo, hi = sorted(((k - 1) % 256, k % 256))
+            assert lo <= value <= hi, (i, k, value)
+        else:
+            assert value == k % 256, (i, k, value)
+
+
+@pytest.mark.skipif(importlib.util.find_spec("moviepy") is None, reason="нет moviepy")
+@pytest.mark.parametrize("indexed", [True, False])
+def test_moviepy_playing_clips_lookup(monkeypatch: pytest.MonkeyPatch, indexed: bool):
+    from moviepy import concatenate_videoclips
+    from moviepy.Clip import Clip
+
+    checked = []
+    is_playing = Clip.is_playing
+    monkeypatch.setattr(Clip, "is_playing", lambda self, t: checked.append(t) or is_playing(self, t))
+
+    def checks_per_frame(n: int) -> int:
+        fade = fade_for(1.0)
+        video = concatenate_videoclips(_moviepy_clips(n, sec_per=1.0, fade=fade), method="compose", padding=-fade)
+        if indexed:
+            index_composite(video)
+        checked.clear()
+        t = video.duration - 0.5
+        ids = [id(c) for c in video.clips]  # Clip.__eq__ сравнивает кадры, поэтому по id
+        assert [ids.index(id(c)) for c in video.playing_clips(t)] == [n - 1]
+        return len(checked)
+
+    small, large = checks_per_frame(10), checks_per_frame(1000)
+    if indexed:
+        assert small == large  # поиск по таймлайну: работа не зависит от числа клипов
+    else:
+        assert large >= 1000 > small  # перебор moviepy — каждый клип на каждом кадре
+
+
+if __name__ == "__main__":
+    has_moviepy = importlib.util.find_spec("moviepy") is not None
+    print(f"{'слайдов':>8} {'ffmpeg, мкс/кадр':>18} {'moviepy, мкс/кадр':>18} {'moviepy без индекса':>20}")
+    for n in SIZES:
+        ffmpeg_us = min(frame_seconds(n) for _ in range(3)) * 1e6
+        if has_moviepy:
+            mp = f"{moviepy_frame_seconds(n, indexed=True) * 1e6:18.1f}"
+            mp_plain = f"{moviepy_frame_seconds(n, indexed=False) * 1e6:20.1f}"
+        else:
+            mp = mp_plain = "—"
+        print(f"{n:>8} {ffmpeg_us:18.1f} {mp:>18} {mp_plain:>20}")
@@ -5,6 +5,7 @@ import pytest
 from PIL import Image
 
 import vv.pipeline as pl
+import vv.plan as planner
 
 
 def _mk_img(path: Path) -> None:
@@ -36,8 +37,8 @@ def test_pipeline_total_duration_uses_sec_per_for_total(tmp_path: Path, monkeypa
         assert transitions is True
         return 3.3
 
-    monkeypatch.setattr(pl, "sec_per_for_total", fake_sec_per_for_total, raising=True)
-    monkeypatch.setattr(pl, "fade_for", lambda _sec: 0.4, raising=True)
+    monkeypatch.setattr(planner, "sec_per_for_total", fake_sec_per_for_total, raising=True)
+    monkeypatch.setattr(planner, "fade_for", lambda _sec: 0.4, raising=True)
     monkeypatch.setattr(pl, "CrossFadeIn", lambda _fade: object(), raising=True)
 
     class Clip:
@@ -60,7 +61,6 @@ def test_pipeline_total_duration_uses_sec_per_for_total(tmp_path: Path, monkeypa
         return v
 
     monkeypatch.setattr(pl, "concatenate_videoclips", fake_concat, raising=True)
-    monkeypatch.setattr(pl, "prepare_audio", lambda *a, **k: None, raising=True)
 
     pl.build_video(
         images=[img1, img2],
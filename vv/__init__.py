@@ -6,7 +6,6 @@ vv — ядро генератора вертикальных видео.
 from __future__ import annotations
 
 from .config import WIDTH, HEIGHT, FPS, SEC_PER, BG
-from .pipeline import build_video
 
 # Версия пакета (пока просто константа;
 # если будешь упаковывать — заменим на importlib.metadata.version)
@@ -15,13 +14,21 @@ __version__ = "0.1.0-dev"
 # Удобный алиас
 DEFAULT_SIZE = (WIDTH, HEIGHT)
 
+def __getattr__(name: str):
+    # build_video тянет numpy/Pillow/рендер — грузим только по первому обращению,
+    # чтобы "import vv" и CLI без рендера стартовали быстро
+    if name in ("build_video", "build_video_async"):
+        from . import pipeline
+        return getattr(pipeline, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def ffmpeg_path() -> str | None:
     """Вернёт путь до ffmpeg, если он есть в PATH, иначе None."""
     import shutil
     return shutil.which("ffmpeg")
 
 __all__ = [
-    "build_video",
+    "build_video", "build_video_async",
     "WIDTH", "HEIGHT", "FPS", "SEC_PER", "BG", "DEFAULT_SIZE",
     "ffmpeg_path", "__version__",
 ]
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""
+python -m vv render ...          — один ролик (то же, что python -m vv.cli)
+python -m vv batch manifest.json — пакетный рендер (vv.batch)
+python -m vv serve --socket PATH — сервис рендера с очередью заданий (vv.service)
+"""
+
+import click
+
+from .batch import main as batch
+from .cli import main as render
+from .service import main as serve
+
+
+@click.group(context_settings=dict(help_option_names=["-h", "--help"]))
+def cli():
+    """Vertical Video Maker."""
+
+
+cli.add_command(render, "render")
+cli.add_command(batch, "batch")
+cli.add_command(serve, "serve")
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,38 +1,129 @@
+"""
+Аудио: трек декодируется в PCM один раз, дальше обрезается или зацикливается numpy
+(без повторного чтения исходника через ffmpeg) и кодируется в AAC.
+"""
+
 from __future__ import annotations
+
+import tempfile
+from collections.abc import Iterator
 from pathlib import Path
-from moviepy import AudioFileClip, concatenate_audioclips
+
+import numpy as np
+
+from .cache import PcmCache, file_digest, hash_key
+from .cancel import CancelToken
+from .ffmpeg import AUDIO_CODEC, audio_codec, copy_audio_track, decode_audio, encode_audio
+
+PathLike = str | Path
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+# треки больше этого не читаются в память, а отображаются с диска (memmap)
+MEMMAP_BYTES = 64 * 1024 ** 2
+
+
+def _load_pcm(path: Path, *, mmap: bool) -> np.ndarray:
+    if mmap and path.stat().st_size:
+        data = np.memmap(path, dtype=np.int16, mode="r")
+    else:
+        data = np.fromfile(path, dtype=np.int16)
+    return data.reshape(-1, CHANNELS)
+
+
+def decode_pcm(path: PathLike, *, cache: PcmCache | None = None, cancel: CancelToken | None = None) -> np.ndarray:
+    """
+    Трек -> PCM int16 формы (сэмплы, CHANNELS) с частотой SAMPLE_RATE.
+
+    С cache декодированный трек сохраняется на диск и при следующих рендерах
+    не декодируется; длинные треки (> MEMMAP_BYTES) отдаются как memmap.
+    """
+    if cache is None:
+        with tempfile.TemporaryDirectory(prefix="vv_") as tmp:
+            raw = Path(tmp) / "audio.pcm"
+            decode_audio(path, raw, sample_rate=SAMPLE_RATE, channels=CHANNELS, cancel=cancel)
+            return _load_pcm(raw, mmap=False)
+
+    key = hash_key(kind="pcm", file=file_digest(path), sample_rate=SAMPLE_RATE, channels=CHANNELS)
+    raw = cache.get(key)
+    if raw is None:
+        cache.misses += 1
+        cache.root.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="vv_", dir=cache.root) as tmp:
+            part = Path(tmp) / "audio.pcm"
+            decode_audio(path, part, sample_rate=SAMPLE_RATE, channels=CHANNELS, cancel=cancel)
+            raw = cache.put(key, part)
+        cache.trim()
+    else:
+        cache.hits += 1
+    return _load_pcm(raw, mmap=raw.stat().st_size > MEMMAP_BYTES)
+
+
+def iter_pcm(pcm: np.ndarray, samples: int, mode: str = "trim") -> Iterator[np.ndarray]:
+    """
+    Куски pcm (срезы, без копий), вместе ровно samples сэмплов.
+    "loop" — трек повторяется по кругу; "trim" — обрезается (если короче — кончится раньше).
+    """
+    if not len(pcm):
+        return
+    left = samples
+    while left > 0:
+        part = pcm[:left]
+        yield part
+        left -= len(part)
+        if mode != "loop":
+            return
+
+
+def fit_pcm(pcm: np.ndarray, duration: float, mode: str = "trim") -> np.ndarray:
+    """PCM ровно на duration секунд (trim — не длиннее исходника)."""
+    parts = list(iter_pcm(pcm, round(duration * SAMPLE_RATE), mode))
+    if not parts:
+        return np.zeros((0, CHANNELS), dtype=np.int16)
+    return np.concatenate(parts)
+
+
+def prepare_audio_track(
+    audio: PathLike,
+    out: PathLike,
+    *,
+    duration: float,
+    mode: str = "trim",
+    cache: PcmCache | None = None,
+    cancel: CancelToken | None = None,
+) -> bool:
+    """
+    Подготовить AAC-дорожку (out, matroska) ровно под ролик длиной duration.
+
+    AAC на входе копируется без перекодирования. Остальное декодируется
+    в PCM один раз (с cache — один раз вообще), обрезается/зацикливается numpy
+    и кодируется в AAC. Вернёт True, если дорожка скопирована.
+    cancel — при отмене запущенный ffmpeg убивается сразу (RenderCancelled).
+    """
+    if audio_codec(audio) == AUDIO_CODEC:
+        copy_audio_track(audio, out, duration=duration, mode=mode, cancel=cancel)
+        return True
+
+    pcm = decode_pcm(audio, cache=cache, cancel=cancel)
+    with tempfile.TemporaryDirectory(prefix="vv_") as tmp:
+        raw = Path(tmp) / "track.pcm"
+        with open(raw, "wb") as f:
+            for part in iter_pcm(pcm, round(duration * SAMPLE_RATE), mode):
+                part.tofile(f)
+        encode_audio(raw, out, sample_rate=SAMPLE_RATE, channels=CHANNELS, cancel=cancel)
+    return False
+
 
 def prepare_audio(path: str | None, target_duration: float, mode: str = "trim"):
     """
-    Вернёт AudioFileClip ровно нужной длительности.
+    Вернёт moviepy-клип (AudioArrayClip) ровно нужной длительности.
     mode: "trim" — обрезать; "loop" — зациклить до длины.
     """
     if not path:
         return None
 
-    clip = AudioFileClip(str(Path(path)))
-
-    if mode.lower() == "loop":
-        # Пытаемся использовать эффект v2
-        try:
-            from moviepy.audio.fx import AudioLoop
-            clip = clip.with_effects([AudioLoop(duration=float(target_duration))])
-        except Exception:
-            # Фолбэк: ручная склейка до нужной длины
-            parts = []
-            acc = 0.0
-            while acc + 1e-6 < target_duration:  # защита от накопл. ошибки
-                rem = target_duration - acc
-                part = clip if clip.duration <= rem else clip.subclipped(0, rem)
-                parts.append(part)
-                acc += part.duration
-            clip = concatenate_audioclips(parts)
-    else:
-        # "trim" по умолчанию
-        clip = clip.subclipped(0, min(clip.duration, target_duration))
-
-    # опционально мягкие края:
-    # from moviepy.audio.fx import AudioFadeIn, AudioFadeOut
-    # clip = clip.with_effects([AudioFadeIn(0.2), AudioFadeOut(0.2)])
+    from moviepy import AudioArrayClip
 
-    return clip
\ No newline at end of file
+    pcm = fit_pcm(decode_pcm(path), float(target_duration), mode.lower())
+    return AudioArrayClip(pcm.astype(np.float32) / 32768.0, fps=SAMPLE_RATE)
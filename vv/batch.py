@@ -0,0 +1,339 @@
+"""
+Пакетный рендер: много роликов из одного манифеста.
+
+    python -m vv batch manifest.json
+
+Манифест — список заданий или {"defaults": {...}, "jobs": [...]}. Задание — опции
+vv.cli (имена как у опций: "images", "sec_per" / "sec-per", "motion", ...), плюс
+необязательное "name":
+
+    {
+      "defaults": {"engine": "ffmpeg", "audio": "bed.mp3", "audio_adjust": "loop"},
+      "jobs": [
+        {"name": "a", "images": "shots/a", "out": "out/a.mp4"},
+        {"name": "b", "images": ["shots/b", "extra.jpg"], "out": "out/b.mp4", "motion": "zoom"}
+      ]
+    }
+
+Задания идут в ограниченном пуле процессов: moviepy, numpy и Pillow грузятся один раз
+на процесс, а не на ролик. Кэши слайдов и аудио общие для всех заданий — общая
+аудиоподложка декодируется один раз. Упавшее задание не останавливает остальные;
+итог по каждому — в сводке (--summary). --job-timeout останавливает задание, которое
+рендерится дольше заданного, — оно тоже просто считается упавшим.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+import click
+
+from .cache import DEFAULT_MAX_BYTES, default_cache_dir
+from .cancel import CancelToken, RenderCancelled
+from .events import JsonlEvents
+from .cli import (
+    check_options,
+    collect_images,
+    load_plan,
+    main as render_command,
+    open_caches,
+    render_kwargs,
+    setup_logging,
+    validate_audio,
+)
+
+# опции vv.cli, которые в задании не имеют смысла: кэш и вывод задаёт batch
+BATCH_ONLY = {"use_cache", "cache_dir", "cache_size", "progress_mode", "progress_fd", "info", "verbose"}
+
+
+@dataclass
+class JobResult:
+    """Итог одного задания (строка сводки)."""
+    name: str
+    out: str | None
+    ok: bool
+    seconds: float
+    bytes: int | None = None
+    error: str | None = None
+    cache: dict[str, dict[str, int]] | None = None
+
+
+def load_manifest(path: str | Path) -> list[dict[str, Any]]:
+    """Задания из манифеста; defaults подставляются в каждое задание."""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise click.ClickException(f"Не удалось прочитать манифест {path}: {e}")
+
+    defaults: dict[str, Any] = {}
+    if isinstance(data, dict):
+        defaults = data.get("defaults") or {}
+        data = data.get("jobs")
+    if not isinstance(data, list) or not all(isinstance(job, dict) for job in data):
+        raise click.ClickException("Манифест: ожидается список заданий или {\"defaults\": {...}, \"jobs\": [...]}")
+    if not data:
+        raise click.ClickException("Манифест: нет ни одного задания")
+
+    jobs = []
+    for i, job in enumerate(data, 1):
+        job = {**defaults, **job}
+        job.setdefault("name", f"job{i}")
+        jobs.append(job)
+
+    names = [str(job["name"]) for job in jobs]
+    if len(set(names)) != len(names):
+        raise click.ClickException("Манифест: имена заданий (name) должны быть уникальны")
+    return jobs
+
+
+def job_params(job: dict[str, Any]) -> dict[str, Any]:
+    """
+    Задание -> параметры команды vv.cli (как ctx.params): значения проверяются и
+    дополняются умолчаниями теми же типами click, что и в командной строке.
+    """
+    options = {p.name: p for p in render_command.params if isinstance(p, click.Option)}
+    for p in list(options.values()):
+        # синонимы: "sec-per" / "duration", "total"; --no-... задаётся значением false
+        for opt in p.opts:
+            options.setdefault(opt.lstrip("-").replace("-", "_"), p)
+
+    args: list[str] = []
+    for key, value in job.items():
+        if key == "name" or value is None:
+            continue
+        p = options.get(key.replace("-", "_"))
+        if p is None or p.name in BATCH_ONLY:
+            raise click.ClickException(f"Неизвестная опция задания: {key!r}")
+        if p.is_flag:
+            if value:
+                args.append(p.opts[0])
+            elif p.secondary_opts:
+                args.append(p.secondary_opts[0])
+            continue
+        for v in (value if isinstance(value, (list, tuple)) else [value]):
+            args += [p.opts[0], str(v)]
+
+    try:
+        with render_command.make_context("batch", args) as ctx:
+            return dict(ctx.params)
+    except click.exceptions.Exit as e:
+        raise click.ClickException(f"Опции задания не разобраны (код {e.exit_code})")
+
+
+def run_job(
+    job: dict[str, Any],
+    *,
+    cache_dir: str | None,
+    cache_size: int,
+    overwrite: bool,
+    events: JsonlEvents | None = None,
+    timeout: float | None = None,
+) -> JobResult:
+    """
+    Отрендерить одно задание; любая ошибка — в JobResult, а не исключением.
+    events — поток событий задания (как у vv.cli --progress jsonl).
+    timeout — секунды на рендер: дольше — рендер отменяется, задание падает.
+    """
+    started = time.monotonic()
+    name = str(job.get("name"))
+    out: str | None = None
+    try:
+        params = job_params(job)
+        out_path = Path(params["out"]).expanduser()
+        out = str(out_path)
+
+        imgs = collect_images(params["images"], recursive=params["recursive"], natural=params["natural_sort"])
+        audio_path = validate_audio(params["audio"])
+        check_options(engine=params["engine"], segments=params["segments"], incremental=params["incremental"])
+        plan = load_plan(params, imgs)
+        if out_path.exists() and not overwrite:
+            raise click.ClickException(f"Файл уже существует: {out_path} (перезапись — --overwrite)")
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # общий кэш на все задания: одинаковые фото и аудиоподложка готовятся один раз
+        cache, audio_cache, segment_cache = open_caches(
+            cache_dir, cache_size, slides=True, incremental=params["incremental"]
+        )
+
+        from .pipeline import build_video
+
+        profiler = None
+        if params["profile_path"] or events is not None:
+            from .profiling import Profiler
+
+            profiler = Profiler(memory=bool(params["profile_path"]))
+
+        if events is not None:
+            events.emit("start", images=len(imgs), audio=audio_path, out=out)
+        cancel = timer = None
+        if timeout:
+            # зависший или слишком долгий рендер отменяется, а не держит весь пакет
+            cancel = CancelToken()
+            timer = threading.Timer(timeout, cancel.cancel)
+            timer.daemon = True
+            timer.start()
+        try:
+            result = build_video(
+                images=imgs,
+                out=out,
+                audio=audio_path,
+                cache=cache,
+                segment_cache=segment_cache,
+                audio_cache=audio_cache,
+                profiler=profiler,
+                plan=plan,
+                cancel=cancel,
+                progress_cb=events.progress_cb if events is not None else None,
+                encode_cb=events.encode_cb if events is not None else None,
+                **render_kwargs(params),
+            )
+        except RenderCancelled:
+            raise click.ClickException(f"Задание не уложилось в {timeout:g} с — рендер остановлен")
+        finally:
+            if timer is not None:
+                timer.cancel()
+        if params["profile_path"]:
+            profiler.report().write(params["profile_path"])
+
+        stats = {
+            kind: {"hits": c.hits, "misses": c.misses}
+            for kind, c in (("slides", cache), ("audio", audio_cache), ("segments", segment_cache))
+            if c is not None
+        }
+        res = JobResult(
+            name=name,
+            out=result,
+            ok=True,
+            seconds=time.monotonic() - started,
+            bytes=Path(result).stat().st_size,
+            cache=stats,
+        )
+        if events is not None:
+            events.close_stages()
+            events.emit("cache", **stats)
+            events.emit(
+                "done",
+                out=result,
+                bytes=res.bytes,
+                seconds=round(res.seconds, 3),
+                stages={stage: round(st.seconds, 3) for stage, st in profiler.report().stages.items()},
+            )
+        return res
+    except Exception as e:
+        logging.getLogger(__name__).debug("задание %s упало", name, exc_info=True)
+        message = e.format_message() if isinstance(e, click.ClickException) else f"{type(e).__name__}: {e}"
+        if events is not None:
+            events.close_stages()
+            events.emit("error", type=type(e).__name__, message=message)
+        return JobResult(name=name, out=out, ok=False, seconds=time.monotonic() - started, error=message)
+
+
+def run_batch(
+    jobs: list[dict[str, Any]],
+    *,
+    workers: int = 1,
+    cache_dir: str | None = None,
+    cache_size: int = DEFAULT_MAX_BYTES // (1024 * 1024),
+    overwrite: bool = False,
+    timeout: float | None = None,
+    on_result: Callable[[JobResult], None] | None = None,
+) -> list[JobResult]:
+    """
+    Отрендерить задания в пуле из workers процессов (1 — в текущем процессе).
+    Вернёт итоги в порядке манифеста; on_result зовётся по мере готовности.
+    timeout — лимит секунд на рендер одного задания (см. run_job).
+    """
+    run = dict(cache_dir=cache_dir, cache_size=cache_size, overwrite=overwrite, timeout=timeout)
+    results: dict[int, JobResult] = {}
+
+    def done(i: int, res: JobResult) -> None:
+        results[i] = res
+        if on_result:
+            on_result(res)
+
+    if workers == 1 or len(jobs) == 1:
+        for i, job in enumerate(jobs):
+            done(i, run_job(job, **run))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as ex:
+            futures = {ex.submit(run_job, job, **run): i for i, job in enumerate(jobs)}
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    # процесс пула умер (например, нехватка памяти) — задание считаем упавшим
+                    res = JobResult(name=str(jobs[i]["name"]), out=None, ok=False, seconds=0.0, error=f"{type(e).__name__}: {e}")
+                done(i, res)
+
+    return [results[i] for i in range(len(jobs))]
+
+
+def write_summary(path: str | Path, results: Iterable[JobResult], *, seconds: float) -> None:
+    results = list(results)
+    data = {
+        "seconds": seconds,
+        "ok": sum(r.ok for r in results),
+        "failed": sum(not r.ok for r in results),
+        "jobs": [asdict(r) for r in results],
+    }
+    Path(path).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+@click.option("--workers", "-w", type=click.IntRange(min=1), default=min(4, os.cpu_count() or 1), show_default=True,
+              help="Сколько роликов рендерится одновременно (процессов)")
+@click.option("--summary", type=click.Path(dir_okay=False), default=None,
+              help="Записать сводку по заданиям (время, размер, ошибки, кэш) в JSON")
+@click.option("--cache-dir", type=click.Path(file_okay=False), default=None,
+              help=f"Общая папка кэша (по умолчанию {default_cache_dir()})")
+@click.option("--cache-size", type=click.IntRange(min=0), default=DEFAULT_MAX_BYTES // (1024 * 1024),
+              show_default=True, help="Лимит кэша, MB")
+@click.option("--overwrite", is_flag=True, help="Перезаписывать существующие файлы (иначе такое задание падает)")
+@click.option("--job-timeout", type=click.FloatRange(min=0, min_open=True), default=None,
+              help="Лимит на рендер одного задания, секунды: дольше — задание останавливается и считается упавшим")
+@click.option("--verbose", "-v", is_flag=True, help="Подробный лог")
+def main(manifest, workers, summary, cache_dir, cache_size, overwrite, job_timeout, verbose):
+    """Пакетный рендер по манифесту (JSON)."""
+    setup_logging(verbose)
+    jobs = load_manifest(manifest)
+    click.echo(f"🎬 Заданий: {len(jobs)} | процессов: {min(workers, len(jobs))}")
+
+    def report(res: JobResult) -> None:
+        if res.ok:
+            click.echo(f"✅ {res.name}: {res.out}  ({res.bytes / (1024 * 1024):.1f} MB, {res.seconds:.1f}s)")
+        else:
+            click.echo(f"❌ {res.name}: {res.error}", err=True)
+
+    started = time.monotonic()
+    results = run_batch(
+        jobs,
+        workers=workers,
+        cache_dir=cache_dir,
+        cache_size=cache_size,
+        overwrite=overwrite,
+        timeout=job_timeout,
+        on_result=report,
+    )
+    seconds = time.monotonic() - started
+
+    failed = [r for r in results if not r.ok]
+    if summary:
+        write_summary(summary, results, seconds=seconds)
+    click.echo(f"Готово: {len(results) - len(failed)} из {len(results)} за {seconds:.1f}s")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
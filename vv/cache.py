@@ -0,0 +1,219 @@
+"""
+Дисковые кэши рендера.
+
+SlideCache   — подготовленные слайды (декод + ресайз + блюр). Ключ — содержимое файла
+               и все параметры подготовки, поэтому повторный рендер того же набора фото
+               с другими длительностью/переходами/аудио не трогает картинки.
+SegmentCache — уже закодированные куски ролика (по слайду / переходу), чтобы повторный
+               рендер перекодировал только то, что поменялось.
+PcmCache     — аудиотреки, декодированные в PCM: зацикливание и обрезка без повторного декода.
+
+Размер кэша ограничен: при превышении удаляются давно не использованные записи (LRU).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .pipeline import PreparedSlide
+
+PathLike = str | Path
+
+# менять при любом изменении алгоритма подготовки слайдов — старые записи перестанут находиться
+CACHE_VERSION = 3
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+
+
+def default_cache_dir(kind: str = "slides") -> Path:
+    """~/.cache/vv/<kind> (или $XDG_CACHE_HOME/vv/<kind>)."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "vv" / kind
+
+
+@lru_cache(maxsize=4096)
+def _digest(path: str, size: int, mtime_ns: int) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_digest(path: PathLike) -> str:
+    """Хэш содержимого файла; пока размер и mtime не менялись, файл повторно не читается."""
+    p = os.fspath(path)
+    st = os.stat(p)
+    return _digest(os.path.abspath(p), st.st_size, st.st_mtime_ns)
+
+
+def hash_key(**params: Any) -> str:
+    """Ключ кэша по JSON-совместимым параметрам."""
+    payload = json.dumps({"v": CACHE_VERSION, **params}, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+
+@dataclass
+class _DiskCache:
+    """Папка root с записями root/ab/<ключ><SUFFIX>; LRU по mtime записи."""
+    root: Path
+    max_bytes: int = DEFAULT_MAX_BYTES
+    hits: int = 0
+    misses: int = 0
+
+    SUFFIX = ""
+
+    def __post_init__(self):
+        self.root = Path(self.root).expanduser()
+        if self.max_bytes < 0:
+            raise ValueError("max_bytes должен быть >= 0")
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}{self.SUFFIX}"
+
+    def _touch(self, p: Path) -> None:
+        try:
+            os.utime(p)  # LRU: время последнего использования
+        except OSError:
+            pass
+
+    def size(self) -> int:
+        return sum(st.st_size for _p, st in self._entries())
+
+    def _entries(self) -> list[tuple[Path, os.stat_result]]:
+        out = []
+        for p in self.root.glob(f"*/*{self.SUFFIX}"):
+            try:
+                out.append((p, p.stat()))
+            except FileNotFoundError:
+                pass
+        return out
+
+    def trim(self) -> int:
+        """Удалить самые давно использованные записи, пока кэш больше max_bytes. Вернёт число удалённых."""
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime_ns)
+        total = sum(st.st_size for _p, st in entries)
+        removed = 0
+        for p, st in entries:
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= st.st_size
+            removed += 1
+        return removed
+
+
+@dataclass
+class SlideCache(_DiskCache):
+    """
+    Кэш слайдов в папке root: по файлу .npz на слайд.
+
+    hits/misses считает процесс, который собирает слайды (см. record):
+    при подготовке в пуле процессов get/put вызываются в дочерних процессах.
+    """
+
+    SUFFIX = ".npz"
+
+    def key(self, path: PathLike, **params: Any) -> str:
+        return hash_key(file=file_digest(path), **params)
+
+    def get(self, key: str, path: PathLike) -> PreparedSlide | None:
+        import numpy as np
+
+        from .pipeline import PreparedSlide
+
+        p = self._path(key)
+        try:
+            with np.load(p) as data:
+                arrays = {name: data[name] for name in ("frame", "content", "background") if name in data.files}
+                src_size = tuple(int(x) for x in data["src_size"])
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # битая запись (например, оборвалась запись) — просто готовим заново
+            p.unlink(missing_ok=True)
+            return None
+
+        self._touch(p)
+        return PreparedSlide(path=str(path), src_size=src_size, cached=True, **arrays)
+
+    def put(self, key: str, slide: PreparedSlide) -> None:
+        import numpy as np
+
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            name: arr
+            for name in ("frame", "content", "background")
+            if (arr := getattr(slide, name)) is not None
+        }
+        # пишем во временный файл и переименовываем: параллельные процессы не увидят недописанную запись
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=p.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, src_size=np.array(slide.src_size), **arrays)
+            os.replace(tmp, p)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def record(self, slide: PreparedSlide) -> None:
+        if slide.cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+
+@dataclass
+class _FileCache(_DiskCache):
+    """Записи — готовые файлы: get отдаёт путь, put забирает файл в кэш."""
+
+    def get(self, key: str) -> Path | None:
+        p = self._path(key)
+        if not p.is_file():
+            return None
+        self._touch(p)
+        return p
+
+    def put(self, key: str, file: PathLike) -> Path:
+        """Забрать готовый файл в кэш (перемещением) и вернуть путь записи."""
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(file, p)
+        except OSError:
+            # другой диск — копируем рядом с записью и переименовываем
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=p.parent)
+            os.close(fd)
+            shutil.copyfile(file, tmp)
+            os.replace(tmp, p)
+        return p
+
+
+@dataclass
+class SegmentCache(_FileCache):
+    """
+    Кэш закодированных кусков ролика: по файлу .mkv на кусок.
+    Ключ собирает вызывающий (hash_key) из всего, от чего зависят кадры куска.
+    """
+
+    SUFFIX = ".mkv"
+
+
+@dataclass
+class PcmCache(_FileCache):
+    """
+    Кэш декодированного аудио: сырой PCM (s16le) по файлу .pcm на трек.
+    Трек декодируется один раз, дальше читается через memmap (см. vv.audio.decode_pcm).
+    """
+
+    SUFFIX = ".pcm"
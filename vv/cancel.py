@@ -0,0 +1,68 @@
+"""
+Отмена рендера, который уже идёт.
+
+CancelToken передаётся в build_video(cancel=...) и отменяется из любого потока
+(кнопка в GUI, сигнал в CLI, отмена задачи asyncio). Рендер проверяет его между
+слайдами и перед каждым кадром, который отдаёт ffmpeg, и останавливается
+исключением RenderCancelled: процессы ffmpeg убиваются, временные файлы и
+недописанный ролик удаляются. Внешние процессы (подготовка аудио, склейка,
+сведение) убиваются сразу в момент отмены — их не нужно дожидаться.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable
+
+
+class RenderCancelled(Exception):
+    """Рендер остановлен по запросу (CancelToken.cancel)."""
+
+
+class CancelToken:
+    """
+    Флаг отмены одного рендера.
+
+    event — готовый флаг вместо своего: multiprocessing.Event, общий с процессами
+    пула, где отмену видит только check() (on_cancel работает в своём процессе).
+    """
+
+    def __init__(self, event=None):
+        self._event = event if event is not None else threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: list[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """Отменить рендер (повторный вызов ничего не делает)."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn()
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise RenderCancelled("рендер отменён")
+
+    def on_cancel(self, fn: Callable[[], None]) -> Callable[[], None]:
+        """
+        Позвать fn при отмене (в потоке, который отменяет; сразу — если уже отменено).
+        Вернёт функцию, снимающую подписку.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return lambda: self._remove(fn)
+        fn()
+        return lambda: None
+
+    def _remove(self, fn: Callable[[], None]) -> None:
+        with self._lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
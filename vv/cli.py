@@ -1,14 +1,21 @@
 from __future__ import annotations
 
 import logging
+import os
+import signal
+import sys
+import threading
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 from collections.abc import Iterable
 
 import click
-from tqdm import tqdm
 
-from .pipeline import build_video
+from .cache import DEFAULT_MAX_BYTES, PcmCache, SegmentCache, SlideCache, default_cache_dir
+from .cancel import CancelToken, RenderCancelled
 from .config import IMAGE_EXTS, AUDIO_EXTS
+from .scan import ImageIndex, ImageScanError, list_images, probe_images
 
 
 def setup_logging(verbose: bool) -> None:
@@ -20,25 +27,29 @@ def setup_logging(verbose: bool) -> None:
     )
 
 
-def collect_images(args: Iterable[str]) -> list[str]:
-    paths: list[str] = []
+def collect_images(args: Iterable[str], *, recursive: bool = False, natural: bool = False) -> ImageIndex:
+    """
+    Пути из --images -> картинки с проверенными заголовками (vv.scan.ImageIndex).
+    Битые файлы — ошибка сразу, до рендера; индекс идёт в build_video как есть.
+    """
+    paths: list[Path] = []
     for item in args:
         p = Path(item)
         if p.is_dir():
-            imgs = sorted(x for x in p.iterdir() if x.suffix.lower() in IMAGE_EXTS)
+            imgs = list_images(p, recursive=recursive, natural=natural)
             if not imgs:
                 raise click.ClickException(f"В папке нет изображений: {p}")
-            paths += [str(x) for x in imgs]
+            paths += imgs
         elif p.is_file():
             if p.suffix.lower() not in IMAGE_EXTS:
                 raise click.ClickException(f"Неподдерживаемый формат изображения: {p.name}")
-            paths.append(str(p))
+            paths.append(p)
         else:
             raise click.ClickException(f"Путь не найден: {p}")
 
     # remove duplicates, preserve order
-    seen: set[str] = set()
-    uniq: list[str] = []
+    seen: set[Path] = set()
+    uniq: list[Path] = []
     for x in paths:
         if x not in seen:
             uniq.append(x)
@@ -46,7 +57,10 @@ def collect_images(args: Iterable[str]) -> list[str]:
 
     if not uniq:
         raise click.ClickException("Не найдено ни одного изображения.")
-    return uniq
+    try:
+        return probe_images(uniq)
+    except ImageScanError as e:
+        raise click.ClickException(str(e))
 
 
 def validate_audio(path: str | None) -> str | None:
@@ -60,7 +74,136 @@ def validate_audio(path: str | None) -> str | None:
     return str(p)
 
 
+def check_options(*, engine: str, segments: int, incremental: bool) -> None:
+    """Сочетания опций, которые не проверить типами click."""
+    if segments > 1 and engine.lower() != "ffmpeg":
+        raise click.ClickException("--segments работает только с --engine ffmpeg")
+
+    if incremental and engine.lower() != "ffmpeg":
+        raise click.ClickException("--incremental работает только с --engine ffmpeg")
+    if incremental and segments > 1:
+        raise click.ClickException("--incremental и --segments нельзя использовать вместе")
+
+
+def load_plan(params: dict, imgs: ImageIndex):
+    """
+    --plan FILE: план рендера из файла (возобновление задания) или, если файла ещё нет,
+    новый план, сохранённый туда перед рендером. Без --plan — None (план строит build_video).
+    """
+    path = params.get("plan_path")
+    if not path:
+        return None
+
+    from .plan import RenderPlan, check_plan, make_plan
+
+    kwargs = render_kwargs(params)
+    if Path(path).exists():
+        try:
+            plan = RenderPlan.read(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise click.ClickException(f"Не удалось прочитать план {path}: {e}")
+        # устаревший план (другие картинки или опции) — понятная ошибка до рендера, а не трейсбек из него
+        try:
+            check_plan(plan, imgs, fps=kwargs["fps"], motion=kwargs["motion"], transitions=kwargs["transitions"])
+        except ValueError as e:
+            raise click.ClickException(f"План {path} не подходит: {e}")
+        return plan
+
+    plan = make_plan(
+        imgs,
+        sec_per=kwargs["sec_per"],
+        fps=kwargs["fps"],
+        transitions=kwargs["transitions"],
+        total_duration=kwargs["total_duration"],
+        motion=kwargs["motion"],
+        seed=kwargs["seed"],
+    )
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    plan.write(path)
+    return plan
+
+
+def open_caches(
+    cache_dir: str | None,
+    cache_size: int,
+    *,
+    slides: bool,
+    incremental: bool,
+) -> tuple[SlideCache | None, PcmCache | None, SegmentCache | None]:
+    """Кэши слайдов и аудио (slides=True) и закодированных кусков (incremental) в cache_dir или по умолчанию."""
+    max_bytes = int(cache_size) * 1024 * 1024
+    cache = None
+    audio_cache = None
+    if slides:
+        cache = SlideCache(Path(cache_dir) if cache_dir else default_cache_dir(), max_bytes=max_bytes)
+        # декодированное аудио: зацикливание длинного трека без повторного декода
+        audio_cache = PcmCache(Path(cache_dir) / "audio" if cache_dir else default_cache_dir("audio"), max_bytes=max_bytes)
+
+    segment_cache = None
+    if incremental:
+        segment_cache = SegmentCache(
+            Path(cache_dir) / "segments" if cache_dir else default_cache_dir("segments"),
+            max_bytes=max_bytes,
+        )
+    return cache, audio_cache, segment_cache
+
+
+def render_kwargs(params: dict) -> dict:
+    """
+    Параметры команды (ctx.params) -> аргументы build_video, кроме входов/выхода,
+    кэшей, колбэков и профайлера.
+    """
+    return dict(
+        sec_per=float(params["sec_per"]),
+        fps=int(params["fps"]),
+        size=(int(params["width"]), int(params["height"])),
+        bg=params["bg"].lower(),
+        transitions=bool(params["transitions"]),
+        audio_adjust=params["audio_adjust"].lower(),
+        total_duration=params["total_duration"],
+        fit_mode=params["fit_mode"].lower(),
+        fancy_bg=bool(params["fancy_bg"]),
+        motion=params["motion"].lower(),
+        workers=int(params["jobs"]),
+        engine=params["engine"].lower(),
+        segments=int(params["segments"]),
+        seed=int(params["seed"]),
+    )
+
+
+@contextmanager
+def cancel_on_sigterm(cancel: CancelToken):
+    """
+    SIGTERM во время рендера — отмена, а не смерть процесса: ffmpeg убивается,
+    временные файлы и недописанный ролик удаляются.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    # обработчик сигнала может прервать сам токен посреди on_cancel — отменяем из потока
+    prev = signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=cancel.cancel).start())
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, prev)
+
+
+def open_events(fd: int):
+    """--progress jsonl: поток событий в файловый дескриптор fd (1 — stdout)."""
+    from .events import JsonlEvents
+
+    if fd == 1:
+        return JsonlEvents(sys.stdout)
+    try:
+        stream = os.fdopen(fd, "w", buffering=1, encoding="utf-8", closefd=False)
+    except OSError as e:
+        raise click.ClickException(f"--progress-fd {fd}: {e}")
+    return JsonlEvents(stream)
+
+
 def make_progress_cb():
+    from tqdm import tqdm
+
     pbar: tqdm | None = None
 
     def cb(current: int, total: int):
@@ -74,19 +217,48 @@ def make_progress_cb():
             pbar.n = current
             pbar.refresh()
         else:
+            # кодирование показывает своя полоска (make_encode_cb)
             pbar.n = total
-            pbar.set_description("Кодирование")
             pbar.refresh()
             pbar.close()
 
     return cb
 
 
+def make_encode_cb():
+    from tqdm import tqdm
+
+    from .progress import format_eta
+
+    pbar: tqdm | None = None
+
+    def cb(p):
+        # p: vv.progress.EncodeProgress — кадры таймлайна, скорость и ETA считает pipeline
+        nonlocal pbar
+        if pbar is None:
+            pbar = tqdm(
+                total=p.total,
+                desc="Кодирование",
+                unit="кадр",
+                bar_format="{desc}: {percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt}{postfix}",
+            )
+        pbar.n = p.frames
+        pbar.set_postfix_str(f"{p.fps:.1f} fps, осталось {format_eta(p.eta)}", refresh=False)
+        pbar.refresh()
+        if p.done:
+            pbar.close()
+
+    return cb
+
+
 @click.command(context_settings=dict(help_option_names=["-h", "--help"]))
 @click.option(
     "--images", "-i", multiple=True, required=True,
     help="Один или несколько путей: файлы и/или папки с изображениями"
 )
+@click.option("--recursive", "-r", is_flag=True, help="Брать картинки и из вложенных папок")
+@click.option("--natural-sort", is_flag=True,
+              help="Сортировать файлы папки по-человечески: img2 раньше img10")
 @click.option("--audio", "-a", default=None, help="Путь к .mp3/.wav (опционально)")
 @click.option("--out", "-o", default="output/video.mp4", show_default=True, help="Куда сохранить .mp4")
 @click.option("--sec-per", "--duration", type=click.FloatRange(min=0.05),
@@ -119,10 +291,38 @@ def make_progress_cb():
     show_default=True,
     help="Движение: none / zoom / kenburns"
 )
+@click.option("--seed", type=int, default=0, show_default=True,
+              help="Seed серий движений (zoom/kenburns): тот же seed — тот же ролик")
+@click.option("--plan", "plan_path", type=click.Path(dir_okay=False), default=None,
+              help="Файл плана рендера (JSON): если есть — рендерить по нему, иначе сохранить туда план")
+@click.option("--engine", type=click.Choice(["moviepy", "ffmpeg"], case_sensitive=False),
+              default="moviepy", show_default=True,
+              help="Рендер: moviepy (композитинг клипов) / ffmpeg (кадры напрямую в ffmpeg)")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=1, show_default=True,
+              help="Сколько процессов готовят кадры (декод, ресайз, блюр)")
+@click.option("--segments", type=click.IntRange(min=1), default=1, show_default=True,
+              help="engine=ffmpeg: кодировать таймлайн кусками в N процессах и склеить без перекодирования")
+@click.option("--cache/--no-cache", "use_cache", default=False, show_default=True,
+              help="Дисковый кэш подготовленных кадров (повторный рендер тех же фото)")
+@click.option("--cache-dir", type=click.Path(file_okay=False), default=None,
+              help=f"Папка кэша (по умолчанию {default_cache_dir()})")
+@click.option("--cache-size", type=click.IntRange(min=0), default=DEFAULT_MAX_BYTES // (1024 * 1024),
+              show_default=True, help="Лимит кэша, MB (старые записи удаляются)")
+@click.option("--incremental", is_flag=True,
+              help="engine=ffmpeg: хранить закодированные куски в кэше и при повторном рендере перекодировать только изменённые")
+@click.option("--profile", "profile_path", type=click.Path(dir_okay=False), default=None,
+              help="Записать профиль рендера (время и память по этапам и слайдам) в JSON")
+@click.option("--progress", "progress_mode", type=click.Choice(["bar", "jsonl"], case_sensitive=False),
+              default="bar", show_default=True,
+              help="bar — полоски tqdm; jsonl — события рендера по JSON-объекту на строку (для планировщиков)")
+@click.option("--progress-fd", type=click.IntRange(min=1), default=1, show_default=True,
+              help="--progress jsonl: номер файлового дескриптора для событий (1 — stdout, текст тогда уходит в stderr)")
 @click.option("--info", is_flag=True, help="Вывести инфо о входных данных и параметрах")
 @click.option("--verbose", "-v", is_flag=True, help="Подробный лог")
 def main(
     images,
+    recursive,
+    natural_sort,
     audio,
     out,
     sec_per,
@@ -136,68 +336,159 @@ def main(
     audio_adjust,
     transitions,
     motion,
+    seed,
+    plan_path,
+    engine,
+    jobs,
+    segments,
+    use_cache,
+    cache_dir,
+    cache_size,
+    incremental,
+    profile_path,
+    progress_mode,
+    progress_fd,
     info,
     verbose,
 ):
     """Vertical Video Maker — CLI."""
     setup_logging(verbose)
 
-    imgs = collect_images(images)
+    events = open_events(progress_fd) if progress_mode.lower() == "jsonl" else None
+    # события в stdout — человекочитаемый текст уходит в stderr, чтобы не ломать поток
+    text_to_err = events is not None and progress_fd == 1
+    echo = partial(click.echo, err=text_to_err)
+
+    imgs = collect_images(images, recursive=recursive, natural=natural_sort)
     audio_path = validate_audio(audio)
 
     out_path = Path(out).expanduser()
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
     if out_path.exists():
-        if not click.confirm(f"Файл уже существует: {out_path.name}. Перезаписать?", default=False):
+        if not click.confirm(f"Файл уже существует: {out_path.name}. Перезаписать?", default=False, err=text_to_err):
             raise click.Abort()
 
+    check_options(engine=engine, segments=segments, incremental=incremental)
+    plan = load_plan(click.get_current_context().params, imgs)
+
     if (width, height) != (1080, 1920):
-        click.echo("⚠ Рекомендовано 1080x1920 для вертикальных роликов.")
+        echo("⚠ Рекомендовано 1080x1920 для вертикальных роликов.")
 
     if fancy_bg and fit_mode.lower() != "fit":
-        click.echo("⚠ fancy-bg имеет смысл только при fit-mode=fit (в cover игнорируется).")
+        echo("⚠ fancy-bg имеет смысл только при fit-mode=fit (в cover игнорируется).")
+
+    cache, audio_cache, segment_cache = open_caches(
+        cache_dir, cache_size, slides=bool(use_cache or cache_dir), incremental=incremental
+    )
 
     if info:
-        click.echo(f"🖼  Изображений: {len(imgs)}")
-        click.echo(f"   Примеры: {', '.join(Path(p).name for p in imgs[:3])}")
+        portrait = sum(im.portrait for im in imgs.images)
+        echo(f"🖼  Изображений: {len(imgs)} (вертикальных {portrait}, остальных {len(imgs) - portrait})")
+        echo(f"   Примеры: {', '.join(Path(p).name for p in imgs[:3])}")
         if audio_path:
-            click.echo(f"🎵 Аудио: {Path(audio_path).name}")
-        click.echo(
+            echo(f"🎵 Аудио: {Path(audio_path).name}")
+        echo(
             f"🎞  FPS: {int(fps)} | size: {width}x{height} | bg: {bg.lower()} | fit: {fit_mode.lower()} "
-            f"| fancy_bg: {'on' if fancy_bg else 'off'} | motion: {motion.lower()} | transitions: {'on' if transitions else 'off'}"
+            f"| fancy_bg: {'on' if fancy_bg else 'off'} | motion: {motion.lower()} (seed {seed}) | transitions: {'on' if transitions else 'off'}"
         )
+        echo(f"⚙  engine: {engine.lower()} | jobs: {jobs} | segments: {segments}")
+        if cache is not None:
+            echo(f"🗄  cache: {cache.root} (лимит {cache_size} MB)")
+        if segment_cache is not None:
+            echo(f"🗄  segments: {segment_cache.root} (лимит {cache_size} MB)")
         if total_duration is not None:
-            click.echo(f"⏱ total_duration: {total_duration:.2f}s (sec_per будет пересчитан)")
+            echo(f"⏱ total_duration: {total_duration:.2f}s (sec_per будет пересчитан)")
         else:
-            click.echo(f"⏱ sec_per: {float(sec_per):.2f}s")
-        click.echo("")
-
-    progress_cb = make_progress_cb()
-
-    click.echo("🎬 Рендер...")
-    result = build_video(
-        images=imgs,
-        out=str(out_path),
-        sec_per=float(sec_per),
-        fps=int(fps),
-        size=(int(width), int(height)),          # <-- фикс: реально используем
-        bg=bg.lower(),
-        audio=audio_path,
-        transitions=bool(transitions),
-        audio_adjust=audio_adjust.lower(),
-        progress_cb=progress_cb,
-        total_duration=total_duration,
-        fit_mode=fit_mode.lower(),
-        fancy_bg=bool(fancy_bg),
-        motion=motion.lower(),
-    )
+            echo(f"⏱ sec_per: {float(sec_per):.2f}s")
+        echo("")
+
+    # тяжёлые модули (numpy, Pillow, рендер) — только когда дошло до рендера
+    from .pipeline import build_video
+
+    profiler = None
+    if profile_path or events is not None:
+        from .profiling import Profiler
+
+        # для событий хватит времени этапов; память — только по --profile
+        profiler = Profiler(memory=bool(profile_path))
+
+    if events is not None:
+        progress_cb, encode_cb = events.progress_cb, events.encode_cb
+        events.emit(
+            "start",
+            images=len(imgs),
+            audio=audio_path,
+            out=str(out_path),
+            fps=int(fps),
+            size=[int(width), int(height)],
+            engine=engine.lower(),
+            motion=motion.lower(),
+            jobs=int(jobs),
+            segments=int(segments),
+        )
+    else:
+        progress_cb = make_progress_cb()
+        encode_cb = make_encode_cb()
+
+    echo("🎬 Рендер...")
+    cancel = CancelToken()
+    try:
+        with cancel_on_sigterm(cancel):
+            result = build_video(
+                images=imgs,
+                out=str(out_path),
+                audio=audio_path,
+                progress_cb=progress_cb,
+                encode_cb=encode_cb,
+                cache=cache,
+                segment_cache=segment_cache,
+                audio_cache=audio_cache,
+                profiler=profiler,
+                cancel=cancel,
+                plan=plan,
+                **render_kwargs(click.get_current_context().params),
+            )
+    except Exception as e:
+        if events is not None:
+            events.close_stages()
+            events.emit("error", type=type(e).__name__, message=str(e))
+        if isinstance(e, RenderCancelled):
+            raise click.ClickException("Рендер отменён.")
+        raise
 
     if not Path(result).exists():
         raise click.ClickException("Файл не создан.")
 
     size_mb = Path(result).stat().st_size / (1024 * 1024)
-    click.echo(f"✅ Готово: {result}  ({size_mb:.1f} MB)")
+    echo(f"✅ Готово: {result}  ({size_mb:.1f} MB)")
+    if cache is not None and (info or verbose):
+        echo(f"🗄  Кэш кадров: попаданий {cache.hits}, промахов {cache.misses}")
+    if segment_cache is not None and (info or verbose):
+        echo(f"🗄  Кэш кусков: готовых {segment_cache.hits}, перекодировано {segment_cache.misses}")
+    if events is not None:
+        events.close_stages()
+        events.emit(
+            "cache",
+            slides=None if cache is None else {"hits": cache.hits, "misses": cache.misses},
+            segments=None if segment_cache is None else {"hits": segment_cache.hits, "misses": segment_cache.misses},
+            audio=None if audio_cache is None else {"hits": audio_cache.hits, "misses": audio_cache.misses},
+        )
+
+    report = profiler.report() if profiler is not None else None
+    if events is not None:
+        events.emit(
+            "done",
+            out=str(result),
+            bytes=Path(result).stat().st_size,
+            seconds=round(report.wall_seconds, 3),
+            stages={name: round(st.seconds, 3) for name, st in report.stages.items()},
+        )
+    if profile_path:
+        report.write(profile_path)
+        echo(f"📊 Профиль: {profile_path}  (всего {report.wall_seconds:.2f}s)")
+        for name, st in report.stages.items():
+            echo(f"   {name:<8} {st.seconds:8.2f}s  x{st.calls:<6} пик {st.peak_bytes / 2 ** 20:7.1f} MB")
 
 
 if __name__ == "__main__":
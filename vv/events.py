@@ -0,0 +1,79 @@
+"""
+Машиночитаемый поток событий рендера: по JSON-объекту на строку (JSON Lines).
+
+Для запуска из планировщика вместо полосок tqdm (vv.cli --progress jsonl).
+У каждого события есть "event" и "t" — секунды с начала рендера:
+
+  start     — входные данные и параметры;
+  stage     — phase="start"/"end" этапов prepare (картинки) и encode (кадры);
+  prepared  — подготовлен слайд: done/total;
+  encode    — кадры: frames/total, fps, eta;
+  cache     — попадания/промахи кэшей;
+  done      — готовый файл: путь, размер, общее время и время по этапам (vv.profiling);
+  error     — рендер упал: тип и текст ошибки.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import IO, Any
+
+from .progress import EncodeProgress
+
+
+class JsonlEvents:
+    """
+    Пишет события в stream; progress_cb / encode_cb — готовые колбэки для build_video.
+    fields — добавляются в каждое событие (например, job=... в пакетном режиме).
+    """
+
+    def __init__(self, stream: IO[str], **fields: Any):
+        self.stream = stream
+        self.fields = fields
+        self._started = time.monotonic()
+        self._open: set[str] = set()
+        self._closed: set[str] = set()
+
+    def emit(self, event: str, **data: Any) -> None:
+        record = {"event": event, "t": round(time.monotonic() - self._started, 3), **self.fields, **data}
+        self.stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.stream.flush()
+
+    def stage(self, name: str, phase: str) -> None:
+        """start/end этапа — каждое не больше одного раза."""
+        seen = self._open if phase == "start" else self._closed
+        if name in seen:
+            return
+        if phase == "end" and name not in self._open:
+            self.stage(name, "start")
+        seen.add(name)
+        self.emit("stage", stage=name, phase=phase)
+
+    def close_stages(self) -> None:
+        for name in sorted(self._open - self._closed):
+            self.stage(name, "end")
+
+    def progress_cb(self, current: int, total: int) -> None:
+        # pipeline: 0 — старт, 1..total — готовые слайды, total+1 — началось кодирование
+        if current == 0:
+            self.stage("prepare", "start")
+        elif current <= total:
+            self.emit("prepared", done=current, total=total)
+            if current == total:
+                self.stage("prepare", "end")
+        else:
+            self.stage("prepare", "end")
+            self.stage("encode", "start")
+
+    def encode_cb(self, p: EncodeProgress) -> None:
+        self.stage("encode", "start")
+        self.emit(
+            "encode",
+            frames=p.frames,
+            total=p.total,
+            fps=round(p.fps, 2),
+            eta=None if p.eta is None else round(p.eta, 2),
+        )
+        if p.done:
+            self.stage("encode", "end")
@@ -0,0 +1,321 @@
+"""
+Тонкая обёртка над бинарником ffmpeg: запись сырых RGB-кадров в H.264 через stdin,
+склейка готовых сегментов без перекодирования, подготовка AAC-дорожки и
+сведение видео с аудио без перекодирования.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from collections.abc import Sequence
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from .cancel import CancelToken
+from .profiling import LAST_SLIDE, stage
+
+PathLike = str | Path
+
+VIDEO_CODEC = "libx264"
+AUDIO_CODEC = "aac"
+PRESET = "medium"
+PIX_FMT = "yuv420p"
+
+
+def ffmpeg_exe() -> str:
+    """Путь до ffmpeg: сначала тот, что идёт с imageio-ffmpeg (его же использует moviepy), потом PATH."""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        pass
+
+    exe = shutil.which("ffmpeg")
+    if exe is None:
+        raise RuntimeError("ffmpeg не найден: установи imageio-ffmpeg или добавь ffmpeg в PATH")
+    return exe
+
+
+def audio_input_args(audio: PathLike, mode: str = "trim") -> list[str]:
+    """Аргументы входа для аудио: "loop" — зациклить, "trim" — как есть (обрежется по -t)."""
+    args: list[str] = []
+    if mode == "loop":
+        args += ["-stream_loop", "-1"]
+    return args + ["-i", str(audio)]
+
+
+def audio_codec(path: PathLike) -> str | None:
+    """
+    Кодек первой аудиодорожки файла (по выводу "ffmpeg -i") или None, если её нет.
+    Пока размер и mtime файла не менялись, ffmpeg повторно не запускается.
+    """
+    p = os.fspath(path)
+    st = os.stat(p)
+    return _probe_audio_codec(os.path.abspath(p), st.st_size, st.st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _probe_audio_codec(path: str, size: int, mtime_ns: int) -> str | None:
+    res = subprocess.run(
+        [ffmpeg_exe(), "-hide_banner", "-i", path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    m = re.search(r"Stream #\S+.*?: Audio: (\w+)", res.stderr.decode(errors="replace"))
+    return m.group(1) if m else None
+
+
+def video_codec_args() -> list[str]:
+    """Единые настройки кодека: сегменты, склеиваемые без перекодирования, обязаны совпадать."""
+    return ["-c:v", VIDEO_CODEC, "-preset", PRESET, "-pix_fmt", PIX_FMT]
+
+
+def _run(cmd: list[str], what: str, cancel: CancelToken | None = None) -> None:
+    """Запустить ffmpeg и дождаться его; при отмене cancel процесс убивается сразу."""
+    if cancel is not None:
+        cancel.check()
+    with subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) as proc:
+        unsubscribe = cancel.on_cancel(proc.kill) if cancel is not None else None
+        try:
+            _, err = proc.communicate()
+        finally:
+            if unsubscribe is not None:
+                unsubscribe()
+    if cancel is not None:
+        cancel.check()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg завершился с ошибкой ({what}):\n{err.decode(errors='replace')}")
+
+
+class FrameWriter:
+    """
+    Пишет кадры (H, W, 3) uint8 прямо в stdin процесса ffmpeg.
+
+    Пишется только видеопоток: аудио сводится отдельным этапом (mux_audio).
+
+    keyframes — номера кадров, с которых начинаются сегменты. Если задано,
+    out — шаблон имени (".../seg_%06d.mkv"): на каждом таком кадре ставится
+    опорный кадр и начинается новый файл.
+
+    cancel — перед каждым кадром проверяется отмена (RenderCancelled); выход из
+    with с исключением убивает ffmpeg и удаляет недописанный файл.
+    """
+
+    def __init__(
+        self,
+        out: PathLike,
+        size: tuple[int, int],
+        fps: int,
+        *,
+        duration: float | None = None,
+        keyframes: Sequence[int] | None = None,
+        cancel: CancelToken | None = None,
+    ):
+        W, H = size
+        self.out = str(out)
+        self.cancel = cancel
+        self.segmented = keyframes is not None
+        self.size = (int(W), int(H))
+        self.frames_written = 0
+
+        cmd = [
+            ffmpeg_exe(),
+            "-y",
+            "-loglevel", "error",
+            "-f", "rawvideo",
+            "-vcodec", "rawvideo",
+            "-s", f"{W}x{H}",
+            "-pix_fmt", "rgb24",
+            "-r", str(int(fps)),
+            "-i", "-",
+        ]
+        cmd += video_codec_args()
+        if duration is not None:
+            cmd += ["-t", f"{float(duration):.6f}"]
+
+        if keyframes is not None:
+            # опорные кадры ставим только там, где начинается сегмент;
+            # время берём с запасом в полкадра, чтобы не промахнуться из-за округления
+            times = ",".join(f"{max(0.0, (k - 0.5) / fps):.6f}" for k in keyframes)
+            cmd += [
+                "-bf", "0",
+                "-sc_threshold", "0",
+                "-g", "1000000",
+                "-force_key_frames", times,
+                "-f", "segment",
+                "-segment_time", "0.000001",  # режем на каждом опорном кадре
+                "-segment_format", "matroska",
+                "-reset_timestamps", "1",
+            ]
+        cmd.append(self.out)
+
+        # stderr — во временный файл, а не в PIPE: переполненный PIPE подвесил бы запись кадров
+        self._stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self._stderr,
+        )
+
+    def write(self, frame: np.ndarray) -> None:
+        if self.cancel is not None:
+            self.cancel.check()
+        # время записи в пайп — это время, пока ffmpeg кодирует предыдущие кадры
+        with stage("encode", LAST_SLIDE):
+            try:
+                # memoryview — без лишней копии через tobytes()
+                self.proc.stdin.write(memoryview(np.ascontiguousarray(frame)))
+            except (BrokenPipeError, OSError):
+                self._raise_error()
+        self.frames_written += 1
+
+    def close(self) -> None:
+        if self.proc.stdin and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+        with stage("encode"):
+            code = self.proc.wait()
+        if code != 0:
+            self._raise_error()
+        self._stderr.close()
+
+    def abort(self) -> None:
+        """Остановить ffmpeg без ожидания корректного завершения файла и удалить недописанное."""
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        self._stderr.close()
+        if not self.segmented:
+            # сегменты пишутся во временную папку — её убирает тот, кто её создал
+            Path(self.out).unlink(missing_ok=True)
+
+    def _raise_error(self):
+        self.proc.wait()
+        self._stderr.seek(0)
+        err = self._stderr.read()
+        self._stderr.close()
+        raise RuntimeError(f"ffmpeg завершился с ошибкой при записи {self.out}:\n{err.decode(errors='replace')}")
+
+    def __enter__(self) -> FrameWriter:
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def concat_segments(
+    segments: Sequence[tuple[PathLike, float]],
+    out: PathLike,
+    *,
+    duration: float | None = None,
+    cancel: CancelToken | None = None,
+) -> None:
+    """
+    Склеить сегменты (путь, длительность в секундах) без перекодирования видео.
+    Длительность задаёт момент начала следующего сегмента, поэтому
+    сегмент из одного кадра показывается всё отведённое ему время (VFR).
+    """
+    fd, tmp = tempfile.mkstemp(suffix=".ffconcat", prefix="vv_")
+    os.close(fd)
+    list_path = Path(tmp)
+    lines = ["ffconcat version 1.0"]
+    for path, dur in segments:
+        p = Path(path).resolve().as_posix().replace("'", r"'\''")
+        lines.append(f"file '{p}'")
+        lines.append(f"duration {float(dur):.6f}")
+    list_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    cmd = [
+        ffmpeg_exe(),
+        "-y",
+        "-loglevel", "error",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", str(list_path),
+    ]
+    cmd += ["-c:v", "copy"]
+    if duration is not None:
+        cmd += ["-t", f"{float(duration):.6f}"]
+    cmd.append(str(out))
+
+    try:
+        with stage("encode"):
+            _run(cmd, f"склейка {out}", cancel)
+    finally:
+        list_path.unlink(missing_ok=True)
+
+
+def copy_audio_track(
+    audio: PathLike,
+    out: PathLike,
+    *,
+    duration: float,
+    mode: str = "trim",
+    cancel: CancelToken | None = None,
+) -> None:
+    """Обрезать или зациклить дорожку до duration без перекодирования (out — matroska)."""
+    cmd = [ffmpeg_exe(), "-y", "-loglevel", "error"]
+    cmd += audio_input_args(audio, mode)
+    cmd += ["-map", "0:a:0", "-vn", "-c:a", "copy", "-t", f"{float(duration):.6f}", "-f", "matroska", str(out)]
+    _run(cmd, f"аудио {audio}", cancel)
+
+
+def decode_audio(
+    audio: PathLike,
+    out: PathLike,
+    *,
+    sample_rate: int,
+    channels: int,
+    cancel: CancelToken | None = None,
+) -> None:
+    """Декодировать аудио в сырой PCM s16le (чередующиеся каналы) в файл out."""
+    cmd = [ffmpeg_exe(), "-y", "-loglevel", "error", "-i", str(audio), "-vn"]
+    cmd += ["-f", "s16le", "-acodec", "pcm_s16le", "-ac", str(channels), "-ar", str(sample_rate), str(out)]
+    _run(cmd, f"декодирование {audio}", cancel)
+
+
+def encode_audio(
+    pcm: PathLike,
+    out: PathLike,
+    *,
+    sample_rate: int,
+    channels: int,
+    cancel: CancelToken | None = None,
+) -> None:
+    """Сырой PCM s16le из файла pcm -> AAC-дорожка out (matroska)."""
+    cmd = [ffmpeg_exe(), "-y", "-loglevel", "error"]
+    cmd += ["-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", str(pcm)]
+    cmd += ["-c:a", AUDIO_CODEC, "-f", "matroska", str(out)]
+    _run(cmd, f"кодирование аудио {out}", cancel)
+
+
+def mux_audio(
+    video: PathLike,
+    out: PathLike,
+    *,
+    audio: PathLike | None = None,
+    duration: float | None = None,
+    cancel: CancelToken | None = None,
+) -> None:
+    """Свести готовый видеопоток и подготовленную дорожку (vv.audio.prepare_audio_track) без перекодирования."""
+    cmd = [ffmpeg_exe(), "-y", "-loglevel", "error", "-i", str(video)]
+    if audio:
+        cmd += ["-i", str(audio), "-map", "0:v:0", "-map", "1:a:0"]
+    cmd += ["-c", "copy"]
+    if duration is not None:
+        cmd += ["-t", f"{float(duration):.6f}"]
+    cmd.append(str(out))
+    _run(cmd, f"сведение {out}", cancel)
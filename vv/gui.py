@@ -6,11 +6,10 @@ from tkinter import ttk, filedialog, messagebox
 import sv_ttk
 from datetime import datetime
 
-from .pipeline import build_video, _collect_images
 from .config import WIDTH, HEIGHT, FPS, SEC_PER, BG  # просто подтягиваем дефолты
-from PIL import Image, ImageTk
-from .image import fit_to_canvas
 from .duration import sec_per_for_total, total_for
+from .cache import PcmCache, SegmentCache, SlideCache, default_cache_dir
+from .cancel import CancelToken, RenderCancelled
 
 CropOffsets = dict[str, tuple[float, float]]   # путь → (ox, oy) в [-1, 1]
 
@@ -76,6 +75,13 @@ class App(tk.Tk):
         self.crop_offsets: CropOffsets = {}
         self._offset_syncing = False
 
+        # кэши между рендерами: после правки одного сдвига перекодируются только затронутые куски
+        self.slide_cache = SlideCache(default_cache_dir())
+        self.segment_cache = SegmentCache(default_cache_dir("segments"))
+        self.audio_cache = PcmCache(default_cache_dir("audio"))
+        self._encoding = False  # рендер дошёл до кодирования: полоска показывает кадры
+        self._cancel: CancelToken | None = None  # отмена текущего рендера (кнопка "Отменить")
+
         # режим длительности
         self.duration_mode = tk.StringVar(value="per_frame")
         self.total_duration = tk.DoubleVar(value=0.0)
@@ -313,7 +319,7 @@ class App(tk.Tk):
             command=self.start_render,
             style="Primary.TButton",
         )
-        self.btn_render.grid(row=0, column=0, sticky="ew", pady=(0, 6))
+        self.btn_render.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 6))
 
         self.btn_open_dir = ttk.Button(
             frm_btn,
@@ -322,7 +328,17 @@ class App(tk.Tk):
             style="Secondary.TButton",
             state="disabled",
         )
-        self.btn_open_dir.grid(row=1, column=0, sticky="e")
+        self.btn_open_dir.grid(row=1, column=1, sticky="e")
+
+        self.btn_cancel = ttk.Button(
+            frm_btn,
+            text="Отменить",
+            command=self.cancel_render,
+            style="Secondary.TButton",
+            state="disabled",
+        )
+        # "Отменить" — слева, "Открыть папку" — справа, под кнопкой сборки на всю ширину
+        self.btn_cancel.grid(row=1, column=0, sticky="w")
 
     def _build_preview_ui(self, parent: tk.Widget):
         # Настраиваем сетку родителя (frm_preview_root)
@@ -357,8 +373,9 @@ class App(tk.Tk):
         self.preview_photo = None
 
         assets_dir = Path(__file__).resolve().parent / "assets"
-        self.icon_prev = ImageTk.PhotoImage(Image.open(assets_dir / "nav_left.png"))
-        self.icon_next = ImageTk.PhotoImage(Image.open(assets_dir / "nav_right.png"))
+        # PNG читает сам Tk — Pillow для окна не нужен
+        self.icon_prev = tk.PhotoImage(file=str(assets_dir / "nav_left.png"))
+        self.icon_next = tk.PhotoImage(file=str(assets_dir / "nav_right.png"))
 
         self.canvas_img_id: int | None = None
         self.arrow_prev_id: int | None = None
@@ -560,6 +577,10 @@ class App(tk.Tk):
         # Генерируем кадр РОВНО под размер канвы (w, h)
         # Так как w/h мы сами высчитали по пропорции 9:16,
         # fit_to_canvas вернет идеальную картинку без полей.
+        from PIL import ImageTk
+
+        from .image import fit_to_canvas
+
         frame = fit_to_canvas(
             path,
             size=(w, h),
@@ -627,8 +648,10 @@ class App(tk.Tk):
         self._set_preview_visible(True)
 
         # превью всегда строим по всему списку файлов
+        from .scan import list_images
+
         imgs_input = self.image_inputs
-        self.preview_paths = _collect_images(imgs_input)
+        self.preview_paths = list_images(imgs_input)
         self.preview_index.set(0)
         self._sync_sliders_with_current_offset()
         self._update_preview()
@@ -871,6 +894,7 @@ class App(tk.Tk):
 
             self.out_path = str(out_path)
             Path(self.out_path).parent.mkdir(parents=True, exist_ok=True)
+            self._cancel = cancel = CancelToken()
             self._set_running(True)
             self.status.set("Подготовка…")
             self.pbar.config(value=0, maximum=100)
@@ -879,12 +903,21 @@ class App(tk.Tk):
             def progress_cb(current: int, total: int):
                 self.after(0, self._on_progress, current, total)
 
+            def encode_cb(p):
+                self.after(0, self._on_encode, p)
+
+            self._encoding = False
+
             def worker():
                 try:
+                    from .pipeline import build_video
+                    from .scan import scan_images
+
                     # либо список, либо одна строка
                     imgs_input = self.image_inputs if len(self.image_inputs) > 1 else self.image_inputs[0]
-                    # развернуть в реальные пути к файлам
-                    img_paths = _collect_images(imgs_input)
+                    # развернуть в реальные пути к файлам и проверить заголовки — до рендера;
+                    # build_video получает готовый индекс и файлы заново не читает
+                    img_paths = scan_images(imgs_input)
 
                     # режимы кадрирования
                     fit_mode = self._get_fit_mode()
@@ -915,7 +948,7 @@ class App(tk.Tk):
                         motion = "none"
 
                     result = build_video(
-                        images=imgs_input,
+                        images=img_paths,
                         out=self.out_path,
                         sec_per=sec_per,
                         fps=fps,
@@ -924,13 +957,21 @@ class App(tk.Tk):
                         transitions=bool(self.transitions.get()),
                         audio_adjust=self._get_audio_mode(),
                         progress_cb=progress_cb,
+                        encode_cb=encode_cb,
                         total_duration=total_duration,
                         fit_mode=fit_mode,
                         fancy_bg=fancy_bg,
                         crop_offsets=crop_offsets,
                         motion=motion,
+                        engine="ffmpeg",
+                        cache=self.slide_cache,
+                        segment_cache=self.segment_cache,
+                        audio_cache=self.audio_cache,
+                        cancel=cancel,
                     )
                     self.after(0, self._on_done, result)
+                except RenderCancelled:
+                    self.after(0, self._on_cancelled)
                 except Exception as e:
                     self.after(0, self._on_error, e)
 
@@ -939,7 +980,21 @@ class App(tk.Tk):
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
+    def cancel_render(self):
+        # рендер остановится перед следующим слайдом или кадром: ffmpeg убивается,
+        # недописанный ролик удаляется (прежний файл с тем же именем не трогается)
+        if self._cancel is not None:
+            self._cancel.cancel()
+            self.btn_cancel.configure(state="disabled")
+            self.status.set("Отмена…")
+
     def _on_progress(self, current: int, total: int):
+        if self._cancel is not None and self._cancel.cancelled:
+            return
+        if self._encoding:
+            # полоска уже показывает кадры кодирования (_on_encode)
+            return
+
         # total приходит из pipeline — ставим максимум
         if total > 0:
             self.pbar.config(maximum=total)
@@ -954,12 +1009,30 @@ class App(tk.Tk):
             self.pbar.config(value=total)
             self.status.set("Кодирую видео… Процесс может занять несколько минут…")
 
+    def _on_encode(self, p):
+        # p: vv.progress.EncodeProgress; с engine="ffmpeg" слайды готовятся по ходу
+        # кодирования, так что с первых кадров полоска показывает кадры, а не картинки
+        from .progress import format_eta
+
+        if self._cancel is not None and self._cancel.cancelled:
+            return
+        self._encoding = True
+        self.pbar.config(maximum=p.total, value=p.frames)
+        self.status.set(
+            f"Кодирование: {p.frames}/{p.total} кадров · {p.fps:.0f} fps · осталось {format_eta(p.eta)}"
+        )
+
     def _on_done(self, result_path: str):
         self._set_running(False)
         self.status.set("Готово.")
         self.btn_open_dir.configure(state="normal")   # теперь есть что открывать
         messagebox.showinfo("Готово", f"Видео сохранено:\n{result_path}")
 
+    def _on_cancelled(self):
+        self._set_running(False)
+        self.pbar.config(value=0)
+        self.status.set("Отменено.")
+
     def _on_error(self, err: Exception):
         self._set_running(False)
         self.status.set("Ошибка.")
@@ -1003,6 +1076,10 @@ class App(tk.Tk):
                 self.btn_open_dir.configure(state="normal")
                 self.btn_open_dir.state(["!disabled"])
 
+        if hasattr(self, "btn_cancel"):
+            # наоборот: живая только во время рендера
+            self.btn_cancel.configure(state="normal" if running else "disabled")
+
 def main():
     App().mainloop()
 
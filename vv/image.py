@@ -1,11 +1,107 @@
 from __future__ import annotations
 from pathlib import Path
 
-from PIL import Image, ImageOps, ImageFilter, ImageEnhance
+import math
+
+from PIL import Image, ImageOps, ImageFilter
 from .config import WIDTH, HEIGHT, BG
+from .profiling import stage
 
 PathLike = str | Path
 
+# Декодируем минимум вдвое крупнее нужного: финальный LANCZOS-ресайз тогда почти
+# не отличается от ресайза с полного разрешения (PSNR > 45 дБ); при меньшем запасе
+# на мелких деталях вылезает алиасинг
+DRAFT_MARGIN = 2.0
+
+# Радиус блюра фона в уменьшенной копии (см. blurred_background)
+BLUR_SMALL_RADIUS = 5.0
+
+# EXIF-ориентации, при которых картинка поворачивается на 90°
+_ROTATED = {5, 6, 7, 8}
+
+
+def load_image(
+    path: PathLike,
+    size: tuple[int, int] | None = None,
+    *,
+    cover: bool = False,
+    overscan: float = 0.0,
+) -> tuple[Image.Image, tuple[int, int]]:
+    """
+    Открыть картинку в RGB с учётом EXIF-поворота -> (картинка, размер исходника).
+
+    Если задан size, картинка нужна лишь для кадра W×H: вписанной (cover=False)
+    или заполняющей его (cover=True), плюс запас overscan. Тогда большие
+    исходники декодируются сразу в уменьшенном виде: JPEG — через draft
+    (масштабирование 1/2, 1/4, 1/8 прямо в декодере), остальное — через reduce.
+    Уменьшение всегда оставляет запас DRAFT_MARGIN над нужным размером.
+
+    Размер исходника (после поворота) возвращается отдельно: геометрию кадра
+    нужно считать по нему, а не по уменьшенной копии, чтобы не сдвинуться на пиксель.
+    """
+    with stage("decode"):
+        im = Image.open(path)
+        w, h = im.size
+        rotated = im.getexif().get(0x0112) in _ROTATED
+        src_size = (h, w) if rotated else (w, h)
+        if size is None:
+            return ImageOps.exif_transpose(im).convert("RGB"), src_size
+
+        W, H = size
+
+        def scale_for(w: int, h: int) -> float:
+            """Во сколько раз можно уменьшить картинку w×h (с запасом); >= 1 — уменьшать нельзя."""
+            k = max(W / w, H / h) if cover else min(W / w, H / h)
+            return k * (1.0 + overscan) * DRAFT_MARGIN
+
+        if im.format == "JPEG":
+            scale = scale_for(*src_size)
+            if scale < 1.0:
+                # draft выбирает самый сильный масштаб, при котором картинка не меньше запрошенной
+                im.draft("RGB", (math.ceil(w * scale), math.ceil(h * scale)))
+
+        im = ImageOps.exif_transpose(im).convert("RGB")
+
+        # остальные форматы (и остаток после draft) — целочисленное уменьшение
+        scale = scale_for(im.width, im.height)
+        if scale < 0.5:
+            im = im.reduce(int(1.0 / scale))
+        return im, src_size
+
+
+def blurred_background(
+    im: Image.Image,
+    size: tuple[int, int],
+    *,
+    radius: float,
+    brightness: float = 1.0,
+    crop: bool = False,
+) -> Image.Image:
+    """
+    Размытый фон W×H из самой картинки.
+
+    crop=False — картинка растягивается на весь кадр, crop=True — вписывается с обрезкой (cover).
+    Размытие считается в уменьшенном виде (радиус там ~BLUR_SMALL_RADIUS px) и растягивается
+    обратно: от сильного блюра высоких частот всё равно не остаётся, а пикселей в разы меньше.
+    """
+    with stage("blur"):
+        W, H = size
+        f = max(1.0, radius / BLUR_SMALL_RADIUS)
+        small = (max(1, round(W / f)), max(1, round(H / f)))
+
+        if crop:
+            bg_img = ImageOps.fit(im, small, Image.BOX)
+        else:
+            bg_img = im.resize(small, Image.BOX)
+        bg_img = bg_img.filter(ImageFilter.GaussianBlur(radius=radius * small[0] / W))
+        bg_img = bg_img.resize((W, H), Image.BILINEAR)
+
+        if brightness != 1.0:
+            # то же, что ImageEnhance.Brightness, но одной таблицей
+            bg_img = bg_img.point([min(255, int(v * brightness)) for v in range(256)] * 3)
+        return bg_img
+
 
 def fit_to_canvas(
     path: PathLike,
@@ -27,14 +123,15 @@ def fit_to_canvas(
     else:
         W, H = size
 
-    im = Image.open(path).convert("RGB")
-    im = ImageOps.exif_transpose(im)
+    # fancy-фон растягивается на весь кадр — ему нужно столько же пикселей, сколько cover
+    im, (src_w, src_h) = load_image(path, (W, H), cover=(mode == "cover" or fancy_bg))
 
     if mode == "cover":
         # масштабируем так, чтобы кадр полностью заполнился, лишнее обрежется
-        k = max(W / im.width, H / im.height)
-        new_w, new_h = int(im.width * k), int(im.height * k)
-        im_resized = im.resize((new_w, new_h), Image.LANCZOS)
+        k = max(W / src_w, H / src_h)
+        new_w, new_h = int(src_w * k), int(src_h * k)
+        with stage("resize"):
+            im_resized = im.resize((new_w, new_h), Image.LANCZOS)
 
         # сколько "лишнего" по краям
         extra_x = max(0, new_w - W)
@@ -62,16 +159,14 @@ def fit_to_canvas(
 
     elif mode == "fit":
         # вписываем целиком, но фон может быть либо однотонным, либо fancy
-        k = min(W / im.width, H / im.height)
-        new_w, new_h = int(im.width * k), int(im.height * k)
-        im_resized = im.resize((new_w, new_h), Image.LANCZOS)
+        k = min(W / src_w, H / src_h)
+        new_w, new_h = int(src_w * k), int(src_h * k)
+        with stage("resize"):
+            im_resized = im.resize((new_w, new_h), Image.LANCZOS)
 
         if fancy_bg:
             # фон из самой картинки: растянули, размыли, затемнили
-            bg_img = im.resize((W, H), Image.LANCZOS)
-            bg_img = bg_img.filter(ImageFilter.GaussianBlur(radius=30))
-            bg_img = ImageEnhance.Brightness(bg_img).enhance(0.5)
-            canvas = bg_img
+            canvas = blurred_background(im, (W, H), radius=30, brightness=0.5)
         else:
             # обычный однотонный фон
             canvas = Image.new("RGB", (W, H), color=bg)
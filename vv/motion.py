@@ -0,0 +1,197 @@
+"""
+Геометрия движения кадра (zoom / Ken Burns).
+Общая для moviepy-бэкенда и для прямого рендера в ffmpeg.
+
+Договорённость по координатам: (x, y) — левый верхний угол видимого окна
+в координатах уже отмасштабированного (на s) контента.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+# Запас на движение (Overscan) для Ken Burns
+OVERSCAN_COVER = 0.06  # 6%
+OVERSCAN_FIT = 0.08    # 8% запаса внутри рамки
+
+ZOOM_STRENGTH = 0.03   # простой motion="zoom"
+
+
+@dataclass(frozen=True)
+class Move:
+    """Движение одного слайда: окно (x, y) и масштаб s — от старта (0) к концу (1)."""
+    x0: float = 0.0
+    x1: float = 0.0
+    y0: float = 0.0
+    y1: float = 0.0
+    s0: float = 1.0
+    s1: float = 1.0
+
+    def at(self, a: float) -> tuple[float, float, float]:
+        """(x, y, s) для доли пути a в [0, 1]."""
+        return (
+            self.x0 + (self.x1 - self.x0) * a,
+            self.y0 + (self.y1 - self.y0) * a,
+            self.s0 + (self.s1 - self.s0) * a,
+        )
+
+
+def ease(t: float, duration: float) -> float:
+    """Плавность ease-in-out (sine): t в секундах -> доля пути в [0, 1]."""
+    if duration <= 0:
+        return 0.0
+    x = min(max(t / duration, 0.0), 1.0)
+    return 0.5 - 0.5 * math.cos(math.pi * x)
+
+
+def ease_array(t: np.ndarray, duration: float) -> np.ndarray:
+    """ease() сразу для массива моментов времени."""
+    if duration <= 0:
+        return np.zeros_like(t, dtype=np.float64)
+    x = np.clip(t / duration, 0.0, 1.0)
+    return 0.5 - 0.5 * np.cos(np.pi * x)
+
+
+class MotionCurve:
+    """
+    Движение слайда, посчитанное один раз для всех его кадров: массивы x, y, s.
+
+    Слайд начинается в момент start общего таймлайна, кадры идут с шагом 1/fps,
+    поэтому локальные моменты кадров — i/fps - start. Для них значения берутся
+    из массивов; для остальных t (или если fps не задан) считаются на лету.
+    """
+
+    def __init__(self, move: Move, *, duration: float, fps: int | None = None, start: float = 0.0):
+        self.move = move
+        self.duration = float(duration)
+        self.fps = fps
+        self.start = float(start)
+        self.first = 0
+
+        if fps:
+            eps = 1e-6
+            self.first = math.ceil(self.start * fps - eps)
+            last = math.floor((self.start + self.duration) * fps + eps)
+            t = np.arange(self.first, last + 1, dtype=np.float64) / fps - self.start
+        else:
+            t = np.zeros(0, dtype=np.float64)
+
+        a = ease_array(t, self.duration)
+        self.t = t
+        self.x = move.x0 + (move.x1 - move.x0) * a
+        self.y = move.y0 + (move.y1 - move.y0) * a
+        self.s = move.s0 + (move.s1 - move.s0) * a
+
+    def index(self, t: float) -> int | None:
+        """Номер кадра в массивах для момента t или None, если t не попадает в сетку кадров."""
+        if not self.fps or not len(self.t):
+            return None
+        j = round((t + self.start) * self.fps) - self.first
+        if 0 <= j < len(self.t) and abs(self.t[j] - t) < 1e-6:
+            return j
+        return None
+
+    def at(self, t: float) -> tuple[float, float, float]:
+        j = self.index(t)
+        if j is None:
+            return self.move.at(ease(t, self.duration))
+        return float(self.x[j]), float(self.y[j]), float(self.s[j])
+
+
+def fit_box(src_w: int, src_h: int, W: int, H: int) -> tuple[int, int]:
+    """Размер "окна" (рамки) для kenburns + fit: картинка вписана целиком."""
+    ratio_im = src_w / src_h
+    ratio_screen = W / H
+
+    if ratio_im > ratio_screen:
+        # Широкая - упирается в края по ширине
+        return W, int(W / ratio_im)
+    # Высокая - упирается в края по высоте
+    return int(H * ratio_im), H
+
+
+def zoom_move(direction_flag: int) -> Move:
+    """Простой Zoom без панорамирования (motion="zoom")."""
+    if direction_flag == 0:
+        return Move(s0=1.0, s1=1.0 + ZOOM_STRENGTH)
+    return Move(s0=1.0 + ZOOM_STRENGTH, s1=1.0)
+
+
+def kenburns_move(
+    move_type: str,
+    direction_flag: int,
+    *,
+    fit_mode: str,
+    src_size: tuple[int, int],
+    content_size: tuple[int, int],
+    size: tuple[int, int],
+) -> Move:
+    """
+    Параметры Ken Burns для слайда.
+
+    cover: окно W×H ездит по контенту (контент уже с запасом OVERSCAN_COVER);
+    fit:   окно размером fit_box ездит по контенту внутри рамки (iOS style).
+    """
+    W, H = size
+    new_w, new_h = content_size
+
+    # ---------------------------------------------------------
+    # COVER (Весь экран заполнен, двигаем саму картинку)
+    # ---------------------------------------------------------
+    if fit_mode == "cover":
+        max_dx = max(0, new_w - W)
+        max_dy = max(0, new_h - H)
+        cx, cy = max_dx / 2.0, max_dy / 2.0
+
+        if move_type == "zoom":
+            # флаг направления пачки: Zoom In vs Zoom Out
+            if direction_flag == 0:
+                return Move(cx, cx, cy, cy, 1.0, 1.05)
+            return Move(cx, cx, cy, cy, 1.05, 1.0)
+
+        # Pan
+        s = 1.005  # Легкий фикс краев
+        travel = 0.7  # 70% доступного пути
+        if max_dx > max_dy:
+            dist = max_dx * travel
+            if direction_flag == 0:  # Left -> Right
+                return Move(cx - dist/2, cx + dist/2, cy, cy, s, s)
+            return Move(cx + dist/2, cx - dist/2, cy, cy, s, s)  # Right -> Left
+
+        dist = max_dy * travel
+        if direction_flag == 0:  # Top -> Bottom
+            return Move(cx, cx, cy - dist/2, cy + dist/2, s, s)
+        return Move(cx, cx, cy + dist/2, cy - dist/2, s, s)  # Bottom -> Top
+
+    # ---------------------------------------------------------
+    # FIT (iOS Style - Stable Frame, Moving Content)
+    # ---------------------------------------------------------
+    src_w, src_h = src_size
+    fit_w, fit_h = fit_box(src_w, src_h, W, H)
+
+    # Доступное пространство внутри окна; старт — по центру
+    max_dx = new_w - fit_w
+    max_dy = new_h - fit_h
+    cx, cy = max_dx / 2.0, max_dy / 2.0
+
+    if move_type == "zoom":
+        if direction_flag == 0:
+            return Move(cx, cx, cy, cy, 1.0, 1.05)  # Zoom In
+        return Move(cx, cx, cy, cy, 1.05, 1.0)  # Zoom Out
+
+    # Pan
+    travel = 0.8
+    if (src_w / src_h) > (W / H):
+        # Картинка широкая, fit_w == W. Двигаем горизонтально
+        dist = max_dx * travel
+        if direction_flag == 0:
+            return Move(cx + dist/2, cx - dist/2, cy, cy)
+        return Move(cx - dist/2, cx + dist/2, cy, cy)
+
+    dist = max_dy * travel
+    if direction_flag == 0:
+        return Move(cx, cx, cy + dist/2, cy - dist/2)
+    return Move(cx, cx, cy - dist/2, cy + dist/2)
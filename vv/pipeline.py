@@ -1,42 +1,937 @@
 from __future__ import annotations
 from pathlib import Path
-from collections.abc import Iterable, Callable
-import random
-import math
+from collections.abc import AsyncIterator, Iterable, Iterator, Callable, Sequence
+from collections import Counter, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from functools import partial
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import os
+import tempfile
+from contextlib import nullcontext
 import numpy as np
-from moviepy import ImageClip, CompositeVideoClip, concatenate_videoclips
-from moviepy.video.fx import CrossFadeIn
 
-from .image import fit_to_canvas
-from .audio import prepare_audio
-from .config import WIDTH, HEIGHT, BG, IMAGE_EXTS
-from .duration import fade_for, sec_per_for_total
-
-from PIL import Image, ImageOps, ImageFilter
+from .image import blurred_background, fit_to_canvas, load_image
+from .config import WIDTH, HEIGHT, BG
+from .audio import prepare_audio_track
+from .cache import PcmCache, SegmentCache, SlideCache, file_digest, hash_key
+from .cancel import CancelToken, RenderCancelled
+from .ffmpeg import FrameWriter, concat_segments, mux_audio, video_codec_args
+from .render import (
+    Run,
+    SlideRenderer,
+    encode_runs,
+    frame_count,
+    iter_frames,
+    slides_for,
+    split_timeline,
+    still_runs,
+    timeline_runs,
+    write_stills,
+)
+from .motion import OVERSCAN_COVER, OVERSCAN_FIT, fit_box
+from .plan import RenderPlan, check_plan, make_plan
+from .scan import ImageIndex, scan_images
+from .profiling import Profiler, current as current_profiler, stage
+from .timeline import index_composite
+from .progress import EncodeCB, EncodeProgress, FrameProgress, PrepareProgress
+
+from PIL import Image
 
 PathLike = str | Path
 CropOffsets = dict[str, tuple[float, float]]
 ProgressCB = Callable[[int, int], None] | None
 
-def _collect_images(images: PathLike | Iterable[PathLike]) -> list[Path]:
-    """Собрать все картинки из аргументов: файлы/папки."""
-    if isinstance(images, (str, Path)):
-        p = Path(images)
-        if p.is_dir():
-            return sorted(
-                x for x in p.iterdir()
-                if x.suffix.lower() in IMAGE_EXTS
+# moviepy нужен только для engine="moviepy", а его импорт — почти секунда:
+# грузится при первой сборке клипов (_load_moviepy)
+ImageClip = VideoClip = concatenate_videoclips = CrossFadeIn = None
+
+# сколько слайдов на процесс пула готовится впрок (workers > 1)
+PREFETCH_PER_WORKER = 2
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class PreparedSlide:
+    """
+    Подготовленные битмапы одного слайда.
+    Считаются без moviepy, поэтому их можно готовить в отдельных процессах.
+
+    frame      — статика: готовый кадр W×H;
+    content    — kenburns: картинка с запасом на движение;
+    background — kenburns + fit: размытый фон W×H.
+    """
+    path: str
+    src_size: tuple[int, int]  # размер исходника после EXIF-поворота (для статики — размер кадра)
+    frame: np.ndarray | None = None
+    content: np.ndarray | None = None
+    background: np.ndarray | None = None
+    cached: bool = False  # взят из дискового кэша (см. vv.cache)
+    profile: dict | None = None  # замеры подготовки (Profiler.stats), если включено профилирование
+
+
+def _slide_params(
+    offset: tuple[float, float] | None,
+    *,
+    size: tuple[int, int],
+    bg: str,
+    motion: str,
+    fit_mode: str,
+    fancy_bg: bool,
+) -> dict:
+    """Всё, от чего зависит подготовленный слайд (кроме самого файла) — для ключей кэшей."""
+    return dict(
+        size=list(size),
+        bg=bg,
+        fit_mode=fit_mode,
+        fancy_bg=fancy_bg,
+        # сдвиг кадрирования применяется только к готовому кадру в cover
+        offset=list(offset) if offset is not None and motion != "kenburns" and fit_mode == "cover" else None,
+        # kenburns хранит контент с запасом на движение, остальные режимы — готовый кадр
+        variant=["kenburns", OVERSCAN_COVER, OVERSCAN_FIT] if motion == "kenburns" else ["frame"],
+    )
+
+
+def _prepare_slide(
+    path: PathLike,
+    offset: tuple[float, float] | None = None,
+    *,
+    size: tuple[int, int],
+    bg: str,
+    motion: str,
+    fit_mode: str,
+    fancy_bg: bool,
+    cache: SlideCache | None = None,
+    profile: str | None = None,
+) -> PreparedSlide:
+    """
+    Декод + EXIF-поворот + ресайз (+ блюр фона) одной картинки (или готовый слайд из кэша).
+    profile — "time" / "memory": замерить этапы подготовки в slide.profile
+    (так замеры доезжают и из процессов пула).
+    """
+    if profile is not None:
+        with Profiler(memory=profile == "memory") as p, p.stage("prepare"):
+            slide = _prepare_slide(path, offset, size=size, bg=bg, motion=motion, fit_mode=fit_mode,
+                                   fancy_bg=fancy_bg, cache=cache)
+        slide.profile = p.stats()
+        return slide
+
+    if cache is None:
+        return _render_slide(path, offset, size=size, bg=bg, motion=motion, fit_mode=fit_mode, fancy_bg=fancy_bg)
+
+    key = cache.key(path, **_slide_params(offset, size=size, bg=bg, motion=motion, fit_mode=fit_mode, fancy_bg=fancy_bg))
+    with stage("cache"):
+        slide = cache.get(key, path)
+    if slide is None:
+        slide = _render_slide(path, offset, size=size, bg=bg, motion=motion, fit_mode=fit_mode, fancy_bg=fancy_bg)
+        with stage("cache"):
+            cache.put(key, slide)
+    return slide
+
+
+def _render_slide(
+    path: PathLike,
+    offset: tuple[float, float] | None,
+    *,
+    size: tuple[int, int],
+    bg: str,
+    motion: str,
+    fit_mode: str,
+    fancy_bg: bool,
+) -> PreparedSlide:
+    W, H = size
+
+    if motion != "kenburns":
+        frame = fit_to_canvas(path, size=(W, H), bg=bg, mode=fit_mode, fancy_bg=fancy_bg, offset=offset)
+        return PreparedSlide(path=str(path), src_size=frame.size, frame=np.array(frame))
+
+    # фону (fit) и контенту (cover) нужно разрешение cover + запас на движение
+    overscan = OVERSCAN_COVER if fit_mode == "cover" else OVERSCAN_FIT
+    im_pil, (src_w, src_h) = load_image(path, (W, H), cover=True, overscan=overscan)
+
+    if fit_mode == "cover":
+        scale_base = max(W / src_w, H / src_h)
+        k = scale_base * (1.0 + OVERSCAN_COVER)
+
+        new_w, new_h = int(src_w * k), int(src_h * k)
+        with stage("resize"):
+            im_resized = im_pil.resize((new_w, new_h), Image.LANCZOS)
+        return PreparedSlide(path=str(path), src_size=(src_w, src_h), content=np.array(im_resized))
+
+    # Фон (Blur)
+    bg_im = blurred_background(im_pil, (W, H), radius=35, crop=True)
+
+    # Контент ДЛЯ окна: больше самого окна (fit_w/h) на OVERSCAN_FIT
+    fit_w, fit_h = fit_box(src_w, src_h, W, H)
+    content_w = int(fit_w * (1.0 + OVERSCAN_FIT))
+    content_h = int(fit_h * (1.0 + OVERSCAN_FIT))
+    with stage("resize"):
+        img_content = im_pil.resize((content_w, content_h), Image.LANCZOS)
+
+    return PreparedSlide(
+        path=str(path),
+        src_size=(src_w, src_h),
+        content=np.array(img_content),
+        background=np.array(bg_im),
+    )
+
+
+def _shared_sources(
+    paths: list[Path],
+    offsets: list[tuple[float, float] | None],
+    **prepare,
+) -> list[int]:
+    """
+    Одинаковые входы: для слайда j — номер первого слайда с тем же содержимым файла
+    и теми же параметрами подготовки (j, если такого нет).
+    Хэшируется только содержимое файлов, размер которых совпал с размером другого входа:
+    файл уникального размера не может быть копией и не читается.
+    """
+    params = {k: prepare[k] for k in ("size", "bg", "motion", "fit_mode", "fancy_bg")}
+    sizes = [os.stat(p).st_size for p in paths]
+    counts = Counter(sizes)
+    first: dict[str, int] = {}
+    sources = []
+    for j, (p, off, nbytes) in enumerate(zip(paths, offsets, sizes)):
+        if counts[nbytes] < 2:
+            sources.append(j)
+            continue
+        key = hash_key(file=file_digest(p), **_slide_params(off, **params))
+        sources.append(first.setdefault(key, j))
+    return sources
+
+
+def _iter_prepared(
+    paths: list[Path],
+    offsets: list[tuple[float, float] | None],
+    *,
+    workers: int = 1,
+    index: Sequence[int] | None = None,
+    **kwargs,
+) -> Iterator[PreparedSlide]:
+    """
+    Отдаёт подготовленные слайды строго по порядку, лениво — по мере запроса.
+    workers > 1 — подготовка в пуле процессов (декод/ресайз/блюр упираются в CPU).
+    Попадания/промахи кэша (kwargs["cache"]) и замеры подготовки (kwargs["profile"])
+    собираются здесь, в текущем процессе; index — номера слайдов в ролике.
+
+    Одинаковые входы (_shared_sources) готовятся один раз: повтор получает те же
+    битмапы, а подготовленный слайд держится в памяти только до последнего повтора.
+    """
+    cache: SlideCache | None = kwargs.get("cache")
+    profiler = current_profiler()
+    sources = _shared_sources(paths, offsets, **kwargs)
+    unique = [j for j, src in enumerate(sources) if src == j]
+    shared = len(paths) - len(unique)
+    if shared:
+        log.debug("Одинаковых входов: %d из %d — готовятся один раз", shared, len(paths))
+    if profiler is not None:
+        profiler.meta["shared_slides"] = profiler.meta.get("shared_slides", 0) + shared
+    last = {src: j for j, src in enumerate(sources)}
+    held: dict[int, PreparedSlide] = {}
+
+    slides = _prepare_in_order([paths[j] for j in unique], [offsets[j] for j in unique], workers=workers, **kwargs)
+    try:
+        for j, src in enumerate(sources):
+            if src == j:
+                slide = next(slides)
+                if cache is not None:
+                    cache.record(slide)
+                if slide.profile is not None:
+                    if profiler is not None:
+                        profiler.merge(slide.profile, slide=index[j] if index is not None else j)
+                    slide.profile = None
+            else:
+                slide = replace(held[src], path=str(paths[j]))
+            if last[src] > j:
+                held[src] = slide
+            else:
+                held.pop(src, None)
+            yield slide
+    finally:
+        slides.close()
+
+
+def _prepare_in_order(
+    paths: list[Path],
+    offsets: list[tuple[float, float] | None],
+    *,
+    workers: int,
+    **kwargs,
+) -> Iterator[PreparedSlide]:
+    if workers <= 1 or len(paths) <= 1:
+        for p, off in zip(paths, offsets):
+            yield _prepare_slide(p, off, **kwargs)
+        return
+
+    fn = partial(_prepare_slide, **kwargs)
+    # не больше PREFETCH_PER_WORKER слайдов на процесс впереди потребителя:
+    # готовые, но ещё не нужные слайды не копятся в памяти
+    ahead = workers * PREFETCH_PER_WORKER
+    pending: deque[Future] = deque()
+    # spawn: поток подготовки звука уже запущен, форк может унести его захваченную блокировку
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)), mp_context=ctx) as ex:
+        try:
+            for p, off in zip(paths, offsets):
+                pending.append(ex.submit(fn, p, off))
+                if len(pending) >= ahead:
+                    with stage("wait"):
+                        slide = pending.popleft().result()
+                    yield slide
+            while pending:
+                with stage("wait"):
+                    slide = pending.popleft().result()
+                yield slide
+        finally:
+            for f in pending:
+                f.cancel()
+
+
+def _load_moviepy() -> None:
+    import moviepy
+    from moviepy.video.fx import CrossFadeIn as crossfade_in
+
+    names = dict(
+        ImageClip=moviepy.ImageClip,
+        VideoClip=moviepy.VideoClip,
+        concatenate_videoclips=moviepy.concatenate_videoclips,
+        CrossFadeIn=crossfade_in,
+    )
+    for name, value in names.items():
+        # уже подставленное (например, в тестах) не трогаем
+        if globals()[name] is None:
+            globals()[name] = value
+
+
+def _make_clip(
+    slide: PreparedSlide,
+    move_type: str,
+    direction_flag: int,
+    *,
+    motion: str,
+    fit_mode: str,
+    sec_per: float,
+    size: tuple[int, int],
+    fps: int | None = None,
+    start: float = 0.0,
+):
+    """Собрать moviepy-клип из подготовленного слайда."""
+    _load_moviepy()
+    W, H = size
+
+    if motion in {"kenburns", "zoom"}:
+        # кадры рисует тот же генератор, что и в engine="ffmpeg":
+        # кривая движения посчитана заранее, из исходника берётся только видимое окно
+        renderer = SlideRenderer(
+            slide,
+            move_type,
+            direction_flag,
+            motion=motion,
+            fit_mode=fit_mode,
+            sec_per=sec_per,
+            size=(W, H),
+            fps=fps,
+            start=start,
+        )
+        return VideoClip(
+            lambda t: renderer.render(t, np.empty((H, W, 3), dtype=np.uint8)),
+            duration=sec_per,
+        )
+
+    # СТАТИКА
+    return ImageClip(slide.frame).with_duration(sec_per)
+
+
+def _iter_slides(
+    prepared: Iterable[PreparedSlide],
+    moves: list[tuple[str, int]],
+    *,
+    make: Callable,
+    progress_cb: ProgressCB,
+    n: int,
+    encode_signal: bool = False,
+    step: float,
+    cancel: CancelToken | None = None,
+    **kwargs,
+) -> Iterator:
+    """
+    Клип/рендерер на каждый подготовленный слайд (лениво) + прогресс по слайдам.
+    encode_signal — после последнего слайда сразу сообщить о кодировании (n+1, n).
+    cancel — отмена проверяется перед каждым слайдом.
+    """
+    try:
+        for idx, (slide, (move_type, direction_flag)) in enumerate(zip(prepared, moves), 1):
+            if cancel is not None:
+                cancel.check()
+            item = make(slide, move_type, direction_flag, start=(idx - 1) * step, **kwargs)
+            del slide  # слайд живёт, пока жив его клип/рендерер
+            if progress_cb:
+                progress_cb(idx, n)
+                if encode_signal and idx == n:
+                    progress_cb(n + 1, n)
+            yield item
+    finally:
+        # потребитель мог остановиться раньше — пул подготовки закрываем сразу, а не при сборке мусора
+        close = getattr(prepared, "close", None)
+        if close is not None:
+            close()
+
+
+def _write_frames(
+    renderers: Iterable[SlideRenderer],
+    out_path: Path,
+    *,
+    n: int,
+    static: bool,
+    sec_per: float,
+    fade: float,
+    fps: int,
+    size: tuple[int, int],
+    progress: FrameProgress | None = None,
+    cancel: CancelToken | None = None,
+) -> None:
+    """
+    engine="ffmpeg": кадры -> stdin ffmpeg (только видеопоток).
+    renderers — ленивая последовательность из n слайдов.
+    """
+    if static:
+        # статика: каждый слайд кодируется один раз, покадрово — только переходы
+        write_stills(
+            renderers,
+            out_path,
+            n=n,
+            sec_per=sec_per,
+            fade=fade,
+            fps=fps,
+            size=size,
+            progress=progress,
+            cancel=cancel,
+        )
+        return
+
+    duration = n * sec_per - (n - 1) * fade
+
+    with FrameWriter(out_path, size, fps, duration=duration, cancel=cancel) as writer:
+        for frame in iter_frames(renderers, n=n, sec_per=sec_per, fade=fade, fps=fps, size=size):
+            writer.write(frame)
+            if progress is not None:
+                progress.advance()
+
+
+# отмена в процессах пула кусков (_write_segments): флаг, общий с основным процессом
+_chunk_cancel: CancelToken | None = None
+
+
+def _init_chunk_worker(flag) -> None:
+    global _chunk_cancel
+    _chunk_cancel = CancelToken(flag)
+
+
+def _encode_chunk(
+    frames: range,
+    out: str,
+    *,
+    paths: list[PathLike],
+    offsets: list[tuple[float, float] | None],
+    moves: list[tuple[str, int]],
+    n: int,
+    prepare: dict,
+    motion: str,
+    fit_mode: str,
+    sec_per: float,
+    fade: float,
+    fps: int,
+    size: tuple[int, int],
+) -> tuple[int, int, int, dict | None]:
+    """
+    Закодировать кадры frames одним процессом ffmpeg (без аудио) — в отдельном процессе.
+    paths/offsets/moves — все слайды ролика; готовятся только нужные этому куску.
+    Одинаковые входы внутри куска готовятся один раз (_shared_sources); между кусками —
+    в каждом своём процессе заново (общий только дисковый кэш слайдов).
+    Вернёт (попадания, промахи) кэша слайдов, сколько слайдов взято у одинаковых входов
+    и замеры (Profiler.stats), если prepare["profile"].
+    """
+    slides = slides_for(frames, n, sec_per=sec_per, fade=fade, fps=fps)
+    step = sec_per - fade
+    stats = [0, 0]
+    mode = prepare.get("profile")
+    profiler = Profiler(memory=mode == "memory") if mode else None
+    sources = [slides[j] for j in _shared_sources([paths[k] for k in slides], [offsets[k] for k in slides], **prepare)]
+    last = {src: k for k, src in zip(slides, sources)}
+    held: dict[int, PreparedSlide] = {}
+
+    def renderers() -> Iterator[SlideRenderer]:
+        for k, src in zip(slides, sources):
+            if src != k:
+                slide = replace(held[src], path=str(paths[k]))
+            else:
+                slide = _prepare_slide(paths[k], offsets[k], **prepare)
+                stats[0 if slide.cached else 1] += 1
+                if profiler is not None and slide.profile is not None:
+                    profiler.merge(slide.profile, slide=k)
+                    slide.profile = None
+            if last[src] > k:
+                held[src] = slide
+            else:
+                held.pop(src, None)
+            move_type, direction_flag = moves[k]
+            yield SlideRenderer(
+                slide,
+                move_type,
+                direction_flag,
+                motion=motion,
+                fit_mode=fit_mode,
+                sec_per=sec_per,
+                size=size,
+                fps=fps,
+                start=k * step,
+            )
+
+    with profiler or nullcontext(), FrameWriter(out, size, fps, cancel=_chunk_cancel) as writer:
+        for frame in iter_frames(renderers(), n=n, sec_per=sec_per, fade=fade, fps=fps, size=size, frames=frames):
+            writer.write(frame)
+    shared = sum(src != k for k, src in zip(slides, sources))
+    return stats[0], stats[1], shared, profiler.stats() if profiler is not None else None
+
+
+def _write_segments(
+    paths: list[Path],
+    offsets: list[tuple[float, float] | None],
+    moves: list[tuple[str, int]],
+    out_path: Path,
+    *,
+    segments: int,
+    prepare: dict,
+    progress_cb: ProgressCB,
+    progress: FrameProgress | None = None,
+    cancel: CancelToken | None = None,
+    sec_per: float,
+    fade: float,
+    fps: int,
+    size: tuple[int, int],
+    **render,
+) -> None:
+    """
+    engine="ffmpeg", segments > 1: таймлайн режется на куски по границам слайдов вне
+    переходов, каждый кусок кодируется своим процессом с одинаковыми настройками,
+    потом куски склеиваются без перекодирования.
+    Кадры куска засчитываются в progress, когда кусок готов целиком.
+    Отмена доходит до процессов через общий multiprocessing.Event.
+    """
+    n = len(paths)
+    chunks = split_timeline(n, sec_per=sec_per, fade=fade, fps=fps, parts=segments)
+    cache: SlideCache | None = prepare.get("cache")
+
+    with tempfile.TemporaryDirectory(prefix="vv_") as tmp:
+        files = [str(Path(tmp) / f"chunk_{j:04d}.mkv") for j in range(len(chunks))]
+        fn = partial(
+            _encode_chunk,
+            paths=paths,
+            offsets=offsets,
+            moves=moves,
+            n=n,
+            prepare=prepare,
+            sec_per=sec_per,
+            fade=fade,
+            fps=fps,
+            size=size,
+            **render,
+        )
+
+        done: set[int] = set()
+        # spawn, а не fork: build_video держит свои потоки (звук, профилировщик), и форк
+        # с захваченной в другом потоке блокировкой зависает в дочернем процессе
+        ctx = multiprocessing.get_context("spawn")
+        pool = dict(max_workers=min(segments, len(chunks)), mp_context=ctx)
+        unsubscribe = None
+        if cancel is not None:
+            flag = ctx.Event()
+            unsubscribe = cancel.on_cancel(flag.set)
+            pool.update(initializer=_init_chunk_worker, initargs=(flag,))
+        with ProcessPoolExecutor(**pool) as ex:
+            futures = {ex.submit(fn, frames, out): frames for frames, out in zip(chunks, files)}
+            try:
+                for fut in as_completed(futures):
+                    hits, misses, shared, stats = fut.result()
+                    if cache is not None:
+                        cache.hits += hits
+                        cache.misses += misses
+                    if shared:
+                        log.debug("Одинаковых входов в куске %s: %d — готовятся один раз", futures[fut], shared)
+                    if (profiler := current_profiler()) is not None:
+                        profiler.meta["shared_slides"] = profiler.meta.get("shared_slides", 0) + shared
+                        if stats is not None:
+                            profiler.merge(stats)
+                    if progress is not None:
+                        progress.advance(len(futures[fut]))
+                    # прогресс — сколько слайдов уже закодировано
+                    done.update(slides_for(futures[fut], n, sec_per=sec_per, fade=fade, fps=fps))
+                    if progress_cb:
+                        progress_cb(len(done), n)
+            finally:
+                for fut in futures:
+                    fut.cancel()
+        if unsubscribe is not None:
+            unsubscribe()
+
+        if progress_cb:
+            progress_cb(n + 1, n)
+        concat_segments(
+            [(f, len(frames) / fps) for f, frames in zip(files, chunks)],
+            out_path,
+            duration=frame_count(n, sec_per, fade, fps) / fps,
+            cancel=cancel,
+        )
+
+
+def _write_incremental(
+    paths: list[Path],
+    offsets: list[tuple[float, float] | None],
+    moves: list[tuple[str, int]],
+    *,
+    segment_cache: SegmentCache,
+    prepare: dict,
+    workers: int,
+    progress_cb: ProgressCB,
+    progress: FrameProgress | None = None,
+    cancel: CancelToken | None = None,
+    motion: str,
+    fit_mode: str,
+    sec_per: float,
+    fade: float,
+    fps: int,
+    size: tuple[int, int],
+) -> Path:
+    """
+    engine="ffmpeg" + segment_cache: ролик собирается из закодированных кусков —
+    по отрезку "один слайд" и по переходу. Ключ куска — всё, от чего зависят его кадры
+    (файлы и параметры слайдов, движение, положение на таймлайне, настройки кодека),
+    поэтому после правки одного слайда перекодируются только он и соседние переходы,
+    остальное берётся из кэша и склеивается без перекодирования.
+
+    Склеенный видеопоток тоже остаётся в кэше (его путь и возвращается), так что
+    рендер, в котором поменялось только аудио, сводится к одному сведению.
+    """
+    n = len(paths)
+    step = sec_per - fade
+    static = motion == "none"
+    runs = (still_runs if static else timeline_runs)(n, sec_per=sec_per, fade=fade, fps=fps)
+
+    slide_params = {k: v for k, v in prepare.items() if k not in {"cache", "profile"}}
+    slide_keys = [
+        hash_key(file=file_digest(p), **_slide_params(off, **slide_params))
+        for p, off in zip(paths, offsets)
+    ]
+    common = dict(size=list(size), fps=fps, codec=video_codec_args())
+
+    def run_key(run: Run) -> str:
+        if static and not run.blend:
+            # статичный слайд — один кадр, длительность задаётся при склейке
+            return hash_key(kind="still", slide=slide_keys[run.k], **common)
+        ks = [run.k - 1, run.k] if run.blend else [run.k]
+        return hash_key(
+            kind="blend" if run.blend else "frames",
+            slides=[slide_keys[k] for k in ks],
+            moves=None if static else [list(moves[k]) for k in ks],
+            # момент первого кадра внутри слайда и число кадров
+            t0=round(run.start / fps - run.k * step, 6),
+            count=run.count,
+            motion=motion,
+            fit_mode=fit_mode,
+            sec_per=sec_per,
+            fade=fade,
+            **common,
+        )
+
+    keys = [run_key(run) for run in runs]
+    video_key = hash_key(kind="video", runs=keys, counts=[run.count for run in runs], **common)
+    if (video := segment_cache.get(video_key)) is not None:
+        segment_cache.hits += len(runs)
+        if progress_cb:
+            progress_cb(n + 1, n)
+        if progress is not None:
+            progress.skip(sum(run.count for run in runs))
+        return video
+
+    files: dict[str, Path | None] = {key: segment_cache.get(key) for key in keys}
+
+    # что кодировать: по одному отрезку на каждый отсутствующий ключ
+    missing: dict[str, Run] = {}
+    for run, key in zip(runs, keys):
+        if files[key] is None and key not in missing:
+            missing[key] = run
+    segment_cache.misses += len(missing)
+    segment_cache.hits += len(runs) - len(missing)
+    if progress is not None:
+        # готовые куски — сразу в счёт, без влияния на скорость и ETA
+        progress.skip(sum(run.count for run in runs) - sum(run.count for run in missing.values()))
+
+    if missing:
+        needed = sorted({k for run in missing.values() for k in ((run.k - 1, run.k) if run.blend else (run.k,))})
+        prepared = _iter_prepared(
+            [paths[k] for k in needed],
+            [offsets[k] for k in needed],
+            workers=workers,
+            index=needed,
+            **prepare,
+        )
+
+        def renderers() -> Iterator[SlideRenderer]:
+            try:
+                for j, (k, slide) in enumerate(zip(needed, prepared), 1):
+                    if cancel is not None:
+                        cancel.check()
+                    move_type, direction_flag = moves[k]
+                    r = SlideRenderer(
+                        slide,
+                        move_type,
+                        direction_flag,
+                        motion=motion,
+                        fit_mode=fit_mode,
+                        sec_per=sec_per,
+                        size=size,
+                        fps=fps,
+                        start=k * step,
+                    )
+                    del slide
+                    if progress_cb:
+                        # нетронутые слайды считаем готовыми
+                        progress_cb(n - len(needed) + j, n)
+                    yield r
+            finally:
+                prepared.close()
+
+        segment_cache.root.mkdir(parents=True, exist_ok=True)
+        # временная папка — внутри кэша, чтобы готовые куски забирались переименованием
+        with tempfile.TemporaryDirectory(prefix="vv_", dir=segment_cache.root) as tmp:
+            encoded = encode_runs(
+                renderers(),
+                needed,
+                list(missing.values()),
+                Path(tmp),
+                n=n,
+                sec_per=sec_per,
+                fade=fade,
+                fps=fps,
+                size=size,
+                still=static,
+                progress=progress,
+                cancel=cancel,
             )
-        elif p.is_file():
-            return [p]
-        else:
-            raise FileNotFoundError(f"Путь не найден: {p}")
+            for key, f in zip(missing, encoded):
+                files[key] = segment_cache.put(key, f)
+
+    if progress_cb:
+        progress_cb(n + 1, n)
+    with tempfile.TemporaryDirectory(prefix="vv_", dir=segment_cache.root) as tmp:
+        joined = Path(tmp) / "video.mkv"
+        concat_segments(
+            [(files[key], run.count / fps) for run, key in zip(runs, keys)],
+            joined,
+            duration=frame_count(n, sec_per, fade, fps) / fps,
+            cancel=cancel,
+        )
+        video = segment_cache.put(video_key, joined)
+    # segment_cache.trim() — в build_video, после сведения: склейка и дорожка ещё нужны
+    return video
+
+
+def _prepare_track(
+    audio: PathLike,
+    tmp: Path,
+    *,
+    audio_adjust: str,
+    duration: float,
+    segment_cache: SegmentCache | None = None,
+    audio_cache: PcmCache | None = None,
+    cancel: CancelToken | None = None,
+) -> Path:
+    """
+    Аудиодорожка ровно под ролик (AAC, matroska) — готовится в фоне, пока рендерится видео.
+    С segment_cache готовая дорожка кэшируется по содержимому файла, режиму и длительности.
+    """
+    with stage("audio"):
+        key = None
+        if segment_cache is not None:
+            key = hash_key(kind="audio", file=file_digest(audio), mode=audio_adjust, duration=round(duration, 6))
+            if (track := segment_cache.get(key)) is not None:
+                return track
+
+        track = tmp / "audio.mka"
+        prepare_audio_track(audio, track, duration=duration, mode=audio_adjust, cache=audio_cache, cancel=cancel)
+        if key is not None:
+            track = segment_cache.put(key, track)
+        return track
+
+
+def _write_clips(
+    clips: Iterable[VideoClip],
+    out_path: Path,
+    *,
+    n: int,
+    transitions: bool,
+    fade: float,
+    fps: int,
+    progress_cb: ProgressCB,
+    progress: FrameProgress | None = None,
+    cancel: CancelToken | None = None,
+) -> None:
+    """
+    engine="moviepy": склейка клипов с переходами и кодирование (только видеопоток).
+    Кадры рисует и пишет сам moviepy — отмена проверяется в его логгере, на каждом кадре.
+    """
+    _load_moviepy()
+    clips = list(clips)
+    if not clips:
+        raise ValueError("Не удалось создать ни одного клипа")
+
+    # ---- Переходы ----
+    if transitions and len(clips) > 1:
+        clips_with_fx = [clips[0]] + [c.with_effects([CrossFadeIn(fade)]) for c in clips[1:]]
+        video = concatenate_videoclips(clips_with_fx, method="compose", padding=-fade)
     else:
-        return [Path(x) for x in images]
+        video = concatenate_videoclips(clips, method="compose")
+
+    video = video.with_fps(int(fps))
+    # играющие на кадре клипы — поиском по таймлайну, а не перебором всех слайдов
+    index_composite(video)
+
+    # Сообщаем GUI, что обработка кадров закончилась,
+    # и началось кодирование итогового ролика.
+    if progress_cb:
+        # current > total — специальный сигнал "encode"
+        progress_cb(n + 1, n)
+
+    # moviepy рисует кадры прямо по ходу записи — отрисовка здесь же, в "encode"
+    with stage("encode"):
+        video.write_videofile(
+            str(out_path),
+            codec="libx264",
+            audio=False,
+            fps=int(fps),
+            # с progress/cancel кадры считает свой логгер вместо полоски moviepy
+            logger=_frame_logger(progress, cancel) if progress is not None or cancel is not None else "bar",
+        )
+
+
+def _frame_logger(progress: FrameProgress | None, cancel: CancelToken | None = None):
+    """proglog-логгер для write_videofile: номер записанного кадра -> progress, проверка отмены."""
+    from proglog import ProgressBarLogger
+
+    class FrameLogger(ProgressBarLogger):
+        def bars_callback(self, bar, attr, value, old_value=None):
+            if bar == "frame_index" and attr == "index" and value >= 0:
+                if cancel is not None:
+                    cancel.check()
+                done = value + 1
+                if progress is not None and done > progress.frames:
+                    progress.advance(done - progress.frames)
+
+    return FrameLogger()
+
+
+def _write_video(
+    paths: list[Path],
+    offsets: list[tuple[float, float] | None],
+    moves: list[tuple[str, int]],
+    out_path: Path,
+    *,
+    engine: str,
+    segments: int,
+    prepare: dict,
+    workers: int,
+    progress_cb: ProgressCB,
+    progress: FrameProgress | None,
+    cancel: CancelToken | None,
+    transitions: bool,
+    step: float,
+    motion: str,
+    fit_mode: str,
+    sec_per: float,
+    fade: float,
+    fps: int,
+    size: tuple[int, int],
+) -> None:
+    """Видеопоток (без аудио) выбранным движком в out_path."""
+    n = len(paths)
+
+    if engine == "ffmpeg" and segments > 1 and motion != "none":
+        # каждый кусок таймлайна сам готовит свои слайды и кодирует их в своём процессе
+        _write_segments(
+            paths,
+            offsets,
+            moves,
+            out_path,
+            segments=segments,
+            prepare=prepare,
+            progress_cb=progress_cb,
+            progress=progress,
+            cancel=cancel,
+            motion=motion,
+            fit_mode=fit_mode,
+            sec_per=sec_per,
+            fade=fade,
+            fps=fps,
+            size=size,
+        )
+        return
+
+    prepared = _iter_prepared(paths, offsets, workers=workers, **prepare)
+
+    # клипы moviepy или (engine="ffmpeg") рендереры кадров — по одному на слайд
+    slides = _iter_slides(
+        prepared,
+        moves,
+        make=SlideRenderer if engine == "ffmpeg" else _make_clip,
+        progress_cb=progress_cb,
+        n=n,
+        # ffmpeg: слайды готовятся прямо по ходу кодирования,
+        # после последнего слайда остаётся только дописать хвост
+        encode_signal=engine == "ffmpeg",
+        motion=motion,
+        fit_mode=fit_mode,
+        sec_per=sec_per,
+        size=size,
+        fps=fps,
+        step=step,
+        cancel=cancel,
+    )
+
+    if engine == "ffmpeg":
+        # потоково: в памяти только окно из текущего и предыдущего слайда
+        _write_frames(
+            slides,
+            out_path,
+            n=n,
+            static=motion == "none",
+            sec_per=sec_per,
+            fade=fade,
+            fps=fps,
+            size=size,
+            progress=progress,
+            cancel=cancel,
+        )
+    else:
+        _write_clips(
+            slides,
+            out_path,
+            n=n,
+            transitions=transitions,
+            fade=fade,
+            fps=fps,
+            progress_cb=progress_cb,
+            progress=progress,
+            cancel=cancel,
+        )
 
 
 def build_video(
-    images: PathLike | Iterable[PathLike],
+    images: PathLike | Iterable[PathLike] | ImageIndex,
     out: PathLike,
     sec_per: float,
     fps: int,
@@ -47,15 +942,61 @@ def build_video(
     motion: str = "none",           # "none" | "zoom" | "kenburns"
     audio_adjust: str = "trim",
     progress_cb: ProgressCB = None,
+    encode_cb: EncodeCB = None,
     total_duration: float | None = None,
     fit_mode: str = "fit",
     fancy_bg: bool = True,
     crop_offsets: CropOffsets | None = None,
+    workers: int = 1,
+    engine: str = "moviepy",        # "moviepy" | "ffmpeg"
+    cache: SlideCache | None = None,
+    segments: int = 1,
+    segment_cache: SegmentCache | None = None,
+    audio_cache: PcmCache | None = None,
+    profiler: Profiler | None = None,
+    cancel: CancelToken | None = None,
+    seed: int = 0,
+    plan: RenderPlan | None = None,
 ) -> str:
-    """Основной пайплайн: картинки -> вертикальное видео (+ опционально аудио)."""
-
-    # --- сбор картинок ---
-    img_paths = _collect_images(images)
+    """
+    Основной пайплайн: картинки -> вертикальное видео (+ опционально аудио).
+
+    images  — файлы и папки или готовый vv.scan.ImageIndex (scan_images): заголовки
+              всех картинок проверяются до рендера, битый файл — ImageScanError сразу.
+
+    workers — сколько процессов готовят слайды (декод, ресайз, блюр); 1 — в текущем процессе.
+    engine  — "moviepy": композитинг клипов moviepy;
+              "ffmpeg": кадры рисуются в numpy-буферы и идут прямо в ffmpeg через stdin.
+    cache   — дисковый кэш подготовленных слайдов (vv.cache.SlideCache); после рендера
+              он обрезается до своего лимита, в cache.hits/misses — статистика.
+    segments — engine="ffmpeg": на сколько кусков (и процессов кодирования) резать таймлайн;
+               куски склеиваются без перекодирования. Для motion="none" не нужен —
+               там каждый слайд и так кодируется одним кадром.
+    segment_cache — engine="ffmpeg": кэш закодированных кусков (vv.cache.SegmentCache);
+               повторный рендер перекодирует только изменившиеся слайды и их переходы.
+    audio_cache — кэш декодированного аудио (vv.cache.PcmCache): трек декодируется один раз.
+    progress_cb(current, total) — подготовка картинок; current > total — началось кодирование.
+    encode_cb(EncodeProgress) — ход кодирования по кадрам таймлайна: сколько из скольких,
+               скорость и ETA (vv.progress); зовётся несколько раз в секунду.
+    profiler — vv.profiling.Profiler: время и пик памяти по этапам (на слайд и суммарно),
+               итог — profiler.report(). Без него замеры не ведутся.
+    cancel   — vv.cancel.CancelToken: cancel.cancel() из любого потока останавливает рендер
+               между слайдами или перед следующим кадром — build_video бросает RenderCancelled.
+               ffmpeg убивается, временные файлы удаляются.
+
+    seed     — seed движений Ken Burns (vv.plan): тот же seed и те же входы — тот же ролик.
+    plan     — готовый vv.plan.RenderPlan (make_plan или RenderPlan.read): рендерится ровно он —
+               тайминг, движения и сдвиги берутся из плана, sec_per/total_duration/seed не нужны.
+               Картинки, fps, motion, transitions (и crop_offsets, если заданы) должны
+               совпадать с планом, иначе ValueError.
+
+    Ролик пишется рядом с out во временный "<имя>.part<расширение>" и переименовывается
+    в out только целиком: при ошибке или отмене недописанный файл удаляется, а прежний out
+    остаётся как был.
+    """
+
+    # --- сбор картинок: битые файлы отсеиваются до рендера (vv.scan) ---
+    img_paths = scan_images(images).paths
     if not img_paths:
         raise ValueError("Нет входных изображений")
 
@@ -65,20 +1006,23 @@ def build_video(
     fit_mode = fit_mode.lower()
     audio_adjust = audio_adjust.lower()
     motion = motion.lower()
+    engine = engine.lower()
 
     # --- валидация аргументов ---
     if fps <= 0:
         raise ValueError("fps должен быть > 0")
 
+    if workers < 1:
+        raise ValueError("workers должен быть >= 1")
+
     if size[0] <= 0 or size[1] <= 0:
         raise ValueError("size должен быть положительными числами (width, height)")
 
     if total_duration is not None:
         if total_duration <= 0:
             raise ValueError("total_duration должна быть > 0")
-    else:
-        if sec_per <= 0:
-            raise ValueError("sec_per должна быть > 0, если total_duration не задана")
+    elif plan is None and sec_per <= 0:
+        raise ValueError("sec_per должна быть > 0, если total_duration не задана")
 
     if fit_mode not in {"fit", "cover"}:
         raise ValueError(f"Неизвестный режим fit_mode={fit_mode!r}")
@@ -92,295 +1036,241 @@ def build_video(
             f"motion должен быть 'none', 'zoom' или 'kenburns', а не {motion!r}"
         )
 
-    # --- вычисление sec_per с учётом total_duration ---
-    if total_duration is not None:
-        if transitions and n > 1:
-            sec_per = sec_per_for_total(n, float(total_duration), transitions=True)
-        else:
-            sec_per = float(total_duration) / n
+    if engine not in {"moviepy", "ffmpeg"}:
+        raise ValueError(f"Неизвестный engine={engine!r}")
+
+    if segments < 1:
+        raise ValueError("segments должен быть >= 1")
+
+    if segments > 1 and engine != "ffmpeg":
+        raise ValueError("segments > 1 работает только с engine='ffmpeg'")
+
+    if segment_cache is not None:
+        if engine != "ffmpeg":
+            raise ValueError("segment_cache работает только с engine='ffmpeg'")
+        if segments > 1:
+            raise ValueError("segment_cache и segments > 1 нельзя использовать вместе")
+
+    # --- план: движения и время слайдов на таймлайне (vv.plan) ---
+    # назначается заранее, до подготовки картинок, и не зависит от глобального random;
+    # дальше рендер берёт слайды, сдвиги, движения и тайминг только из плана
+    offsets = [crop_offsets.get(str(p)) if crop_offsets else None for p in img_paths]
+    if plan is None:
+        plan = make_plan(
+            img_paths,
+            sec_per=sec_per,
+            fps=fps,
+            transitions=transitions,
+            total_duration=total_duration,
+            motion=motion,
+            offsets=offsets,
+            seed=seed,
+        )
     else:
-        # sec_per уже валиден
-        pass
-
-    sec_per = float(sec_per)
+        check_plan(plan, img_paths, fps=fps, motion=motion, transitions=transitions,
+                   offsets=offsets if crop_offsets else None)
+    img_paths, offsets, moves = plan.paths, plan.offsets, plan.moves
+    # слайд k начинается в k * step (с переходами слайды перекрываются на fade)
+    sec_per, fade, step = plan.sec_per, plan.fade, plan.step
     W, H = size
 
+    if cancel is not None:
+        cancel.check()
+
     # старт прогресса
     if progress_cb:
         progress_cb(0, len(img_paths))
 
-    clips: list[ImageClip] = []
-
-    # --- Логика "Пачек" (Batching) для Ken Burns ---
-    # Чтобы движения шли сериями: 3 зума, потом 2 панорамы и т.д.
-
-    # Состояния пачки
-    batch_remaining = 0
-    current_move_type = "zoom"
+    prepare = dict(size=(W, H), bg=bg, motion=motion, fit_mode=fit_mode, fancy_bg=fancy_bg, cache=cache)
+    if profiler is not None:
+        # подготовка слайдов замеряется там, где идёт (в том числе в процессах пула)
+        prepare["profile"] = "memory" if profiler.memory else "time"
 
-    # 0 = Первичное направление (Left / Top / ZoomIn)
-    # 1 = Вторичное направление (Right / Bottom / ZoomOut)
-    batch_direction_flag = 0
+    out_path = Path(out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    part = out_path.with_name(f"{out_path.stem}.part{out_path.suffix}")
 
-    for idx, p in enumerate(img_paths, 1):
+    # видео и аудио — отдельные этапы: видеопоток кодируется без звука,
+    # дорожка готовится отдельно, и они сводятся без перекодирования
+    duration = plan.duration
+    render = dict(motion=motion, fit_mode=fit_mode, sec_per=sec_per, fade=fade, fps=int(fps), size=(W, H))
 
-        # 1. Определяем тип движения для текущего кадра
-        if batch_remaining <= 0:
-            # Начинаем новую серию
-            batch_remaining = random.randint(2, 4) # 2-4 кадра в одном стиле
+    if profiler is not None:
+        profiler.meta.update(
+            slides=n, engine=engine, motion=motion, size=[W, H], fps=int(fps),
+            duration=duration, workers=workers, segments=segments, audio=bool(audio), seed=plan.seed,
+        )
 
-            # Выбираем тип движения
-            r = random.random()
-            if r < 0.30:
-                current_move_type = "zoom" # Zoom In/Out
-            else:
-                current_move_type = "pan"  # Pan Left/Right/Up/Down
-
-            # Генерируем единое направление для всей пачки
-            batch_direction_flag = random.randint(0, 1)
-
-        batch_remaining -= 1
-
-        # --- Подготовка изображения ---
-        with Image.open(p) as im:
-            im_pil = ImageOps.exif_transpose(im).convert("RGB")
-
-        if motion == "kenburns":
-            # == Вспомогательная функция плавности (ease-in-out) ==
-            def alpha(t: float) -> float:
-                if sec_per <= 0: return 0.0
-                x = min(max(t / sec_per, 0.0), 1.0)
-                # Ease-in-out sine
-                return 0.5 - 0.5 * math.cos(math.pi * x)
-
-            # ---------------------------------------------------------
-            # ВЕТКА 1: COVER (Весь экран заполнен, двигаем саму картинку)
-            # ---------------------------------------------------------
-            if fit_mode == "cover":
-                scale_base = max(W / im_pil.width, H / im_pil.height)
-
-                # Запас на движение (Overscan)
-                overscan = 0.06 # 6%
-                k = scale_base * (1.0 + overscan)
-
-                new_w, new_h = int(im_pil.width * k), int(im_pil.height * k)
-                im_resized = im_pil.resize((new_w, new_h), Image.LANCZOS)
-                base_clip = ImageClip(np.array(im_resized)).with_duration(sec_per)
-
-                max_dx = max(0, new_w - W)
-                max_dy = max(0, new_h - H)
-                cx, cy = max_dx / 2.0, max_dy / 2.0
-
-                # Инициализация переменных
-                start_x, end_x = cx, cx
-                start_y, end_y = cy, cy
-                s_start, s_end = 1.0, 1.0
-
-                if current_move_type == "zoom":
-                    # Используем флаг направления пачки для Zoom In vs Zoom Out
-                    if batch_direction_flag == 0: # Zoom In
-                        s_start, s_end = 1.0, 1.05
-                    else: # Zoom Out
-                        s_start, s_end = 1.05, 1.0
-
-                else: # Pan
-                    s_start = s_end = 1.005 # Легкий фикс краев
-                    is_horz = max_dx > max_dy
-                    travel = 0.7 # 70% доступного пути
-
-                    if is_horz:
-                        dist = max_dx * travel
-                        if batch_direction_flag == 0: # Left -> Right
-                            start_x, end_x = cx - dist/2, cx + dist/2
-                        else: # Right -> Left
-                            start_x, end_x = cx + dist/2, cx - dist/2
-                    else:
-                        dist = max_dy * travel
-                        if batch_direction_flag == 0: # Top -> Bottom
-                            start_y, end_y = cy - dist/2, cy + dist/2
-                        else: # Bottom -> Top
-                            start_y, end_y = cy + dist/2, cy - dist/2
-
-                # Биндим значения (closure fix)
-                def pos_f(t, x0=start_x, x1=end_x, y0=start_y, y1=end_y):
-                    a = alpha(t)
-                    # Двигаем контент влево (-x), чтобы камера шла вправо
-                    return -(x0 + (x1 - x0)*a), -(y0 + (y1 - y0)*a)
-
-                def scale_f(t, s0=s_start, s1=s_end):
-                    return s0 + (s1 - s0)*alpha(t)
-
-                final_clip = (
-                    base_clip
-                    .resized(new_size=scale_f)
-                    .with_position(pos_f)
+    progress = FrameProgress(frame_count(n, sec_per, fade, int(fps)), encode_cb) if encode_cb else None
+
+    try:
+        with (
+            profiler or nullcontext(),
+            tempfile.TemporaryDirectory(prefix="vv_") as tmp,
+            ThreadPoolExecutor(max_workers=1) as audio_pool,
+        ):
+            # дорожка готовится в фоновом потоке параллельно со слайдами; профайлер
+            # рендера попадает в поток вместе с копией контекста
+            track = audio_pool.submit(
+                contextvars.copy_context().run,
+                _prepare_track,
+                audio,
+                Path(tmp),
+                audio_adjust=audio_adjust,
+                duration=duration,
+                segment_cache=segment_cache,
+                audio_cache=audio_cache,
+                cancel=cancel,
+            ) if audio else None
+
+            if segment_cache is not None:
+                video = _write_incremental(
+                    img_paths,
+                    offsets,
+                    moves,
+                    segment_cache=segment_cache,
+                    prepare=prepare,
+                    workers=workers,
+                    progress_cb=progress_cb,
+                    progress=progress,
+                    cancel=cancel,
+                    **render,
                 )
-
-                clip = CompositeVideoClip([final_clip], size=(W, H)).with_duration(sec_per)
-
-            # ---------------------------------------------------------
-            # ВЕТКА 2: FIT (iOS Style - Stable Frame, Moving Content)
-            # ---------------------------------------------------------
             else:
-                # 1. Создаем Фон (Blur)
-                bg_im = ImageOps.fit(im_pil, (W, H), Image.LANCZOS)
-                bg_im = bg_im.filter(ImageFilter.GaussianBlur(radius=35))
-                bg_clip = ImageClip(np.array(bg_im)).with_duration(sec_per)
-
-                # 2. Вычисляем размер "Окна" (Рамки)
-                ratio_im = im_pil.width / im_pil.height
-                ratio_screen = W / H
-
-                if ratio_im > ratio_screen:
-                    # Широкая - упирается в края по ширине
-                    fit_w = W
-                    fit_h = int(W / ratio_im)
-                else:
-                    # Высокая - упирается в края по высоте
-                    fit_h = H
-                    fit_w = int(H * ratio_im)
-
-                # 3. Готовим контент ДЛЯ окна (с запасом на движение)
-                # Мы делаем контент больше самого окна (fit_w/h) на X%
-                overscan = 0.08 # 8% запаса внутри рамки
-
-                content_w = int(fit_w * (1.0 + overscan))
-                content_h = int(fit_h * (1.0 + overscan))
-
-                img_content = im_pil.resize((content_w, content_h), Image.LANCZOS)
-                content_clip = ImageClip(np.array(img_content)).with_duration(sec_per)
-
-                # Доступное пространство внутри окна
-                max_dx = content_w - fit_w
-                max_dy = content_h - fit_h
-
-                # Центр контента относительно левого верхнего угла окна
-                # В идеале центр контента должен быть в (fit_w/2, fit_h/2)
-                # Но так как контент больше, его координата "центра" для MoviePy - это сдвиг
-                # Начальная позиция (чтобы было по центру):
-                base_x = -(max_dx / 2.0)
-                base_y = -(max_dy / 2.0)
-
-                start_x, end_x = base_x, base_x
-                start_y, end_y = base_y, base_y
-                s_start, s_end = 1.0, 1.0
-
-                # Логика движения (ВНУТРИ рамки)
-                if current_move_type == "zoom":
-                    if batch_direction_flag == 0:
-                        s_start, s_end = 1.0, 1.05 # Zoom In
-                    else:
-                        s_start, s_end = 1.05, 1.0 # Zoom Out
-                else:
-                    # Pan
-                    is_wide_relative = (im_pil.width / im_pil.height) > (W / H)
-                    travel = 0.8
-
-                    if is_wide_relative:
-                        # Картинка широкая, fit_w == W. Двигаем горизонтально
-                        dist = max_dx * travel
-                        if batch_direction_flag == 0:
-                            start_x, end_x = base_x - dist/2, base_x + dist/2
-                        else:
-                            start_x, end_x = base_x + dist/2, base_x - dist/2
-                    else:
-                        dist = max_dy * travel
-                        if batch_direction_flag == 0:
-                            start_y, end_y = base_y - dist/2, base_y + dist/2
-                        else:
-                            start_y, end_y = base_y + dist/2, base_y - dist/2
-
-                def pos_f_fit(t, x0=start_x, x1=end_x, y0=start_y, y1=end_y):
-                    a = alpha(t)
-                    return x0 + (x1 - x0)*a, y0 + (y1 - y0)*a
-
-                def scale_f_fit(t, s0=s_start, s1=s_end):
-                    return s0 + (s1 - s0)*alpha(t)
-
-                # 4. АНИМАЦИЯ КОНТЕНТА
-                moving_content = (
-                    content_clip
-                    .resized(new_size=scale_f_fit)
-                    .with_position(pos_f_fit)
+                # без аудио видеопоток пишется сразу в part
+                video = Path(tmp) / "video.mkv" if audio else part
+                _write_video(
+                    img_paths,
+                    offsets,
+                    moves,
+                    video,
+                    engine=engine,
+                    segments=segments,
+                    prepare=prepare,
+                    workers=workers,
+                    progress_cb=progress_cb,
+                    progress=progress,
+                    cancel=cancel,
+                    transitions=transitions,
+                    step=step,
+                    **render,
                 )
-
-                # 5. МАСКИРОВКА (CLIPPING)
-                # Создаем композицию размером ровно с рамку (fit_w, fit_h).
-                # Всё, что выходит за пределы этого размера, обрежется.
-                masked_content = CompositeVideoClip(
-                    [moving_content],
-                    size=(fit_w, fit_h)
-                ).with_duration(sec_per)
-
-                # 6. ФИНАЛЬНАЯ СБОРКА
-                # Кладем маскированный контент по центру экрана поверх блюра
-                clip = CompositeVideoClip(
-                    [bg_clip, masked_content.with_position("center")],
-                    size=(W, H)
-                ).with_duration(sec_per)
-
-        # -------------------------------------------------------------
-        # ВЕТКА 3: СТАТИКА / ПРОСТОЙ ZOOM (НЕ KEN BURNS)
-        # -------------------------------------------------------------
-        else:
-            offset = crop_offsets.get(str(p)) if crop_offsets else None
-
-            # Используем обычную функцию для статики (она эффективнее)
-            # Но для motion="zoom" логику группировки тоже нужно оставить
-            frame = fit_to_canvas(p, size=(W, H), bg=bg, mode=fit_mode, fancy_bg=fancy_bg, offset=offset)
-            frame_arr = np.array(frame)
-            clip = ImageClip(frame_arr).with_duration(sec_per)
-
-            if motion == "zoom":
-                # Простой Zoom без панорамирования
-                # Также используем batch_direction_flag
-                strength = 0.03
-                if batch_direction_flag == 0:
-                    z0, z1 = 1.0, 1.0 + strength
-                else:
-                    z0, z1 = 1.0 + strength, 1.0
-
-                def zoom_simple(t, s=z0, e=z1):
-                    a = 0.5 - 0.5 * math.cos(math.pi * (t/sec_per))
-                    return s + (e - s) * a
-
-                clip = clip.resized(new_size=zoom_simple)
-
-        clips.append(clip)
-        if progress_cb: progress_cb(idx, n)
-
-    if not clips:
-        raise ValueError("Не удалось создать ни одного клипа")
-
-    # ---- Переходы ----
-    if transitions and len(clips) > 1:
-        fade = fade_for(sec_per)
-        clips_with_fx = [clips[0]] + [c.with_effects([CrossFadeIn(fade)]) for c in clips[1:]]
-        video = concatenate_videoclips(clips_with_fx, method="compose", padding=-fade)
-    else:
-        video = concatenate_videoclips(clips, method="compose")
-
-    video = video.with_fps(int(fps))
-
-    # аудио
-    if audio:
-        a = prepare_audio(str(audio), target_duration=video.duration, mode=audio_adjust)
-        if a: video = video.with_audio(a)
-
-    # Сообщаем GUI, что обработка кадров закончилась,
-    # и началось кодирование итогового ролика.
-    if progress_cb:
-        # current > total — специальный сигнал "encode"
-        progress_cb(len(img_paths) + 1, len(img_paths))
-
-    out_path = Path(out)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-
-    video.write_videofile(
-        str(out_path),
-        codec="libx264",
-        audio_codec="aac",
-        fps=int(fps),
-    )
-
-    return str(out_path)
\ No newline at end of file
+            if progress is not None:
+                progress.finish()
+
+            if cache is not None:
+                cache.trim()
+
+            if video != part:
+                audio_track = track.result() if track else None
+                with stage("mux"):
+                    mux_audio(video, part, audio=audio_track, duration=duration, cancel=cancel)
+        part.replace(out_path)
+    except BaseException:
+        # отмена, ошибка или Ctrl+C: ffmpeg уже убит (FrameWriter.abort), убираем недописанное
+        part.unlink(missing_ok=True)
+        raise
+
+    if segment_cache is not None:
+        # только когда ролик готов: иначе лимит кэша мог бы удалить склейку или дорожку до сведения
+        segment_cache.trim()
+
+    return str(out_path)
+
+
+class AsyncRender:
+    """
+    Рендер, запущенный build_video_async.
+
+    await render     — путь к готовому ролику;
+    async for ev in render — прогресс: PrepareProgress (готовые слайды) и
+                       EncodeProgress (кадры, скорость, ETA), пока рендер идёт;
+    render.cancel()  — остановить (то же, что отмена задачи, которая его ждёт).
+    """
+
+    def __init__(self, kwargs: dict, executor: Executor | None):
+        self._loop = asyncio.get_running_loop()
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._token: CancelToken = kwargs.pop("cancel", None) or CancelToken()
+        self._task = self._loop.create_task(self._run(kwargs, executor))
+
+    # колбэки build_video — в потоке рендера: события уходят в цикл
+    def _put(self, event) -> None:
+        self._loop.call_soon_threadsafe(self._events.put_nowait, event)
+
+    def _progress_cb(self, current: int, total: int) -> None:
+        if current <= total:
+            self._put(PrepareProgress(current, total))
+
+    def _encode_cb(self, p: EncodeProgress) -> None:
+        self._put(p)
+
+    async def _run(self, kwargs: dict, executor: Executor | None) -> str:
+        user_progress, user_encode = kwargs.pop("progress_cb", None), kwargs.pop("encode_cb", None)
+
+        def progress_cb(current: int, total: int) -> None:
+            self._progress_cb(current, total)
+            if user_progress:
+                user_progress(current, total)
+
+        def encode_cb(p: EncodeProgress) -> None:
+            self._encode_cb(p)
+            if user_encode:
+                user_encode(p)
+
+        fut = self._loop.run_in_executor(
+            executor,
+            partial(build_video, progress_cb=progress_cb, encode_cb=encode_cb, cancel=self._token, **kwargs),
+        )
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # поток рендера остановится перед следующим слайдом или кадром; ждём, пока он
+            # убьёт ffmpeg и уберёт временные файлы, и только потом отдаём отмену дальше
+            self._token.cancel()
+            try:
+                await fut
+            except RenderCancelled:
+                pass
+            raise
+        finally:
+            self._loop.call_soon(self._events.put_nowait, None)
+
+    def cancel(self) -> bool:
+        return self._task.cancel()
+
+    def done(self) -> bool:
+        return self._task.done()
+
+    def __await__(self):
+        return self._task.__await__()
+
+    def __aiter__(self) -> AsyncIterator[PrepareProgress | EncodeProgress]:
+        return self._iter_events()
+
+    async def _iter_events(self) -> AsyncIterator[PrepareProgress | EncodeProgress]:
+        while (event := await self._events.get()) is not None:
+            yield event
+
+
+def build_video_async(*, executor: Executor | None = None, **kwargs) -> AsyncRender:
+    """
+    build_video для asyncio: рендер идёт в потоке executor (по умолчанию — пул потоков
+    цикла), цикл событий не блокируется ни на подготовке, ни на кодировании.
+    Тяжёлая подготовка слайдов по-прежнему распараллеливается через workers.
+
+    Аргументы — как у build_video (только именованные). executor должен быть пулом
+    потоков: прогресс и отмена работают через колбэки в потоке рендера.
+
+        render = build_video_async(images=..., out=..., sec_per=3, fps=30, engine="ffmpeg")
+        async for event in render:
+            ...
+        path = await render
+
+    Отмена (render.cancel() или отмена задачи, которая ждёт render) отменяет
+    CancelToken рендера (свой можно передать в cancel=): ffmpeg останавливается
+    перед следующим слайдом или кадром.
+    """
+    if isinstance(executor, ProcessPoolExecutor):
+        raise TypeError("build_video_async: нужен пул потоков, а не процессов")
+    return AsyncRender(kwargs, executor)
@@ -0,0 +1,208 @@
+"""
+План рендера: всё, что решается до первого пикселя.
+
+make_plan по списку картинок и параметрам ролика (sec_per или total_duration,
+переходы, fps, движение) считает тайминг по vv.duration и назначает каждому
+слайду тип движения, направление и время на таймлайне. Картинки не открываются.
+
+Движения выбираются генератором со своим seed, а не глобальным random: тот же
+seed и те же входы дают тот же план (а значит, тот же ролик и те же ключи кэша),
+и любой слайд можно отрисовать отдельно и в любом порядке. План сериализуется
+в JSON (to_dict / from_dict) — его можно сохранить и отрендерить потом:
+build_video(plan=RenderPlan.read(...)) рендерит именно этот план.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .duration import fade_for, sec_per_for_total
+
+PathLike = str | Path
+
+PLAN_VERSION = 1
+
+
+@dataclass(frozen=True)
+class SlidePlan:
+    index: int
+    path: str
+    move: str                               # "zoom" | "pan" (используется при motion != "none")
+    direction: int                          # 0 — In / Left / Top, 1 — Out / Right / Bottom
+    start: float                            # секунды на таймлайне ролика
+    end: float                              # start + sec_per (с переходом — заходит на следующий)
+    offset: tuple[float, float] | None = None   # сдвиг кадрирования (cover)
+
+
+@dataclass(frozen=True)
+class RenderPlan:
+    seed: int
+    sec_per: float
+    fade: float
+    fps: int
+    motion: str
+    slides: tuple[SlidePlan, ...]
+
+    @property
+    def step(self) -> float:
+        """Шаг между началами слайдов (с переходами слайды перекрываются на fade)."""
+        return self.sec_per - self.fade
+
+    @property
+    def duration(self) -> float:
+        n = len(self.slides)
+        return n * self.sec_per - (n - 1) * self.fade
+
+    @property
+    def paths(self) -> list[Path]:
+        return [Path(s.path) for s in self.slides]
+
+    @property
+    def offsets(self) -> list[tuple[float, float] | None]:
+        return [s.offset for s in self.slides]
+
+    @property
+    def moves(self) -> list[tuple[str, int]]:
+        return [(s.move, s.direction) for s in self.slides]
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["version"] = PLAN_VERSION
+        for s in data["slides"]:
+            s["offset"] = list(s["offset"]) if s["offset"] is not None else None
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> RenderPlan:
+        if data.get("version") != PLAN_VERSION:
+            raise ValueError(f"Неизвестная версия плана: {data.get('version')!r}")
+        slides = tuple(
+            SlidePlan(**{**s, "offset": tuple(s["offset"]) if s.get("offset") is not None else None})
+            for s in data["slides"]
+        )
+        return cls(
+            seed=int(data["seed"]),
+            sec_per=float(data["sec_per"]),
+            fade=float(data["fade"]),
+            fps=int(data["fps"]),
+            motion=data["motion"],
+            slides=slides,
+        )
+
+    def write(self, path: PathLike) -> None:
+        Path(path).write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+
+    @classmethod
+    def read(cls, path: PathLike) -> RenderPlan:
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+def assign_moves(n: int, seed: int) -> list[tuple[str, int]]:
+    """
+    Логика "Пачек" (Batching) для Ken Burns.
+    Чтобы движения шли сериями: 3 зума, потом 2 панорамы и т.д.
+    Возвращает (тип движения, флаг направления) для каждого кадра.
+    Генератор свой (random.Random(seed)): глобальный random не трогается.
+    """
+    rng = random.Random(seed)
+    moves: list[tuple[str, int]] = []
+
+    # Состояния пачки
+    batch_remaining = 0
+    current_move_type = "zoom"
+
+    # 0 = Первичное направление (Left / Top / ZoomIn)
+    # 1 = Вторичное направление (Right / Bottom / ZoomOut)
+    batch_direction_flag = 0
+
+    for _ in range(n):
+        if batch_remaining <= 0:
+            # Начинаем новую серию
+            batch_remaining = rng.randint(2, 4) # 2-4 кадра в одном стиле
+
+            # Выбираем тип движения
+            r = rng.random()
+            if r < 0.30:
+                current_move_type = "zoom" # Zoom In/Out
+            else:
+                current_move_type = "pan"  # Pan Left/Right/Up/Down
+
+            # Генерируем единое направление для всей пачки
+            batch_direction_flag = rng.randint(0, 1)
+
+        batch_remaining -= 1
+        moves.append((current_move_type, batch_direction_flag))
+
+    return moves
+
+
+def make_plan(
+    paths: list[PathLike],
+    *,
+    sec_per: float,
+    fps: int,
+    transitions: bool = False,
+    total_duration: float | None = None,
+    motion: str = "none",
+    offsets: list[tuple[float, float] | None] | None = None,
+    seed: int = 0,
+) -> RenderPlan:
+    """
+    План ролика из картинок paths (уже собранных и проверенных — файлы не читаются).
+    sec_per — длительность слайда; total_duration — длина всего ролика (тогда sec_per
+    пересчитывается). transitions — переходы длиной fade_for(sec_per) (если слайдов больше одного).
+    """
+    n = len(paths)
+    if not n:
+        raise ValueError("Нет входных изображений")
+
+    if total_duration is not None:
+        if transitions and n > 1:
+            sec_per = sec_per_for_total(n, float(total_duration), transitions=True)
+        else:
+            sec_per = float(total_duration) / n
+    sec_per = float(sec_per)
+    fade = float(fade_for(sec_per)) if transitions and n > 1 else 0.0
+    step = sec_per - fade
+    offsets = offsets or [None] * n
+
+    slides = tuple(
+        SlidePlan(
+            index=k,
+            path=str(p),
+            move=move,
+            direction=direction,
+            start=k * step,
+            end=k * step + sec_per,
+            offset=tuple(off) if off is not None else None,
+        )
+        for k, (p, off, (move, direction)) in enumerate(zip(paths, offsets, assign_moves(n, seed)))
+    )
+    return RenderPlan(seed=int(seed), sec_per=sec_per, fade=fade, fps=int(fps), motion=motion, slides=slides)
+
+
+def check_plan(
+    plan: RenderPlan,
+    paths: list[PathLike],
+    *,
+    fps: int,
+    motion: str,
+    transitions: bool,
+    offsets: list[tuple[float, float] | None] | None = None,
+) -> None:
+    """Готовый план подходит к этим входам и параметрам рендера — иначе ValueError."""
+    if [s.path for s in plan.slides] != [str(p) for p in paths]:
+        raise ValueError("План рендера составлен для других картинок")
+    if plan.fps != int(fps):
+        raise ValueError(f"План рендера составлен для fps={plan.fps}, а не {int(fps)}")
+    if plan.motion != motion:
+        raise ValueError(f"План рендера составлен для motion={plan.motion!r}, а не {motion!r}")
+    if (plan.fade > 0) != (transitions and len(paths) > 1):
+        raise ValueError("План рендера составлен с другой настройкой переходов (transitions)")
+    if offsets is not None:
+        wanted = [tuple(off) if off is not None else None for off in offsets]
+        if wanted != plan.offsets:
+            raise ValueError("План рендера составлен с другими сдвигами кадрирования (crop_offsets)")
@@ -0,0 +1,297 @@
+"""
+Профилирование рендера по этапам: время и пик памяти — на каждый слайд и суммарно.
+
+Этапы (STAGES):
+  prepare — подготовка слайда целиком, за вычетом вложенных этапов ниже;
+  decode  — открытие и декод картинки (load_image);
+  resize  — ресайзы контента/кадра;
+  blur    — размытый фон;
+  cache   — чтение/запись дискового кэша слайдов;
+  wait    — ожидание слайда из пула процессов;
+  compose — отрисовка кадров (движение, кроссфейд);
+  encode  — запись кадров в ffmpeg, склейка сегментов (для moviepy — весь write_videofile);
+  audio   — подготовка аудиодорожки (в фоновом потоке);
+  mux     — сведение видео и аудио.
+
+Этапы вкладываются друг в друга (при потоковом рендере слайд готовится посреди
+кодирования), поэтому время этапа — "чистое": пока идёт вложенный этап, внешний
+стоит на паузе. Время из процессов пула прибавляется к общему, так что сумма
+этапов может быть больше wall_seconds.
+
+Память — пик выделений Python/numpy сверх уровня на входе в этап (tracemalloc)
+и пиковый RSS процесса и дочерних процессов (ffmpeg, пул).
+
+Включённый профайлер — свой у каждого потока и задачи asyncio (contextvars): два рендера
+в соседних потоках не пишут друг другу. В фоновый поток рендера он передаётся явно,
+через contextvars.copy_context().
+
+Пока профайлер не включён, stage() возвращает пустой контекст — рендер ничего не платит.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Iterator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PathLike = str | Path
+
+STAGES = ("prepare", "decode", "resize", "blur", "cache", "wait", "compose", "encode", "audio", "mux")
+
+# stage(..., slide=LAST_SLIDE): отнести к слайду, который рисовался последним (кодирование кадра)
+LAST_SLIDE = -1
+
+_NULL = nullcontext()
+_active: contextvars.ContextVar[Profiler | None] = contextvars.ContextVar("vv_profiler", default=None)
+
+
+@dataclass
+class StageStats:
+    seconds: float = 0.0
+    calls: int = 0
+    peak_bytes: int = 0
+
+    def add(self, other: StageStats) -> None:
+        self.seconds += other.seconds
+        self.calls += other.calls
+        self.peak_bytes = max(self.peak_bytes, other.peak_bytes)
+
+
+@dataclass
+class RenderProfile:
+    """Итог профилирования (Profiler.report)."""
+    wall_seconds: float
+    stages: dict[str, StageStats]
+    slides: dict[int, dict[str, StageStats]]
+    peak_rss_bytes: int | None = None
+    peak_rss_children_bytes: int | None = None
+    meta: dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "wall_seconds": self.wall_seconds,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "peak_rss_children_bytes": self.peak_rss_children_bytes,
+            "meta": self.meta,
+            "stages": {name: asdict(st) for name, st in self.stages.items()},
+            "slides": [
+                {"slide": k, "stages": {name: asdict(st) for name, st in stages.items()}}
+                for k, stages in sorted(self.slides.items())
+            ],
+        }
+
+    def write(self, path: PathLike) -> None:
+        Path(path).write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+class _Frame:
+    __slots__ = ("name", "slide", "started", "base", "peak", "memory")
+
+    def __init__(self, name: str | None, slide: int | None, started: float, base: int, memory: bool):
+        self.name = name
+        self.slide = slide
+        self.started = started
+        self.base = base
+        self.peak = 0
+        self.memory = memory
+
+
+class Profiler:
+    """
+    Сборщик замеров одного рендера: передаётся в build_video(profiler=...),
+    итог — report() (RenderProfile).
+
+    memory=False — без tracemalloc: только время и RSS (tracemalloc замедляет
+    код, который много выделяет мелких объектов Python).
+    """
+
+    def __init__(self, *, memory: bool = True):
+        self.memory = memory
+        self.stages: dict[str, StageStats] = {}
+        self.slides: dict[int, dict[str, StageStats]] = {}
+        self.meta: dict[str, Any] = {}
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._main = threading.get_ident()
+        self._lock = threading.Lock()
+        self._last_slide: int | None = None
+        self._started = time.perf_counter()
+        self._wall: float | None = None
+        self._own_tracing = False
+        self._prev: Profiler | None = None
+
+    # ---- включение ----
+
+    def __enter__(self) -> Profiler:
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracing = True
+        self._prev = current()
+        if self._prev is not None:
+            # внешний профайлер того же процесса стоит на паузе, пока работает этот
+            self._prev._push(None, None)
+        _active.set(self)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._wall = time.perf_counter() - self._started
+        if _active.get() is self:
+            # внешний профайлер, уже закрытый раньше этого (выход не по порядку), не возвращается
+            prev = self._prev
+            while prev is not None and prev._wall is not None:
+                prev = prev._prev
+            _active.set(prev)
+        if self._prev is not None:
+            self._prev._pop()
+        if self._own_tracing:
+            tracemalloc.stop()
+            self._own_tracing = False
+
+    # ---- этапы ----
+
+    def _stack(self) -> list[_Frame]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _traced(self) -> tuple[int, int]:
+        return tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+
+    def _push(self, name: str | None, slide: int | None) -> None:
+        now = time.perf_counter()
+        stack = self._stack()
+        # пик памяти — только в главном потоке: tracemalloc общий на процесс
+        memory = self.memory and threading.get_ident() == self._main
+        if memory:
+            cur, peak = self._traced()
+            for fr in stack:
+                if fr.memory:
+                    fr.peak = max(fr.peak, peak - fr.base)
+            tracemalloc.reset_peak()
+        else:
+            cur = 0
+        if stack:
+            self._record(stack[-1], now)
+        stack.append(_Frame(name, slide, now, cur, memory))
+
+    def _pop(self) -> None:
+        now = time.perf_counter()
+        stack = self._stack()
+        fr = stack.pop()
+        if fr.memory:
+            _cur, peak = self._traced()
+            for f in (*stack, fr):
+                if f.memory:
+                    f.peak = max(f.peak, peak - f.base)
+            tracemalloc.reset_peak()
+        self._record(fr, now, call=True)
+        if stack:
+            stack[-1].started = now
+
+    def _record(self, fr: _Frame, now: float, *, call: bool = False) -> None:
+        """Прибавить этапу fr время с его последнего (пере)запуска."""
+        if fr.name is None:
+            return
+        st = StageStats(now - fr.started, int(call), fr.peak if call else 0)
+        with self._lock:
+            self.stages.setdefault(fr.name, StageStats()).add(st)
+            if fr.slide is not None:
+                self.slides.setdefault(fr.slide, {}).setdefault(fr.name, StageStats()).add(st)
+        fr.started = now
+
+    @contextmanager
+    def stage(self, name: str, slide: int | None = None) -> Iterator[None]:
+        if slide == LAST_SLIDE:
+            slide = self._last_slide
+        elif slide is not None:
+            self._last_slide = slide
+        self._push(name, slide)
+        try:
+            yield
+        finally:
+            self._pop()
+
+    # ---- сбор из других процессов ----
+
+    def stats(self) -> dict:
+        """Замеры в виде, пригодном для передачи между процессами (см. merge)."""
+        return {
+            "stages": {name: asdict(st) for name, st in self.stages.items()},
+            "slides": {k: {name: asdict(st) for name, st in s.items()} for k, s in self.slides.items()},
+        }
+
+    def merge(self, stats: dict, slide: int | None = None) -> None:
+        """
+        Добавить замеры другого профайлера (процесса пула или отдельного слайда).
+        slide — отнести все его этапы к этому слайду.
+        """
+        with self._lock:
+            for name, st in stats["stages"].items():
+                self.stages.setdefault(name, StageStats()).add(StageStats(**st))
+                if slide is not None:
+                    self.slides.setdefault(slide, {}).setdefault(name, StageStats()).add(StageStats(**st))
+            if slide is None:
+                for k, stages in stats["slides"].items():
+                    for name, st in stages.items():
+                        self.slides.setdefault(int(k), {}).setdefault(name, StageStats()).add(StageStats(**st))
+
+    # ---- итог ----
+
+    def report(self) -> RenderProfile:
+        wall = self._wall if self._wall is not None else time.perf_counter() - self._started
+        rss, rss_children = _peak_rss()
+        with self._lock:
+            return RenderProfile(
+                wall_seconds=wall,
+                stages={name: self.stages[name] for name in sorted(self.stages, key=_stage_order)},
+                slides={k: dict(v) for k, v in self.slides.items()},
+                peak_rss_bytes=rss,
+                peak_rss_children_bytes=rss_children,
+                meta=dict(self.meta),
+            )
+
+
+def _stage_order(name: str) -> tuple[int, str]:
+    return (STAGES.index(name) if name in STAGES else len(STAGES), name)
+
+
+def _peak_rss() -> tuple[int | None, int | None]:
+    if resource is None:
+        return None, None
+    # ru_maxrss: Linux — КБ, macOS — байты
+    unit = 1 if sys.platform == "darwin" else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    )
+
+
+def current() -> Profiler | None:
+    """Включённый профайлер этого потока/задачи (унаследованный при fork — не в счёт)."""
+    p = _active.get()
+    if p is not None and p._pid == os.getpid():
+        return p
+    return None
+
+
+def stage(name: str, slide: int | None = None):
+    """Замерить этап name (и отнести его к слайду slide), если профайлер включён."""
+    p = current()
+    if p is None:
+        return _NULL
+    return p.stage(name, slide)
@@ -0,0 +1,121 @@
+"""
+Прогресс кодирования по кадрам.
+
+progress_cb(current, total) из build_video сообщает о подготовке картинок, а кодирование
+(обычно большая часть времени) — только сигналом current > total. encode_cb получает
+EncodeProgress: сколько кадров таймлайна уже закодировано из скольких, текущую
+скорость и оценку оставшегося времени.
+
+Кадры считаются по таймлайну ролика (frame_count): статичный слайд кодируется одним
+кадром, но засчитывается всеми кадрами, которые он показывается.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class EncodeProgress:
+    frames: int            # закодировано кадров таймлайна
+    total: int             # всего кадров в ролике
+    fps: float             # скорость кодирования, кадров/с (по последним RATE_WINDOW секундам)
+    elapsed: float         # секунд с начала кодирования
+    eta: float | None      # осталось секунд (None — скорость пока неизвестна)
+
+    @property
+    def done(self) -> bool:
+        return self.frames >= self.total
+
+    @property
+    def fraction(self) -> float:
+        return self.frames / self.total if self.total else 1.0
+
+
+EncodeCB = Callable[[EncodeProgress], None] | None
+
+
+@dataclass(frozen=True)
+class PrepareProgress:
+    """Подготовлено done слайдов из total (то же, что progress_cb(done, total))."""
+    done: int
+    total: int
+
+
+# окно, по которому считается скорость: ETA следует за сменой темпа (переходы, кэш)
+RATE_WINDOW = 5.0
+
+
+class FrameProgress:
+    """
+    Счётчик кадров одного кодирования: считает скорость и ETA и зовёт cb
+    не чаще раза в interval секунд (и всегда — на последнем кадре).
+
+    advance(count) — закодировано count кадров; skip(count) — кадры готовы без
+    кодирования (кэш кусков): идут в счёт, но не в скорость.
+    """
+
+    def __init__(
+        self,
+        total: int,
+        cb: EncodeCB,
+        *,
+        interval: float = 0.25,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.total = max(1, int(total))
+        self.cb = cb
+        self.interval = interval
+        self.clock = clock
+        self.frames = 0
+        self.encoded = 0
+        self._started = clock()
+        self._emitted: float | None = None
+        self._samples: deque[tuple[float, int]] = deque([(self._started, 0)])
+
+    def skip(self, count: int) -> None:
+        self.frames += count
+        self._emit(self.clock())
+
+    def advance(self, count: int = 1) -> None:
+        self.frames += count
+        self.encoded += count
+        now = self.clock()
+        if self._emitted is None or now - self._emitted >= self.interval or self.frames >= self.total:
+            self._emit(now)
+
+    def finish(self) -> None:
+        """Всё закодировано (например, последний кусок склеен) — сообщить 100%."""
+        if self.frames < self.total or self._emitted is None:
+            self.frames = self.total
+            self._emit(self.clock())
+
+    def _rate(self, now: float) -> float:
+        self._samples.append((now, self.encoded))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= RATE_WINDOW:
+            self._samples.popleft()
+        t0, e0 = self._samples[0]
+        return (self.encoded - e0) / (now - t0) if now > t0 else 0.0
+
+    def _emit(self, now: float) -> None:
+        self._emitted = now
+        if self.cb is None:
+            return
+        frames = min(self.frames, self.total)
+        fps = self._rate(now)
+        left = self.total - frames
+        eta = 0.0 if not left else (left / fps if fps > 0 else None)
+        self.cb(EncodeProgress(frames, self.total, fps, now - self._started, eta))
+
+
+def format_eta(seconds: float | None) -> str:
+    """ETA как "м:сс" (или "ч:мм:сс"); "?" — пока неизвестно."""
+    if seconds is None:
+        return "?"
+    s = int(round(seconds))
+    h, s = divmod(s, 3600)
+    m, s = divmod(s, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
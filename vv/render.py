@@ -0,0 +1,462 @@
+"""
+Прямой рендер кадров в numpy-буферы, минуя композитинг moviepy.
+Кадры пишутся в ffmpeg через stdin (см. vv.ffmpeg.FrameWriter).
+"""
+
+from __future__ import annotations
+
+import tempfile
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from PIL import Image
+
+from .ffmpeg import FrameWriter, concat_segments
+from .motion import Move, MotionCurve, fit_box, kenburns_move, zoom_move
+from .profiling import stage
+from .timeline import Timeline
+
+if TYPE_CHECKING:
+    from .cancel import CancelToken
+    from .pipeline import PreparedSlide
+    from .progress import FrameProgress
+
+PathLike = str | Path
+
+
+# окно увеличивается максимум на несколько процентов — bicubic тут неотличим от lanczos, но быстрее
+RESAMPLE = Image.BICUBIC
+
+
+class SlideRenderer:
+    """
+    Рисует кадры одного слайда в момент t (секунды от начала слайда).
+
+    Статика отдаётся как есть (без копий). Для движения кривая (x, y, s)
+    считается заранее для всех кадров слайда (см. MotionCurve), а кадр
+    получается одним crop-resize: из исходника берётся только видимое окно.
+
+    fps/start — сетка кадров общего таймлайна (слайд начинается в start);
+    без них кривая считается на лету.
+    """
+
+    def __init__(
+        self,
+        slide: PreparedSlide,
+        move_type: str,
+        direction_flag: int,
+        *,
+        motion: str,
+        fit_mode: str,
+        sec_per: float,
+        size: tuple[int, int],
+        fps: int | None = None,
+        start: float = 0.0,
+    ):
+        self.slide = slide
+        self.motion = motion
+        self.fit_mode = fit_mode
+        self.sec_per = float(sec_per)
+        self.size = size
+        W, H = size
+
+        move: Move | None = None
+        self.box: tuple[int, int, int, int] = (0, 0, W, H)  # x, y, w, h окна на экране
+
+        if motion == "kenburns":
+            content_h, content_w = slide.content.shape[:2]
+            move = kenburns_move(
+                move_type,
+                direction_flag,
+                fit_mode=fit_mode,
+                src_size=slide.src_size,
+                content_size=(content_w, content_h),
+                size=size,
+            )
+            self._src = Image.fromarray(slide.content)
+            if fit_mode == "fit":
+                fit_w, fit_h = fit_box(*slide.src_size, W, H)
+                self.box = ((W - fit_w) // 2, (H - fit_h) // 2, fit_w, fit_h)
+        elif motion == "zoom":
+            zm = zoom_move(direction_flag)
+            # окно W×H по центру увеличенного кадра
+            move = Move(
+                x0=W * (zm.s0 - 1.0) / 2, x1=W * (zm.s1 - 1.0) / 2,
+                y0=H * (zm.s0 - 1.0) / 2, y1=H * (zm.s1 - 1.0) / 2,
+                s0=zm.s0, s1=zm.s1,
+            )
+            self._src = Image.fromarray(slide.frame)
+
+        self.curve: MotionCurve | None = None
+        if move is not None:
+            self.curve = MotionCurve(move, duration=self.sec_per, fps=fps, start=start)
+            # окно в координатах исходника (до масштабирования) — сразу для всех кадров
+            _bx, _by, bw, bh = self.box
+            c = self.curve
+            self._boxes = np.stack([c.x / c.s, c.y / c.s, (c.x + bw) / c.s, (c.y + bh) / c.s], axis=1)
+
+    @property
+    def is_static(self) -> bool:
+        return self.curve is None
+
+    def source_box(self, t: float) -> tuple[float, float, float, float]:
+        """Видимое окно в координатах исходника в момент t."""
+        j = self.curve.index(t)
+        if j is not None:
+            l, tp, r, b = self._boxes[j]
+        else:
+            x, y, s = self.curve.at(t)
+            _bx, _by, bw, bh = self.box
+            l, tp, r, b = x / s, y / s, (x + bw) / s, (y + bh) / s
+        # защита от выхода за края на долю пикселя
+        src = self._src
+        return max(0.0, l), max(0.0, tp), min(float(src.width), r), min(float(src.height), b)
+
+    def render(self, t: float, out: np.ndarray) -> np.ndarray:
+        if self.curve is None:
+            return self.slide.frame
+
+        bx, by, bw, bh = self.box
+        window = self._src.resize((bw, bh), RESAMPLE, box=self.source_box(t))
+
+        if self.slide.background is not None:
+            np.copyto(out, self.slide.background)
+        out[by:by + bh, bx:bx + bw] = np.asarray(window)
+        return out
+
+
+@dataclass(frozen=True)
+class Run:
+    """
+    Отрезок таймлайна: кадры [start, start + count) показывают слайд k.
+    blend=True — это переход: слайд k проявляется поверх k-1.
+    """
+    k: int
+    start: int
+    count: int
+    blend: bool = False
+
+
+def frame_count(n: int, sec_per: float, fade: float, fps: int) -> int:
+    """Сколько кадров в ролике из n слайдов с перекрытием fade."""
+    total = n * sec_per - (n - 1) * fade
+    return max(1, int(round(total * fps)))
+
+
+# сколько кадров за раз раскладывается по слайдам (Timeline.locate_frames)
+FRAME_BLOCK = 1024
+
+
+def _frame_slots(timeline: Timeline, frames: range, fps: int) -> Iterator[tuple[int, int, float, bool]]:
+    """Кадры frames -> (кадр, слайд, время внутри слайда, переход ли) — поиск блоками по FRAME_BLOCK."""
+    for a in range(frames.start, frames.stop, FRAME_BLOCK):
+        block = range(a, min(a + FRAME_BLOCK, frames.stop))
+        k, local, blend = timeline.locate_frames(block, fps)
+        yield from zip(block, k.tolist(), local.tolist(), blend.tolist())
+
+
+def timeline_runs(n: int, *, sec_per: float, fade: float, fps: int) -> list[Run]:
+    """Разбить таймлайн на отрезки "один слайд" / "переход" (в кадрах)."""
+    total = frame_count(n, sec_per, fade, fps)
+    k, _local, blend = Timeline.uniform(n, sec_per=sec_per, fade=fade).locate_frames(range(total), fps)
+    # отрезок начинается там, где меняется слайд или начинается/кончается переход
+    cuts = np.flatnonzero((np.diff(k) != 0) | (np.diff(blend) != 0)) + 1
+    bounds = [0, *cuts.tolist(), total]
+    return [Run(int(k[a]), a, b - a, bool(blend[a])) for a, b in zip(bounds, bounds[1:])]
+
+
+def slides_for(frames: range, n: int, *, sec_per: float, fade: float, fps: int) -> range:
+    """Какие слайды нужны, чтобы нарисовать кадры frames (включая уходящий слайд перехода)."""
+    timeline = Timeline.uniform(n, sec_per=sec_per, fade=fade)
+    k0, _local, blend = timeline.locate(frames.start / fps)
+    k1, _local, _blend = timeline.locate((frames.stop - 1) / fps)
+    return range(k0 - 1 if blend else k0, k1 + 1)
+
+
+def split_timeline(n: int, *, sec_per: float, fade: float, fps: int, parts: int) -> list[range]:
+    """
+    Разрезать таймлайн на parts (или меньше) кусков кадров примерно равной длины.
+    Режем только на границах слайдов вне переходов — в начале кадров "одного слайда",
+    так что ни один переход не попадает на стык.
+    """
+    total = frame_count(n, sec_per, fade, fps)
+    cuts = [run.start for run in timeline_runs(n, sec_per=sec_per, fade=fade, fps=fps) if not run.blend and run.start > 0]
+
+    chosen: list[int] = []
+    for j in range(1, parts):
+        target = total * j / parts
+        best = min(cuts, key=lambda c: abs(c - target), default=None)
+        if best is not None and (not chosen or best > chosen[-1]):
+            chosen.append(best)
+
+    bounds = [0, *chosen, total]
+    return [range(a, b) for a, b in zip(bounds, bounds[1:])]
+
+
+class Crossfade:
+    """
+    Смешивание двух соседних слайдов на переходе.
+
+    Целочисленный блендинг с весом w/256 в uint16: без float-массивов и
+    временных копий — все промежуточные буферы выделяются один раз.
+    """
+
+    BITS = 8
+    ONE = 1 << BITS
+
+    def __init__(self, size: tuple[int, int]):
+        W, H = size
+        self._acc = np.empty((H, W, 3), dtype=np.uint16)
+        self._tmp = np.empty((H, W, 3), dtype=np.uint16)
+
+    def weight(self, a: float) -> int:
+        """Доля нового слайда a в [0, 1] -> целый вес в [0, ONE]."""
+        return min(max(int(round(a * self.ONE)), 0), self.ONE)
+
+    def blend(self, prev: np.ndarray, cur: np.ndarray, a: float, out: np.ndarray) -> np.ndarray:
+        """out = prev * (1 - a) + cur * a (с округлением)."""
+        w = self.weight(a)
+        if w == 0:
+            np.copyto(out, prev)
+            return out
+        if w == self.ONE:
+            np.copyto(out, cur)
+            return out
+
+        acc, tmp = self._acc, self._tmp
+        # 255 * 256 + 128 < 65536 — в uint16 не переполняется
+        np.multiply(cur, np.uint16(w), out=acc)
+        np.multiply(prev, np.uint16(self.ONE - w), out=tmp)
+        np.add(acc, tmp, out=acc)
+        np.add(acc, np.uint16(self.ONE // 2), out=acc)
+        np.right_shift(acc, self.BITS, out=acc)
+        np.copyto(out, acc, casting="unsafe")
+        return out
+
+
+class _SlideWindow:
+    """
+    Скользящее окно по слайдам, которые готовятся лениво (по мере надобности).
+
+    Держит не больше двух слайдов — текущий и предыдущий (нужен на переходе);
+    слайд отпускается, как только записан его последний кадр.
+    """
+
+    def __init__(self, renderers: Iterable[SlideRenderer], slides: Sequence[int]):
+        self._it = iter(renderers)
+        self.slides = slides  # номера слайдов, которые по порядку отдаёт renderers
+        self._pos = -1
+        self.k = -1
+        self.prev: SlideRenderer | None = None
+        self.cur: SlideRenderer | None = None
+
+    def get(self, k: int, *, blend: bool) -> tuple[SlideRenderer | None, SlideRenderer]:
+        """(предыдущий слайд или None, слайд k); слайды идут только вперёд."""
+        while self.k < k:
+            try:
+                nxt = next(self._it)
+            except StopIteration:
+                raise ValueError(f"Ожидалось {len(self.slides)} слайдов, получено {self._pos + 1}") from None
+            self.prev, self.cur = self.cur, nxt
+            self._pos += 1
+            self.k = self.slides[self._pos]
+            if self._pos == len(self.slides) - 1:
+                self.close()
+        if not blend:
+            self.prev = None  # переход закончился — предыдущий больше не нужен
+        return self.prev, self.cur
+
+    def close(self) -> None:
+        """
+        Закрыть источник слайдов, как только взят последний: пул процессов
+        подготовки должен завершиться до закрытия ffmpeg — его дочерние процессы
+        наследуют stdin ffmpeg, и тот не дождался бы конца потока.
+        """
+        close = getattr(self._it, "close", None)
+        if close is not None:
+            close()
+
+
+def _count(renderers: Iterable[SlideRenderer], n: int | None) -> int:
+    if n is None:
+        if not isinstance(renderers, Sequence):
+            raise ValueError("Для ленивой последовательности слайдов нужно передать n")
+        n = len(renderers)
+    return n
+
+
+def iter_frames(
+    renderers: Iterable[SlideRenderer],
+    *,
+    n: int | None = None,
+    sec_per: float,
+    fade: float,
+    fps: int,
+    size: tuple[int, int],
+    frames: range | None = None,
+) -> Iterator[np.ndarray]:
+    """
+    Кадры всего ролика по порядку.
+    Слайд k начинается в k * (sec_per - fade); первые fade секунд он
+    проявляется поверх предыдущего (как CrossFadeIn в moviepy).
+
+    Отдаваемый массив может переиспользоваться на следующем шаге —
+    его нужно записать до того, как брать следующий кадр.
+
+    renderers может быть ленивым (генератор на n слайдов): слайд берётся
+    перед первым своим кадром и отпускается после последнего.
+
+    frames — только часть таймлайна (номера кадров всего ролика); тогда
+    renderers — слайды slides_for(frames, ...), а не все n.
+    """
+    W, H = size
+    n = _count(renderers, n)
+    if frames is None:
+        frames = range(frame_count(n, sec_per, fade, fps))
+    window = _SlideWindow(renderers, slides_for(frames, n, sec_per=sec_per, fade=fade, fps=fps))
+    timeline = Timeline.uniform(n, sec_per=sec_per, fade=fade)
+    step = sec_per - fade
+    buf_cur = np.empty((H, W, 3), dtype=np.uint8)
+    buf_prev = np.empty((H, W, 3), dtype=np.uint8)
+    out = np.empty((H, W, 3), dtype=np.uint8)
+    fader = Crossfade(size)
+
+    # слайд кадра — поиском по таймлайну: цена кадра не зависит от числа слайдов
+    for _i, k, local, blend in _frame_slots(timeline, frames, fps):
+        prev_r, cur_r = window.get(k, blend=blend)
+        with stage("compose", k):
+            frame = cur_r.render(local, buf_cur)
+            if blend:
+                # предыдущий слайд рисуется только на кадрах перехода
+                prev = prev_r.render(local + step, buf_prev)
+                frame = fader.blend(prev, frame, local / fade, out)
+        yield frame
+
+
+def still_runs(n: int, *, sec_per: float, fade: float, fps: int) -> list[Run]:
+    """
+    timeline_runs для статики: последний кадр — отдельным отрезком, чтобы
+    ролик из "однокадровых" сегментов не обрывался раньше срока.
+    """
+    runs = timeline_runs(n, sec_per=sec_per, fade=fade, fps=fps)
+    last = runs[-1]
+    if not last.blend and last.count > 1:
+        runs[-1:] = [Run(last.k, last.start, last.count - 1), Run(last.k, last.start + last.count - 1, 1)]
+    return runs
+
+
+def encode_runs(
+    renderers: Iterable[SlideRenderer],
+    slides: Sequence[int],
+    runs: Sequence[Run],
+    seg_dir: Path,
+    *,
+    n: int,
+    sec_per: float,
+    fade: float,
+    fps: int,
+    size: tuple[int, int],
+    still: bool = False,
+    progress: FrameProgress | None = None,
+    cancel: CancelToken | None = None,
+) -> list[Path]:
+    """
+    Закодировать отрезки runs одним процессом ffmpeg — по файлу на отрезок.
+
+    renderers — слайды с номерами slides (по возрастанию; для перехода нужны оба слайда).
+    still=True — отрезок "один слайд" кодируется одним кадром: его длительность задаётся
+    при склейке (см. concat_segments).
+    progress — счётчик кадров таймлайна (однокадровый отрезок засчитывается целиком).
+    cancel — отмена проверяется перед каждым кадром (RenderCancelled).
+    """
+    W, H = size
+    window = _SlideWindow(renderers, slides)
+    timeline = Timeline.uniform(n, sec_per=sec_per, fade=fade)
+    step = sec_per - fade
+
+    keyframes: list[int] = []
+    written = 0
+    for run in runs:
+        keyframes.append(written)
+        written += 1 if still and not run.blend else run.count
+
+    buf_cur = np.empty((H, W, 3), dtype=np.uint8)
+    buf_prev = np.empty((H, W, 3), dtype=np.uint8)
+    buf_out = np.empty((H, W, 3), dtype=np.uint8)
+    fader = Crossfade(size)
+
+    with FrameWriter(seg_dir / "seg_%06d.mkv", size, fps, keyframes=keyframes, cancel=cancel) as writer:
+        for run in runs:
+            prev_r, cur_r = window.get(run.k, blend=run.blend)
+            if still and not run.blend:
+                with stage("compose", run.k):
+                    frame = cur_r.render(0.0, buf_cur)
+                writer.write(frame)
+                if progress is not None:
+                    progress.advance(run.count)
+                continue
+            for _i, _k, local, _blend in _frame_slots(timeline, range(run.start, run.start + run.count), fps):
+                with stage("compose", run.k):
+                    frame = cur_r.render(local, buf_cur)
+                    if run.blend:
+                        prev = prev_r.render(local + step, buf_prev)
+                        frame = fader.blend(prev, frame, local / fade, buf_out)
+                writer.write(frame)
+                if progress is not None:
+                    progress.advance()
+
+    seg_files = sorted(seg_dir.glob("seg_*.mkv"))
+    if len(seg_files) != len(runs):
+        raise RuntimeError(f"ffmpeg создал {len(seg_files)} сегментов вместо {len(runs)}")
+    return seg_files
+
+
+def write_stills(
+    renderers: Iterable[SlideRenderer],
+    out: PathLike,
+    *,
+    n: int | None = None,
+    sec_per: float,
+    fade: float,
+    fps: int,
+    size: tuple[int, int],
+    progress: FrameProgress | None = None,
+    cancel: CancelToken | None = None,
+) -> None:
+    """
+    Быстрый путь для статичных слайдов (motion="none").
+
+    Каждый слайд кодируется одним кадром, покадрово рисуются только переходы.
+    Кодирование идёт одним процессом ffmpeg с нарезкой на сегменты по опорным
+    кадрам, затем сегменты склеиваются без перекодирования, и каждый
+    "однокадровый" сегмент показывается всю свою длительность (VFR).
+
+    Как и iter_frames, принимает ленивую последовательность из n слайдов.
+    """
+    n = _count(renderers, n)
+    runs = still_runs(n, sec_per=sec_per, fade=fade, fps=fps)
+
+    with tempfile.TemporaryDirectory(prefix="vv_") as tmp:
+        seg_files = encode_runs(
+            renderers,
+            range(n),
+            runs,
+            Path(tmp),
+            n=n,
+            sec_per=sec_per,
+            fade=fade,
+            fps=fps,
+            size=size,
+            still=True,
+            progress=progress,
+            cancel=cancel,
+        )
+        concat_segments(
+            [(p, run.count / fps) for p, run in zip(seg_files, runs)],
+            out,
+            duration=frame_count(n, sec_per, fade, fps) / fps,
+            cancel=cancel,
+        )
@@ -0,0 +1,236 @@
+"""
+Сбор и проверка входных картинок — до рендера, а не посреди него.
+
+scan_images(images) разворачивает файлы и папки в список картинок (os.scandir,
+с recursive — и вложенные папки; natural — "img2" раньше "img10") и параллельно
+читает у каждой только заголовок: размер, EXIF-ориентацию, режим. Битые файлы
+(не картинка, пустой или недописанный файл) отбрасываются сразу — ImageScanError
+со списком всех плохих файлов, а не падение через десять минут рендера.
+
+Итог — ImageIndex: последовательность путей (её можно отдать в build_video вместо
+списка файлов — повторно папки не сканируются и заголовки не читаются) плюс
+метаданные каждой картинки.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import struct
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .config import IMAGE_EXTS
+
+PathLike = str | Path
+
+# заголовки читаются потоками: это в основном ожидание диска (или сетевой папки)
+SCAN_WORKERS = 16
+
+# EXIF-ориентации, при которых картинка поворачивается на 90° (как в vv.image)
+_ROTATED = {5, 6, 7, 8}
+
+# метка конца файла: без неё файл недописан (JPEG — EOI, PNG — чанк IEND)
+_END_MARKERS = {"JPEG": b"\xff\xd9", "MPO": b"\xff\xd9", "PNG": b"IEND"}
+
+# PNG: сигнатура (8 байт) + IHDR (4 + 4 + 13 + 4); данные картинки — не раньше
+_PNG_HEADER = 33
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    path: Path
+    size: tuple[int, int]    # после EXIF-поворота — как картинка будет в кадре
+    orientation: int         # EXIF Orientation, 1 — без поворота
+    mode: str                # режим PIL: "RGB", "RGBA", "L", "P", ...
+    format: str              # "JPEG", "PNG", "WEBP"
+    bytes: int
+
+    @property
+    def portrait(self) -> bool:
+        return self.size[1] > self.size[0]
+
+
+@dataclass(frozen=True)
+class ImageIndex(Sequence):
+    """Картинки ролика по порядку: index[k] — путь, index.info(path) — метаданные."""
+    images: tuple[ImageInfo, ...]
+    _by_path: dict[Path, ImageInfo] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "_by_path", {im.path: im for im in self.images})
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [im.path for im in self.images[i]]
+        return self.images[i].path
+
+    @property
+    def paths(self) -> list[Path]:
+        return [im.path for im in self.images]
+
+    def info(self, path: PathLike) -> ImageInfo:
+        return self._by_path[Path(path)]
+
+
+class ImageScanError(ValueError):
+    """Входные файлы, которые не удалось прочитать как картинки; bad — [(путь, причина)]."""
+
+    def __init__(self, bad: list[tuple[Path, str]]):
+        self.bad = bad
+        shown = "; ".join(f"{p}: {reason}" for p, reason in bad[:10])
+        more = f" и ещё {len(bad) - 10}" if len(bad) > 10 else ""
+        super().__init__(f"Не удалось прочитать изображения ({len(bad)}): {shown}{more}")
+
+
+def natural_key(name: str) -> tuple:
+    """Ключ "естественной" сортировки: числа сравниваются как числа ("2" < "10"), регистр не важен."""
+    # re.split с группой чередует текст и числа — на одних позициях всегда однотипные части
+    parts = re.split(r"(\d+)", name)
+    return tuple(int(s) if i % 2 else s.casefold() for i, s in enumerate(parts)), name
+
+
+def list_images(
+    images: PathLike | Iterable[PathLike],
+    *,
+    recursive: bool = False,
+    natural: bool = False,
+) -> list[Path]:
+    """
+    Файлы и папки -> пути к картинкам, по порядку аргументов. Картинки папки
+    (по расширению из IMAGE_EXTS, без скрытых файлов) сортируются по имени,
+    natural=True — "естественно"; recursive=True — с вложенными папками.
+    Явно указанный файл берётся как есть; несуществующий путь — FileNotFoundError.
+    """
+    if isinstance(images, (str, Path)):
+        images = [images]
+
+    paths: list[Path] = []
+    for item in images:
+        p = Path(item)
+        if p.is_dir():
+            found = list(_scan_dir(p, recursive=recursive))
+            key = natural_key if natural else str
+            found.sort(key=lambda x: tuple(key(part) for part in x.relative_to(p).parts))
+            paths += found
+        elif p.is_file():
+            paths.append(p)
+        else:
+            raise FileNotFoundError(f"Путь не найден: {p}")
+    return paths
+
+
+def _scan_dir(root: Path, *, recursive: bool) -> Iterable[Path]:
+    # os.scandir отдаёт тип файла вместе с именем — без лишнего stat на каждый файл
+    with os.scandir(root) as entries:
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue  # .DS_Store, "._IMG.jpg" от macOS и прочий мусор
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTS:
+                yield root / entry.name
+            elif recursive and entry.is_dir(follow_symlinks=False):
+                subdirs.append(root / entry.name)
+    for d in subdirs:
+        yield from _scan_dir(d, recursive=True)
+
+
+def probe_image(path: PathLike) -> ImageInfo:
+    """
+    Метаданные картинки по заголовку — пиксели не декодируются.
+    Недописанный JPEG/PNG (нет метки конца файла) — ValueError.
+    """
+    from PIL import Image
+
+    path = Path(path)
+    nbytes = path.stat().st_size
+    if not nbytes:
+        raise ValueError("пустой файл")
+
+    with Image.open(path) as im:
+        w, h = im.size
+        mode, fmt = im.mode, im.format or ""
+        # PNG.getexif() без eXIf-чанка в заголовке декодирует всю картинку — берём только заголовок
+        if fmt == "PNG":
+            exif = Image.Exif()
+            if "exif" in im.info:
+                exif.load(im.info["exif"])
+        else:
+            exif = im.getexif()
+        orientation = int(exif.get(0x0112, 1) or 1)
+
+    if w <= 0 or h <= 0:
+        raise ValueError(f"некорректный размер {w}x{h}")
+
+    marker = _END_MARKERS.get(fmt)
+    if marker is not None:
+        with open(path, "rb") as f:
+            # метка считается, только если она после начала данных картинки: у JPEG в заголовке
+            # (EXIF) лежит миниатюра — целый JPEG со своим EOI, и обрезанное фото её "находит"
+            start = _jpeg_scan_start(f) if marker == b"\xff\xd9" else _PNG_HEADER
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # поиск с конца: у целого файла метка в последних байтах и читаются только они;
+                # у обрезанного просматривается всё от начала данных
+                if data.rfind(marker, start) < 0:
+                    raise ValueError("файл обрезан (нет конца изображения)")
+
+    size = (h, w) if orientation in _ROTATED else (w, h)
+    return ImageInfo(path=path, size=size, orientation=orientation, mode=mode, format=fmt, bytes=nbytes)
+
+
+def _jpeg_scan_start(f) -> int:
+    """Смещение первого SOS (начала сжатых данных) JPEG — по заголовкам сегментов, без декода."""
+    f.seek(2)  # SOI
+    while True:
+        head = f.read(2)
+        while head[:1] == b"\xff" and head[1:] == b"\xff":
+            head = head[1:] + f.read(1)  # байты-заполнители перед маркером
+        if len(head) < 2 or head[0] != 0xFF:
+            raise ValueError("повреждённый заголовок JPEG")
+        if head[1] == 0xDA:
+            return f.tell()
+        raw = f.read(2)
+        if len(raw) < 2:
+            raise ValueError("файл обрезан (нет данных изображения)")
+        f.seek(struct.unpack(">H", raw)[0] - 2, os.SEEK_CUR)
+
+
+def _probe(path: Path) -> ImageInfo | str:
+    try:
+        return probe_image(path)
+    except Exception as e:  # PIL бросает что угодно: UnidentifiedImageError, SyntaxError, struct.error...
+        return str(e) or type(e).__name__
+
+
+def probe_images(paths: Iterable[PathLike], *, workers: int = SCAN_WORKERS) -> ImageIndex:
+    """Заголовки картинок paths (в workers потоков) -> ImageIndex. Хоть один битый файл — ImageScanError."""
+    paths = [Path(p) for p in paths]
+    if len(paths) > 1 and workers > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as ex:
+            results = list(ex.map(_probe, paths))
+    else:
+        results = [_probe(p) for p in paths]
+
+    bad = [(p, r) for p, r in zip(paths, results) if isinstance(r, str)]
+    if bad:
+        raise ImageScanError(bad)
+    return ImageIndex(tuple(results))
+
+
+def scan_images(
+    images: PathLike | Iterable[PathLike],
+    *,
+    recursive: bool = False,
+    natural: bool = False,
+    workers: int = SCAN_WORKERS,
+) -> ImageIndex:
+    """list_images + probe_images. Готовый ImageIndex возвращается как есть."""
+    if isinstance(images, ImageIndex):
+        return images
+    return probe_images(list_images(images, recursive=recursive, natural=natural), workers=workers)
@@ -0,0 +1,381 @@
+"""
+Локальный сервис рендера: asyncio-сервер на Unix-сокете (или TCP) с очередью заданий.
+
+    python -m vv serve --socket /tmp/vv.sock --workers 2
+
+Протокол — JSON Lines: клиент шлёт одну строку-запрос, сервер отвечает строками-событиями.
+
+  {"op": "submit", "job": {...}, "priority": 0}
+      job — как задание vv batch (опции vv.cli). Ответ — {"event": "queued", "id": ...},
+      затем события рендера (как у vv.cli --progress jsonl, с "job": id) и последним —
+      {"event": "result", ...} (vv.batch.JobResult). Больший priority — раньше в очереди.
+      "stream": false — ответить только queued и закрыть соединение.
+  {"op": "status"}            -> {"event": "status", "queued": [...], "running": [...], "workers": N}
+  {"op": "cancel", "id": ...} -> снять задание из очереди (запущенное доводится до конца)
+
+Задания выполняются в пуле процессов, который живёт всё время работы сервиса: интерпретатор,
+moviepy/numpy/Pillow и поиск ffmpeg — один раз на процесс, а не на задание; в процессах
+остаются и их кэши в памяти (хэши файлов, кодек аудиоподложки). Кэши слайдов и аудио
+на диске общие для всех заданий, как в vv batch.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import stat
+import threading
+import time
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from typing import Any
+
+import click
+
+from .batch import JobResult, job_params, run_job
+from .cache import DEFAULT_MAX_BYTES, default_cache_dir
+from .events import JsonlEvents
+
+log = logging.getLogger(__name__)
+
+# сколько ждать последних событий задания после его результата (процесс пула мог умереть)
+DRAIN_TIMEOUT = 5.0
+
+# в процессе пула: очередь, через которую события заданий идут в сервис
+_events_queue = None
+
+
+class _QueueStream:
+    """Файлоподобный поток для JsonlEvents: каждая строка уходит в очередь сервиса."""
+
+    def __init__(self, queue, job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+
+    def write(self, line: str) -> None:
+        self.queue.put((self.job_id, line))
+
+    def flush(self) -> None:
+        pass
+
+
+def _init_worker(queue) -> None:
+    global _events_queue
+    _events_queue = queue
+    # прогрев: тяжёлые импорты и поиск ffmpeg — один раз на процесс
+    from . import pipeline
+    from .ffmpeg import ffmpeg_exe
+
+    pipeline._load_moviepy()
+    ffmpeg_exe()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _run(job_id: str, job: dict[str, Any], **run) -> JobResult:
+    """Задание в процессе пула; в конце — (job_id, None): все его события отправлены."""
+    try:
+        return run_job(job, events=JsonlEvents(_QueueStream(_events_queue, job_id), job=job_id), **run)
+    finally:
+        _events_queue.put((job_id, None))
+
+
+@dataclass(eq=False)
+class JobTicket:
+    """Задание в сервисе: состояние и его события (events — для того, кто его отправил)."""
+    id: str
+    job: dict[str, Any]
+    priority: int = 0
+    state: str = "queued"  # queued / running / done / cancelled
+    result: JobResult | None = None
+    feed: asyncio.Queue | None = None
+    drained: asyncio.Event = field(default_factory=asyncio.Event)
+
+    async def events(self) -> AsyncIterator[dict[str, Any]]:
+        """События задания до "result" включительно."""
+        if self.feed is None:
+            raise RuntimeError("задание отправлено без потока событий")
+        while (event := await self.feed.get()) is not None:
+            yield event
+
+
+class RenderService:
+    """
+    Очередь заданий с приоритетами и пул из workers процессов.
+
+    Использование из asyncio:
+        async with RenderService(workers=2) as service:
+            server = await service.serve(path="/tmp/vv.sock")
+            ...
+    или напрямую: ticket = service.submit(job); async for event in ticket.events(): ...
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int = 1,
+        cache_dir: str | None = None,
+        cache_size: int = DEFAULT_MAX_BYTES // (1024 * 1024),
+        overwrite: bool = False,
+    ):
+        if workers < 1:
+            raise ValueError("workers должен быть >= 1")
+        self.workers = workers
+        self._run = dict(cache_dir=cache_dir, cache_size=cache_size, overwrite=overwrite)
+        self._ids = itertools.count(1)
+        self._tickets: dict[str, JobTicket] = {}
+        self._queue: asyncio.PriorityQueue | None = None
+        self._pool: ProcessPoolExecutor | None = None
+        self._ctx = multiprocessing.get_context("spawn")
+        self._events = None
+        self._reader: threading.Thread | None = None
+        self._dispatchers: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    # ---- жизненный цикл ----
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.PriorityQueue()
+        self._events = self._ctx.Queue()
+        self._reader = threading.Thread(target=self._read_events, name="vv-service-events", daemon=True)
+        self._reader.start()
+        self._pool = self._new_pool()
+        # все процессы стартуют и прогреваются сразу, а не на первом задании
+        await asyncio.gather(*(self._loop.run_in_executor(self._pool, _ping) for _ in range(self.workers)))
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+        if self._reader is not None:
+            self._events.put(None)
+            await asyncio.to_thread(self._reader.join)
+            self._reader = None
+        for t in list(self._tickets.values()):
+            self._finish(t, JobResult(name=str(t.job.get("name")), out=None, ok=False, seconds=0.0,
+                                      error="сервис остановлен"), state="cancelled")
+
+    async def __aenter__(self) -> RenderService:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._ctx,
+            initializer=_init_worker,
+            initargs=(self._events,),
+        )
+
+    # ---- задания ----
+
+    def submit(self, job: dict[str, Any], priority: int = 0, *, stream: bool = True) -> JobTicket:
+        """
+        Поставить задание в очередь. Опции проверяются сразу (click.ClickException),
+        чтобы ошибка в задании не ждала своей очереди.
+        """
+        if self._queue is None:
+            raise RuntimeError("сервис не запущен (start)")
+        if not isinstance(job, dict):
+            raise click.ClickException("job: ожидается объект с опциями задания")
+        job_id = str(next(self._ids))
+        job = {"name": job_id, **job}
+        job_params(job)
+
+        t = JobTicket(job_id, job, priority, feed=asyncio.Queue() if stream else None)
+        self._tickets[job_id] = t
+        self._queue.put_nowait((-priority, int(job_id), t))
+        return t
+
+    def cancel(self, job_id: str) -> bool:
+        """Снять задание из очереди; запущенное не останавливается — вернёт False."""
+        t = self._tickets.get(job_id)
+        if t is None or t.state != "queued":
+            return False
+        self._finish(t, JobResult(name=str(t.job["name"]), out=None, ok=False, seconds=0.0, error="отменено"),
+                     state="cancelled")
+        return True
+
+    def status(self) -> dict[str, Any]:
+        by_state = {"queued": [], "running": []}
+        for t in sorted(self._tickets.values(), key=lambda t: (-t.priority, int(t.id))):
+            if t.state in by_state:
+                by_state[t.state].append(t.id)
+        return {"workers": self.workers, **by_state}
+
+    async def _dispatch(self) -> None:
+        while True:
+            _prio, _seq, t = await self._queue.get()
+            if t.state != "queued":
+                continue
+            t.state = "running"
+            pool = self._pool
+            started = time.monotonic()
+            try:
+                res = await self._loop.run_in_executor(pool, partial(_run, t.id, t.job, **self._run))
+                try:
+                    await asyncio.wait_for(t.drained.wait(), DRAIN_TIMEOUT)
+                except asyncio.TimeoutError:
+                    log.warning("задание %s: не дождались последних событий", t.id)
+            except BrokenProcessPool as e:
+                # процесс пула умер (например, нехватка памяти) — пул пересоздаётся, очередь живёт дальше
+                res = JobResult(name=str(t.job["name"]), out=None, ok=False,
+                                seconds=time.monotonic() - started, error=f"{type(e).__name__}: {e}")
+                if self._pool is pool:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self._pool = self._new_pool()
+            self._finish(t, res)
+
+    def _finish(self, t: JobTicket, res: JobResult, *, state: str = "done") -> None:
+        t.state = state
+        t.result = res
+        self._tickets.pop(t.id, None)
+        if t.feed is not None:
+            t.feed.put_nowait({"event": "result", "job": t.id, **asdict(res)})
+            t.feed.put_nowait(None)
+
+    # ---- события из процессов пула ----
+
+    def _read_events(self) -> None:
+        while (item := self._events.get()) is not None:
+            self._loop.call_soon_threadsafe(self._publish, *item)
+
+    def _publish(self, job_id: str, line: str | None) -> None:
+        t = self._tickets.get(job_id)
+        if t is None:
+            return
+        if line is None:
+            t.drained.set()
+        elif t.feed is not None:
+            t.feed.put_nowait(json.loads(line))
+
+    # ---- сеть ----
+
+    async def serve(self, *, path: str | None = None, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        """Слушать Unix-сокет path (или TCP host:port, port=0 — любой свободный)."""
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle, path=path)
+        return await asyncio.start_server(self._handle, host=host, port=port)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async def send(event: dict[str, Any]) -> None:
+            writer.write(json.dumps(event, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+            await writer.drain()
+
+        try:
+            try:
+                req = json.loads(await reader.readline())
+                op = req["op"]
+            except (ValueError, KeyError, TypeError):
+                await send({"event": "error", "message": "ожидается JSON-объект с полем op"})
+                return
+
+            if op == "submit":
+                try:
+                    t = self.submit(req.get("job"), int(req.get("priority", 0)), stream=bool(req.get("stream", True)))
+                except (click.ClickException, ValueError) as e:
+                    message = e.format_message() if isinstance(e, click.ClickException) else str(e)
+                    await send({"event": "error", "message": message})
+                    return
+                await send({"event": "queued", "id": t.id, "queued": len(self.status()["queued"])})
+                if t.feed is not None:
+                    async for event in t.events():
+                        await send(event)
+            elif op == "status":
+                await send({"event": "status", **self.status()})
+            elif op == "cancel":
+                await send({"event": "cancel", "id": req.get("id"), "ok": self.cancel(str(req.get("id")))})
+            else:
+                await send({"event": "error", "message": f"неизвестная операция {op!r}"})
+        except ConnectionError:
+            # клиент ушёл — задание всё равно доводится до конца
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+async def request(
+    payload: dict[str, Any],
+    *,
+    path: str | None = None,
+    host: str = "127.0.0.1",
+    port: int | None = None,
+) -> AsyncIterator[dict[str, Any]]:
+    """Клиент: отправить запрос сервису и читать события ответа."""
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+        await writer.drain()
+        while line := await reader.readline():
+            yield json.loads(line)
+    finally:
+        writer.close()
+
+
+async def _serve(*, path, host, port, **service) -> None:
+    async with RenderService(**service) as svc:
+        server = await svc.serve(path=path, host=host, port=port)
+        where = path or ", ".join(f"{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+        click.echo(f"🎬 Сервис рендера: {where} | процессов: {svc.workers}", err=True)
+        async with server:
+            await server.serve_forever()
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option("--socket", "path", type=click.Path(dir_okay=False), default=None,
+              help="Unix-сокет (иначе — TCP --host/--port)")
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", type=click.IntRange(min=0, max=65535), default=8765, show_default=True)
+@click.option("--workers", "-w", type=click.IntRange(min=1), default=min(4, os.cpu_count() or 1), show_default=True,
+              help="Сколько роликов рендерится одновременно (процессов)")
+@click.option("--cache-dir", type=click.Path(file_okay=False), default=None,
+              help=f"Общая папка кэша (по умолчанию {default_cache_dir()})")
+@click.option("--cache-size", type=click.IntRange(min=0), default=DEFAULT_MAX_BYTES // (1024 * 1024),
+              show_default=True, help="Лимит кэша, MB")
+@click.option("--overwrite", is_flag=True, help="Перезаписывать существующие файлы")
+@click.option("--verbose", "-v", is_flag=True, help="Подробный лог")
+def main(path, host, port, workers, cache_dir, cache_size, overwrite, verbose):
+    """Локальный сервис рендера (JSON Lines поверх Unix-сокета или TCP)."""
+    from .cli import setup_logging
+
+    setup_logging(verbose)
+    if path and os.path.exists(path):
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise click.ClickException(f"{path} существует и это не сокет")
+        os.unlink(path)  # сокет от прошлого запуска
+    try:
+        asyncio.run(_serve(
+            path=path, host=host, port=port,
+            workers=workers, cache_dir=cache_dir, cache_size=cache_size, overwrite=overwrite,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Таймлайн слайдов: начала и концы слайдов — в numpy-массивах, поиск слайда
+по времени — двоичный (O(log n)), а не перебором всех слайдов.
+
+Слайд k показывается на [starts[k], ends[k]); соседние слайды перекрываются
+на время перехода, так что в момент t играют один или два слайда (active).
+
+Используется обоими движками: ffmpeg-рендер находит слайд кадра через locate
+(и locate_frames — сразу для диапазона кадров), а для moviepy index_composite
+подменяет перебор клипов CompositeVideoClip на тот же поиск.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+import numpy as np
+
+
+class Timeline:
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, *, fade: float = 0.0):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.fade = float(fade)
+        if len(self.starts) != len(self.ends) or not len(self.starts):
+            raise ValueError("Таймлайн: нужны начала и концы хотя бы одного слайда")
+        if np.any(np.diff(self.starts) < 0) or np.any(np.diff(self.ends) < 0):
+            raise ValueError("Таймлайн: начала и концы слайдов должны идти по возрастанию")
+
+    @classmethod
+    def from_durations(cls, durations, *, fade: float = 0.0) -> Timeline:
+        """Слайды подряд: каждый следующий начинается за fade до конца предыдущего."""
+        durations = np.asarray(durations, dtype=np.float64)
+        starts = np.zeros(len(durations))
+        np.cumsum(durations[:-1] - fade, out=starts[1:])
+        return cls(starts, starts + durations, fade=fade)
+
+    @classmethod
+    def uniform(cls, n: int, *, sec_per: float, fade: float) -> Timeline:
+        """n слайдов по sec_per: слайд k начинается в k * (sec_per - fade)."""
+        return _uniform(int(n), float(sec_per), float(fade))
+
+    @property
+    def n(self) -> int:
+        return len(self.starts)
+
+    @property
+    def duration(self) -> float:
+        return float(self.ends[-1])
+
+    def slide_at(self, t: float) -> int:
+        """Последний начавшийся к моменту t слайд (на переходе — входящий)."""
+        k = int(np.searchsorted(self.starts, t, side="right")) - 1
+        return min(max(k, 0), self.n - 1)
+
+    def active(self, t: float) -> range:
+        """Слайды, которые играют в момент t: [start, end) содержит t (на переходе — два)."""
+        lo = int(np.searchsorted(self.ends, t, side="right"))
+        hi = int(np.searchsorted(self.starts, t, side="right"))
+        return range(lo, hi)
+
+    def locate(self, t: float) -> tuple[int, float, bool]:
+        """Момент t -> (слайд k, время внутри слайда, идёт ли переход из k-1)."""
+        k = self.slide_at(t)
+        local = t - float(self.starts[k])
+        return k, local, (self.fade > 0 and k > 0 and local < self.fade)
+
+    def locate_frames(self, frames: range, fps: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """locate для каждого кадра frames сразу — массивы (k, local, blend)."""
+        t = np.arange(frames.start, frames.stop, dtype=np.float64) / fps
+        k = np.clip(np.searchsorted(self.starts, t, side="right") - 1, 0, self.n - 1)
+        local = t - self.starts[k]
+        blend = (k > 0) & (local < self.fade) if self.fade > 0 else np.zeros(len(t), dtype=bool)
+        return k, local, blend
+
+
+@lru_cache(maxsize=16)
+def _uniform(n: int, sec_per: float, fade: float) -> Timeline:
+    # k * step, а не cumsum: без накопления ошибки округления на тысячах слайдов
+    starts = np.arange(n, dtype=np.float64) * (sec_per - fade)
+    timeline = Timeline(starts, starts + sec_per, fade=fade)
+    # один объект на все вызовы с теми же параметрами — массивы только для чтения
+    timeline.starts.flags.writeable = False
+    timeline.ends.flags.writeable = False
+    return timeline
+
+
+def index_composite(video) -> None:
+    """
+    moviepy: CompositeVideoClip (concatenate_videoclips(method="compose")) на каждом кадре
+    перебирает все клипы, чтобы найти играющие, — время кадра растёт с числом слайдов.
+    Подменяем этот перебор (и в маске композиции) поиском по таймлайну клипов.
+    Если клипы не идут по времени подряд, всё остаётся как есть.
+    """
+    for clip in (video, getattr(video, "mask", None)):
+        clips = getattr(clip, "clips", None)
+        if not clips or any(c.end is None for c in clips):
+            continue
+        try:
+            timeline = Timeline([c.start for c in clips], [c.end for c in clips])
+        except ValueError:
+            continue
+        clip.playing_clips = _playing(clips, timeline)
+
+
+def _playing(clips: list, timeline: Timeline):
+    def playing_clips(t=0):
+        return [clips[k] for k in timeline.active(t)]
+
+    return playing_clips